@@ -0,0 +1,7 @@
+"""
+Load-testing harness of the PriceTracker API.
+
+Drives a mix of authenticated traffic at a running API, backed by a local
+mongod, while a fake retailer serves the product pages the API validates.
+See `python -m loadtest --help`.
+"""
@@ -0,0 +1,266 @@
+"""
+Measure the capacity of the API under a realistic traffic mix.
+
+    python -m loadtest run [--levels 1,10,50] [--duration 30]
+    python -m loadtest scrape [--levels 1,10,50] [--latency-ms 300]
+    python -m loadtest retailer [--port 8081] [--captcha-rate 0.02]
+    python -m loadtest compare [--scrape] [OLD.json] [NEW.json]
+
+`run` starts a fake retailer, logs the load-test users in, then sends the
+traffic mix at each concurrency level and saves the results in
+loadtest/results. `scrape` benchmarks scrapes of the fake retailer through
+`make_request` and the scrapers, and saves the results in
+loadtest/results/scrape. `retailer` only serves the fake retailer, for an
+API or worker started with SCRAPE_HOST_REMAP. `compare` compares two saved
+runs, by default the two most recent ones.
+"""
+
+import argparse
+import asyncio
+import os
+import platform
+import sys
+import time
+from dataclasses import fields
+from pathlib import Path
+
+import httpx
+
+from .results import (
+    compare_results,
+    current_commit,
+    format_result,
+    latest_result,
+    load_result,
+    save_result,
+    utc_timestamp,
+    RESULTS_DIR,
+    SCRAPE_RESULTS_DIR,
+)
+from .retailer import PAGES_DIR, FakeRetailer, RetailerConditions
+from .runner import run_level
+from .scenarios import DEFAULT_MIX, parse_mix, prepare_sessions
+
+
+# Conditions of the scrape benchmark, close to a store answering from across
+# the country and occasionally pushing back
+SCRAPE_CONDITIONS = RetailerConditions(
+    latency_ms=300, bandwidth_kbps=2048, error_rate=0.01, captcha_rate=0.02, page_kb=500
+)
+
+
+def get_conditions(args: argparse.Namespace) -> RetailerConditions:
+    return RetailerConditions(
+        **{field.name: getattr(args, field.name) for field in fields(RetailerConditions)}
+    )
+
+
+def get_result(args: argparse.Namespace, **details) -> dict:
+    return {
+        "started_at": utc_timestamp(),
+        "commit": current_commit(),
+        **details,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count()},
+        "levels": [],
+    }
+
+
+def report(result: dict, args: argparse.Namespace, directory: Path):
+    """
+    Save a run, print it and compare it with the baseline.
+    """
+    path = save_result(result, directory)
+    print()
+    print("\n".join(format_result(result)))
+    print(f"\nSaved to {path}")
+
+    baseline = args.baseline or latest_result(directory, exclude=path)
+    if baseline is not None:
+        print()
+        print("\n".join(compare_results(load_result(baseline), result)))
+
+
+async def run(args: argparse.Namespace):
+    retailer = FakeRetailer(port=args.retailer_port, conditions=get_conditions(args)).start()
+    product_urls = [
+        retailer.product_url("amazon", f"B0LOADTEST{index:02d}") for index in range(20)
+    ]
+    result = get_result(
+        args,
+        api_url=args.api_url,
+        mix=args.mix,
+        users=args.users,
+        retailer=vars(retailer.conditions),
+    )
+    try:
+        connections = max(args.levels)
+        limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+        async with httpx.AsyncClient(
+            base_url=args.api_url, limits=limits, timeout=args.timeout
+        ) as client:
+            sessions = await prepare_sessions(
+                client, args.admin_username, args.admin_password, args.users, product_urls
+            )
+            for concurrency in args.levels:
+                print(f"Concurrency {concurrency}: {args.warmup}s warmup, {args.duration}s measured")
+                level = await run_level(
+                    client, sessions, args.mix, concurrency, args.duration, args.warmup
+                )
+                result["levels"].append(level)
+                print(
+                    f"  {level['throughput']:.1f} req/s, p95 {level['p95_ms']:.1f}ms, "
+                    f"p99 {level['p99_ms']:.1f}ms, errors {level['error_rate']:.2%}"
+                )
+    finally:
+        retailer.stop()
+
+    report(result, args, RESULTS_DIR)
+
+
+def scrape(args: argparse.Namespace):
+    from .scrape import quiet_scrape_logs, remap_stores, run_scrape_level
+
+    retailer = FakeRetailer(port=args.retailer_port, conditions=get_conditions(args)).start()
+    remap_stores(retailer)
+    quiet_scrape_logs()
+    result = get_result(args, retailer=vars(retailer.conditions))
+    try:
+        for concurrency in args.levels:
+            print(f"Concurrency {concurrency}: {args.warmup}s warmup, {args.duration}s measured")
+            level = run_scrape_level(concurrency, args.duration, args.warmup)
+            result["levels"].append(level)
+            print(
+                f"  {level['scrapes_per_second']:.1f} scrapes/s, p95 {level['p95_ms']:.1f}ms, "
+                f"p99 {level['p99_ms']:.1f}ms, failed {level['error_rate']:.2%} {level['errors']}"
+            )
+    finally:
+        retailer.stop()
+
+    report(result, args, SCRAPE_RESULTS_DIR)
+
+
+def serve_retailer(args: argparse.Namespace):
+    retailer = FakeRetailer(args.host, args.port, get_conditions(args), args.pages_dir).start()
+    print(f"Fake retailer listening on {retailer.url}, serving {', '.join(sorted(retailer.pages))}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        retailer.stop()
+
+
+def compare(args: argparse.Namespace):
+    directory = SCRAPE_RESULTS_DIR if args.scrape else RESULTS_DIR
+    new = args.new or latest_result(directory)
+    old = args.old or (latest_result(directory, exclude=new) if new else None)
+    if old is None or new is None:
+        sys.exit(f"Two saved runs are needed in {directory}")
+    print("\n".join(compare_results(load_result(old), load_result(new))))
+
+
+def parse_levels(value: str):
+    return [int(level) for level in value.split(",")]
+
+
+def parse_mix_argument(value: str):
+    try:
+        return parse_mix(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def add_condition_arguments(parser: argparse.ArgumentParser, defaults: RetailerConditions):
+    group = parser.add_argument_group("fake retailer conditions")
+    group.add_argument(
+        "--latency-ms", type=float, default=defaults.latency_ms, help="median time to first byte"
+    )
+    group.add_argument(
+        "--latency-sigma", type=float, default=defaults.latency_sigma,
+        help="spread of the log-normal time to first byte",
+    )
+    group.add_argument(
+        "--bandwidth-kbps", type=float, default=defaults.bandwidth_kbps,
+        help="download speed of each response in KiB/s, 0 for unlimited",
+    )
+    group.add_argument(
+        "--error-rate", type=float, default=defaults.error_rate, help="fraction answered with a 500"
+    )
+    group.add_argument(
+        "--throttle-rps", type=float, default=defaults.throttle_rps,
+        help="requests per second per store before answering 503, 0 for unlimited",
+    )
+    group.add_argument(
+        "--captcha-rate", type=float, default=defaults.captcha_rate,
+        help="fraction answered with a captcha page",
+    )
+    group.add_argument(
+        "--page-kb", type=int, default=defaults.page_kb, help="size the product pages are padded to"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m loadtest", description=__doc__.strip().splitlines()[0]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="load the API and save the results")
+    run_parser.add_argument("--api-url", default="http://127.0.0.1:8000", help="API under test")
+    run_parser.add_argument(
+        "--levels", type=parse_levels, default=[1, 5, 10, 25, 50],
+        help="comma-separated concurrency levels (default: 1,5,10,25,50)",
+    )
+    run_parser.add_argument("--duration", type=float, default=30, help="seconds measured per level")
+    run_parser.add_argument("--warmup", type=float, default=5, help="seconds of unmeasured traffic per level")
+    run_parser.add_argument("--users", type=int, default=20, help="users sending the traffic")
+    run_parser.add_argument(
+        "--mix", type=parse_mix_argument, default=DEFAULT_MIX,
+        help="weights of the actions, such as auth_user=30,products=45 (default: %(default)s)",
+    )
+    run_parser.add_argument("--timeout", type=float, default=30, help="request timeout in seconds")
+    run_parser.add_argument("--retailer-port", type=int, default=0, help="port of the fake retailer")
+    run_parser.add_argument("--admin-username", default=os.getenv("ADMIN_USERNAME", "admin"))
+    run_parser.add_argument("--admin-password", default=os.getenv("ADMIN_PASSWORD", "pricetracker"))
+    run_parser.add_argument("--baseline", type=Path, help="run to compare with, defaults to the previous one")
+    add_condition_arguments(run_parser, RetailerConditions())
+
+    scrape_parser = commands.add_parser("scrape", help="benchmark scrapes of the fake retailer")
+    scrape_parser.add_argument(
+        "--levels", type=parse_levels, default=[1, 5, 10, 20],
+        help="comma-separated numbers of scrape threads (default: 1,5,10,20)",
+    )
+    scrape_parser.add_argument("--duration", type=float, default=30, help="seconds measured per level")
+    scrape_parser.add_argument("--warmup", type=float, default=5, help="seconds of unmeasured scrapes per level")
+    scrape_parser.add_argument("--retailer-port", type=int, default=0, help="port of the fake retailer")
+    scrape_parser.add_argument("--baseline", type=Path, help="run to compare with, defaults to the previous one")
+    add_condition_arguments(scrape_parser, SCRAPE_CONDITIONS)
+
+    retailer_parser = commands.add_parser("retailer", help="serve the fake retailer")
+    retailer_parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    retailer_parser.add_argument("--port", type=int, default=8081, help="port to listen on")
+    retailer_parser.add_argument(
+        "--pages-dir", type=Path, default=PAGES_DIR,
+        help="directory of recorded <platform>.html pages replacing the bundled ones",
+    )
+    add_condition_arguments(retailer_parser, RetailerConditions())
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("--scrape", action="store_true", help="compare scrape benchmarks")
+    compare_parser.add_argument("old", type=Path, nargs="?", help="defaults to the second most recent run")
+    compare_parser.add_argument("new", type=Path, nargs="?", help="defaults to the most recent run")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        asyncio.run(run(args))
+    elif args.command == "scrape":
+        scrape(args)
+    elif args.command == "retailer":
+        serve_retailer(args)
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Saved load-test results, named after the commit they were measured on.
+"""
+
+import json
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SCRAPE_RESULTS_DIR = RESULTS_DIR / "scrape"
+
+
+def current_commit() -> Dict[str, Any]:
+    """
+    Get the commit of the working tree, and whether it has local changes.
+    """
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return {"sha": "unknown", "dirty": False}
+    return {"sha": sha, "dirty": dirty}
+
+
+def save_result(result: Dict[str, Any], directory: Path = RESULTS_DIR) -> Path:
+    """
+    Save a run as <timestamp>-<commit>.json.
+
+    Returns:
+        Path of the saved file
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    commit = result["commit"]
+    name = f"{result['started_at'].replace(':', '')}-{commit['sha']}{'-dirty' if commit['dirty'] else ''}"
+    path = directory / f"{name}.json"
+    path.write_text(json.dumps(result, indent=2))
+    return path
+
+
+def load_result(path: Path) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text())
+
+
+def latest_result(directory: Path = RESULTS_DIR, exclude: Optional[Path] = None) -> Optional[Path]:
+    """
+    Get the most recent saved run, other than `exclude`.
+    """
+    paths = sorted(path for path in directory.glob("*.json") if path != exclude)
+    return paths[-1] if paths else None
+
+
+def utc_timestamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def format_change(old: float, new: float, higher_is_better: bool) -> str:
+    if not old:
+        return "   n/a"
+    change = (new - old) / old * 100
+    worse = change < 0 if higher_is_better else change > 0
+    return f"{change:+6.1f}%{' !' if worse and abs(change) >= 10 else ''}"
+
+
+def format_result(result: Dict[str, Any]) -> List[str]:
+    """
+    Format a run as a table of its levels and actions.
+    """
+    lines = [
+        f"{'concurrency':>11} {'action':<10} {'req/s':>9} {'p50 ms':>9} "
+        f"{'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    ]
+    for level in result["levels"]:
+        rows = [("all", level)] + list(level["actions"].items())
+        for name, summary in rows:
+            lines.append(
+                f"{level['concurrency']:>11} {name:<10} {summary['throughput']:>9.1f} "
+                f"{summary['p50_ms']:>9.1f} {summary['p95_ms']:>9.1f} "
+                f"{summary['p99_ms']:>9.1f} {summary['error_rate']:>7.2%}"
+            )
+    return lines
+
+
+def compare_results(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """
+    Compare two runs at the concurrency levels they have in common.
+
+    Changes of 10% or more in the wrong direction are flagged with "!".
+    """
+    lines = [
+        f"{old['commit']['sha']} ({old['started_at']}) -> "
+        f"{new['commit']['sha']} ({new['started_at']})",
+        f"{'concurrency':>11} {'action':<10} {'req/s':>9} {'p50':>9} "
+        f"{'p95':>9} {'p99':>9} {'errors':>15}",
+    ]
+    old_levels = {level["concurrency"]: level for level in old["levels"]}
+    for level in new["levels"]:
+        old_level = old_levels.get(level["concurrency"])
+        if old_level is None:
+            continue
+        rows = [("all", old_level, level)] + [
+            (name, old_level["actions"][name], summary)
+            for name, summary in level["actions"].items()
+            if name in old_level["actions"]
+        ]
+        for name, before, after in rows:
+            lines.append(
+                f"{level['concurrency']:>11} {name:<10} "
+                f"{format_change(before['throughput'], after['throughput'], True):>9} "
+                f"{format_change(before['p50_ms'], after['p50_ms'], False):>9} "
+                f"{format_change(before['p95_ms'], after['p95_ms'], False):>9} "
+                f"{format_change(before['p99_ms'], after['p99_ms'], False):>9} "
+                f"{before['error_rate']:>6.2%} -> {after['error_rate']:<6.2%}"
+            )
+    return lines
@@ -0,0 +1,216 @@
+"""
+Fake retailer serving recorded product pages, so the validate and scrape
+paths can be exercised without reaching the real stores.
+
+The page is picked from the Host header, so requests remapped from a real
+store with SCRAPE_HOST_REMAP get the page of that store, or else from the
+first segment of the path, for example http://127.0.0.1:8081/amazon/dp/B0TEST0001.
+
+Network and store behaviour are simulated with `RetailerConditions`: time to
+first byte, bandwidth, server errors, 503 throttling above a request rate and
+captcha pages.
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+
+PAGES_DIR = Path(__file__).parent / "pages"
+PLATFORMS = ("amazon", "newegg", "ebay")
+CHUNK_SIZE = 16 * 1024
+
+
+@dataclass
+class RetailerConditions:
+    """
+    Behaviour of the fake retailer. The defaults serve every page at once.
+    """
+
+    # Median time to first byte
+    latency_ms: float = 0
+    # Spread of the time to first byte, sigma of its log-normal distribution
+    latency_sigma: float = 0.5
+    # Download speed of each response, 0 for unlimited
+    bandwidth_kbps: float = 0
+    # Fraction of requests answered with a 500
+    error_rate: float = 0
+    # Requests per second each store serves before answering 503, 0 for unlimited
+    throttle_rps: float = 0
+    # Fraction of requests answered with a captcha page instead of the product
+    captcha_rate: float = 0
+    # Size the product pages are padded to, as recorded pages are much larger
+    # than the trimmed ones in `pages`
+    page_kb: int = 0
+
+    def time_to_first_byte(self, rng: random.Random) -> float:
+        if not self.latency_ms:
+            return 0.0
+        return self.latency_ms / 1000 * rng.lognormvariate(0, self.latency_sigma)
+
+
+def pad_page(page: bytes, size_kb: int) -> bytes:
+    """
+    Pad a page with the nested markup that makes up most of a store page, so
+    the scrapers parse a document of realistic size.
+    """
+    missing = size_kb * 1024 - len(page)
+    if missing <= 0:
+        return page
+    block = (
+        b'<div class="a-section a-spacing-small"><div class="a-row">'
+        b'<span class="a-size-base a-color-secondary">Customers also viewed</span>'
+        b'<a class="a-link-normal" href="/dp/B0RELATED0"><span class="a-truncate">'
+        b"Related product with a long descriptive title</span></a></div></div>\n"
+    )
+    padding = (
+        b'<div id="related-products" hidden>\n'
+        + block * (missing // len(block) + 1)
+        + b"</div>\n"
+    )
+    return page.replace(b"</body>", padding + b"</body>", 1)
+
+
+def load_pages(pages_dir: Path = PAGES_DIR, page_kb: int = 0) -> Dict[str, bytes]:
+    """
+    Load the recorded pages, keyed by platform, and the captcha page.
+
+    Args:
+        pages_dir: Directory holding <platform>.html files. The pages of
+            `PAGES_DIR` are used for the platforms it does not have
+        page_kb: Size the product pages are padded to
+    """
+    pages = {page.stem: page.read_bytes() for page in PAGES_DIR.glob("*.html")}
+    pages.update({page.stem: page.read_bytes() for page in Path(pages_dir).glob("*.html")})
+    return {
+        name: pad_page(page, page_kb) if name in PLATFORMS else page
+        for name, page in pages.items()
+    }
+
+
+class TokenBucket:
+    """
+    Request rate limit of a store, refilled continuously.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RetailerHandler(BaseHTTPRequestHandler):
+    server: "FakeRetailer"
+    protocol_version = "HTTP/1.1"
+
+    def get_platform(self) -> Optional[str]:
+        host = self.headers.get("Host", "")
+        for platform in PLATFORMS:
+            if platform in host:
+                return platform
+        platform = self.path.lstrip("/").split("/", 1)[0]
+        return platform if platform in PLATFORMS else None
+
+    def do_GET(self):
+        server = self.server
+        conditions = server.conditions
+        platform = self.get_platform()
+        page = server.pages.get(platform)
+        if page is None:
+            self.send_page(404, b"Not found")
+            return
+
+        rng = random.Random()
+        time.sleep(conditions.time_to_first_byte(rng))
+        bucket = server.buckets.get(platform)
+        if bucket is not None and not bucket.take():
+            self.send_page(503, b"Service Unavailable", {"Retry-After": "1"})
+        elif rng.random() < conditions.error_rate:
+            self.send_page(500, b"Internal Server Error")
+        elif rng.random() < conditions.captcha_rate:
+            self.send_page(200, server.pages["captcha"])
+        else:
+            self.send_page(200, page)
+
+    def send_page(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        bandwidth = self.server.conditions.bandwidth_kbps * 1024
+        for start in range(0, len(body), CHUNK_SIZE):
+            chunk = body[start : start + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            if bandwidth:
+                time.sleep(len(chunk) / bandwidth)
+
+    def log_message(self, format, *args):
+        # Thousands of requests per second would flood the terminal
+        pass
+
+
+class FakeRetailer(ThreadingHTTPServer):
+    """
+    Retailer server running in a background thread.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        conditions: Optional[RetailerConditions] = None,
+        pages_dir: Path = PAGES_DIR,
+    ):
+        """
+        Args:
+            host: Interface to listen on
+            port: Port to listen on, 0 picks a free one
+            conditions: Simulated network and store behaviour
+            pages_dir: Directory of recorded <platform>.html pages
+        """
+        super().__init__((host, port), RetailerHandler)
+        self.conditions = conditions or RetailerConditions()
+        self.pages = load_pages(pages_dir, self.conditions.page_kb)
+        self.buckets = (
+            {platform: TokenBucket(self.conditions.throttle_rps) for platform in PLATFORMS}
+            if self.conditions.throttle_rps
+            else {}
+        )
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def product_url(self, platform: str, product_id: str) -> str:
+        return f"{self.url}/{platform}/dp/{product_id}"
+
+    def start(self) -> "FakeRetailer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,124 @@
+"""
+Closed-loop load generator: each worker sends one request after the other,
+so the number of workers is the number of requests in flight.
+"""
+
+import asyncio
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import httpx
+
+from .scenarios import ACTIONS, EXPECTED_STATUS, Session
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of already sorted values.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], errors: Dict[str, int], seconds: float) -> Dict[str, Any]:
+    """
+    Summarize the requests of an action, or of the whole traffic.
+
+    Args:
+        latencies: Duration of every request, in seconds
+        errors: Number of failed requests by status code, or exception name
+        seconds: Duration of the measurement
+
+    Returns:
+        Throughput, latency percentiles in milliseconds and error rate
+    """
+    latencies = sorted(latencies)
+    failed = sum(errors.values())
+    return {
+        "requests": len(latencies),
+        "throughput": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "error_rate": round(failed / len(latencies), 4) if latencies else 0.0,
+        "errors": dict(errors),
+    }
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    sessions: List[Session],
+    mix: Dict[str, int],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+) -> Dict[str, Any]:
+    """
+    Send the traffic mix with a number of concurrent workers.
+
+    Requests finishing during the warmup are not measured, so the level is
+    measured once the connections are open and the API caches are warm.
+
+    Args:
+        client: Client of the API, allowing `concurrency` connections
+        sessions: Users sending the requests, shared by the workers
+        mix: Weight of each action
+        concurrency: Number of requests in flight
+        duration: Seconds measured after the warmup
+        warmup: Seconds of traffic before the measurement
+
+    Returns:
+        Summary of the whole traffic, with the summary of each action
+    """
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def worker(index: int):
+        rng = random.Random(index)
+        while True:
+            name = rng.choices(names, weights)[0]
+            session = sessions[rng.randrange(len(sessions))]
+            sent = time.perf_counter()
+            try:
+                response = await ACTIONS[name](client, session)
+                error = (
+                    None
+                    if response.status_code == EXPECTED_STATUS.get(name, 200)
+                    else str(response.status_code)
+                )
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            received = time.perf_counter()
+            if received >= stop_at:
+                return
+            if sent >= measure_from:
+                latencies[name].append(received - sent)
+                if error is not None:
+                    errors[name][error] += 1
+
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    all_errors: Dict[str, int] = defaultdict(int)
+    for action_errors in errors.values():
+        for error, count in action_errors.items():
+            all_errors[error] += count
+    return {
+        "concurrency": concurrency,
+        **summarize(all_latencies, all_errors, duration),
+        "actions": {
+            name: summarize(latencies[name], errors[name], duration) for name in names
+        },
+    }
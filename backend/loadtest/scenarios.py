@@ -0,0 +1,173 @@
+"""
+Requests of the traffic mix and the users sending them.
+"""
+
+import random
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+# Share of each action in the traffic, close to what the frontend sends:
+# mostly page loads checking the session and listing products, with the
+# occasional product being validated and added
+DEFAULT_MIX = {
+    "login": 5,
+    "auth_user": 30,
+    "products": 45,
+    "validate": 12,
+    "add": 8,
+}
+
+LOADTEST_PASSWORD = "loadtest-password"
+
+
+@dataclass
+class Session:
+    """
+    Logged in user of the load test.
+    """
+
+    username: str
+    password: str
+    # Sent as X-Forwarded-For, so each user is throttled like a distinct client
+    client_ip: str
+    token: Optional[str] = None
+    user_id: Optional[str] = None
+    product_urls: List[str] = field(default_factory=list)
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"X-Forwarded-For": self.client_ip}
+        if self.token:
+            headers["Cookie"] = f"access_token={self.token}"
+        return headers
+
+
+Action = Callable[[httpx.AsyncClient, Session], Awaitable[httpx.Response]]
+
+
+async def login(client: httpx.AsyncClient, session: Session) -> httpx.Response:
+    response = await client.post(
+        "/api/token",
+        data={"username": session.username, "password": session.password},
+        headers={"X-Forwarded-For": session.client_ip},
+    )
+    if response.status_code == 200:
+        session.token = response.json()["access_token"]
+    return response
+
+
+async def auth_user(client: httpx.AsyncClient, session: Session) -> httpx.Response:
+    return await client.get("/api/auth-user", headers=session.headers)
+
+
+async def products(client: httpx.AsyncClient, session: Session) -> httpx.Response:
+    return await client.get("/api/products/", headers=session.headers)
+
+
+async def validate(client: httpx.AsyncClient, session: Session) -> httpx.Response:
+    return await client.post(
+        "/api/products/validate/amazon",
+        json={"productUrl": random.choice(session.product_urls)},
+        headers=session.headers,
+    )
+
+
+async def add(client: httpx.AsyncClient, session: Session) -> httpx.Response:
+    return await client.post(
+        "/api/products/add",
+        json={
+            "userId": session.user_id,
+            "platform": "amazon",
+            "productLink": random.choice(session.product_urls),
+            "productName": "Acme Noise Cancelling Wireless Headphones",
+        },
+        headers=session.headers,
+    )
+
+
+ACTIONS: Dict[str, Action] = {
+    "login": login,
+    "auth_user": auth_user,
+    "products": products,
+    "validate": validate,
+    "add": add,
+}
+
+# Status of a successful response, anything else counts as an error
+EXPECTED_STATUS = {"add": 201}
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """
+    Parse a traffic mix such as "auth_user=30,products=45".
+
+    Raises:
+        ValueError: If an action is unknown or a weight is not a positive integer
+    """
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise ValueError(f"Unknown action {name!r}, expected one of {', '.join(ACTIONS)}")
+        mix[name] = int(weight)
+        if mix[name] <= 0:
+            raise ValueError(f"Weight of {name} must be positive")
+    return mix
+
+
+async def prepare_sessions(
+    client: httpx.AsyncClient,
+    admin_username: str,
+    admin_password: str,
+    count: int,
+    product_urls: List[str],
+) -> List[Session]:
+    """
+    Log the load-test users in, creating the missing ones with the admin account.
+
+    Args:
+        client: Client of the API
+        admin_username: Username of an admin
+        admin_password: Password of the admin
+        count: Number of users sending the traffic
+        product_urls: Pages of the fake retailer validated and added by the users
+
+    Returns:
+        The logged in users
+    """
+    admin = Session(admin_username, admin_password, client_ip="10.78.0.1")
+    sessions = []
+    for index in range(count):
+        session = Session(
+            username=f"loadtest{index}",
+            password=LOADTEST_PASSWORD,
+            client_ip=f"10.77.{index // 250}.{index % 250 + 1}",
+            product_urls=product_urls,
+        )
+        response = await login(client, session)
+        if response.status_code == 401:
+            if admin.token is None:
+                (await login(client, admin)).raise_for_status()
+            created = await client.post(
+                "/api/users/create",
+                json={
+                    "username": session.username,
+                    "password": session.password,
+                    "email": f"{session.username}@loadtest.example.com",
+                    "firstName": "Load",
+                    "lastName": "Test",
+                },
+                headers=admin.headers,
+            )
+            created.raise_for_status()
+            response = await login(client, session)
+        response.raise_for_status()
+
+        user = await auth_user(client, session)
+        user.raise_for_status()
+        session.user_id = user.json()["_id"]
+        sessions.append(session)
+    return sessions
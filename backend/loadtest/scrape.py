@@ -0,0 +1,116 @@
+"""
+End-to-end scrape benchmark: product pages fetched with `make_request` from
+the fake retailer and parsed by the scrapers, the way scheduled scrapes do,
+with each worker thread scraping one product after the other.
+
+The application settings are read from the environment and .env, like the
+worker, with SCRAPE_HOST_REMAP pointing the stores at the fake retailer.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from .retailer import PLATFORMS, FakeRetailer
+from .runner import summarize
+
+PRODUCT_URLS = {
+    "amazon": "https://www.amazon.com/dp/B0BENCH{index:04d}",
+    "newegg": "https://www.newegg.com/p/N82E1681{index:04d}",
+    "ebay": "https://www.ebay.com/itm/{index:012d}",
+}
+
+
+def remap_stores(retailer: FakeRetailer):
+    """
+    Point the store hosts at the fake retailer. Must run before the
+    application settings are first read.
+    """
+    os.environ["SCRAPE_HOST_REMAP"] = json.dumps(
+        {url.split("/")[2]: retailer.url for url in PRODUCT_URLS.values()}
+    )
+
+
+def run_scrape_level(concurrency: int, duration: float, warmup: float) -> Dict[str, Any]:
+    """
+    Scrape products of every store with a number of worker threads.
+
+    A scrape succeeds when a price is found. Failed fetches, captcha pages
+    and other pages without a price count as errors, by outcome.
+
+    Args:
+        concurrency: Number of scrapes in flight
+        duration: Seconds measured after the warmup
+        warmup: Seconds of scrapes before the measurement
+
+    Returns:
+        Summary of every scrape, with the summary of each store
+    """
+    from src.helpers.requester import make_request
+    from src.products.service import build_tracking_point, scrape_product_page
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(index: int):
+        scrapes = 0
+        while True:
+            platform = PLATFORMS[(index + scrapes) % len(PLATFORMS)]
+            url = PRODUCT_URLS[platform].format(index=index * 1000 + scrapes % 1000)
+            scrapes += 1
+            sent = time.perf_counter()
+            response = make_request(url, platform=platform)
+            if response is None:
+                error = "fetch_failed"
+            else:
+                try:
+                    scraped = scrape_product_page(platform, response.text)
+                    error = None if build_tracking_point(scraped) else "no_price"
+                except Exception:
+                    # Captcha pages break the scrapers in different ways
+                    error = "parse_failed"
+            received = time.perf_counter()
+            if received >= stop_at:
+                return
+            if sent >= measure_from:
+                with lock:
+                    latencies[platform].append(received - sent)
+                    if error is not None:
+                        errors[platform][error] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    all_errors: Dict[str, int] = defaultdict(int)
+    for platform_errors in errors.values():
+        for error, count in platform_errors.items():
+            all_errors[error] += count
+    level = {"concurrency": concurrency, **summarize(all_latencies, all_errors, duration)}
+    level["scrapes_per_second"] = round(
+        (level["requests"] - sum(all_errors.values())) / duration, 2
+    )
+    level["actions"] = {
+        platform: summarize(latencies[platform], errors[platform], duration)
+        for platform in PLATFORMS
+    }
+    return level
+
+
+def quiet_scrape_logs():
+    """
+    Keep the warnings of failed fetches and parses, which the benchmark
+    causes on purpose, out of the console.
+    """
+    from src.helpers.logger import scrapers_logger
+
+    scrapers_logger.setLevel(logging.ERROR)
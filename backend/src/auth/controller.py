@@ -1,6 +1,5 @@
 from datetime import timedelta
 from typing import Annotated, Dict
-from fastapi.templating import Jinja2Templates
 from fastapi import (
     APIRouter,
     Body,
@@ -14,20 +13,23 @@ from fastapi import (
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
-from ..mail.mailer import mailer, create_email_message
+from ..mail.queue import enqueue_mail
 from ..mail.models import EmailSchema
 from ..helpers.logger import auth_logger, log_error, log_request
 from ..helpers.settings import get_settings
-from ..users.models import UserModel
+from ..users.models import UserModel, UserRole
 from .models import PasswordResetChangeModel, PasswordResetModel, Token
 from .service import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     authenticate_user,
+    check_login_throttle,
     create_access_token,
     create_reset_token,
     get_user_by_email,
     get_user_by_id,
+    revoke_token,
     update_user_password,
+    user_cache,
     validate_reset_token,
     validate_token,
 )
@@ -47,8 +49,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     try:
-        token_data = await validate_token(token)
-        current_user = UserModel(**token_data)
+        current_user = await validate_token(token)
         return current_user
     except HTTPException as e:
         raise e
@@ -63,6 +64,10 @@ async def login(
     try:
         auth_logger.info(f"Login attempt for user: {form_data.username}")
 
+        # Reject brute-force traffic before any password work starts
+        client_ip = request.client.host if request.client else None
+        check_login_throttle(form_data.username, client_ip)
+
         user = await authenticate_user(form_data.username, form_data.password)
         if not user:
             auth_logger.warning(f"Failed login attempt for user: {form_data.username}")
@@ -74,7 +79,7 @@ async def login(
 
         access_token_expiration = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data=user.model_dump(),
+            data=user.model_dump(mode="json"),
             expires_delta=access_token_expiration,
         )
         token_data = Token(access_token=access_token, token_type="bearer")
@@ -143,16 +148,14 @@ async def password_reset(payload: PasswordResetModel):
                 "name": f"{user.first_name} {user.last_name}",
             }
         )
-        # Render the email body with the data
-        
-        email_message = create_email_message(
+        # Sent in the background, the response does not wait for the SMTP server
+        await enqueue_mail(
             subject="Password Reset Request",
             recipients=email_schema.model_dump().get("email"),
+            template_name="reset-password.html",
             body=email_schema.model_dump().get("body"),
         )
         
-        await mailer.send_message(message=email_message, template_name="reset-password.html")
-        
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={"reset_link": reset_link, "token": reset_token},
@@ -221,6 +224,8 @@ async def password_reset_change(
                 "user": updated_user.model_dump(exclude={"password"}, mode="json"),
             },
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -245,13 +250,32 @@ async def authenticated_user(
         )
 
 
+@router.get("/auth-user/cache", tags=["Authentication"])
+async def authenticated_user_cache_stats(
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+):
+    """
+    Endpoint to get the hit rate and size of the authenticated user cache.
+    Requires existing user to have role 'admin'.
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to view cache statistics",
+        )
+    return user_cache.stats()
+
+
 @router.get("/logout", tags=["Authentication"])
-async def logout():
+async def logout(request: Request):
     """
     Endpoint to log out the user.
-    This will clear the authentication cookies.
+    This will revoke the access token and clear the authentication cookies.
     """
     try:
+        token = request.cookies.get("access_token")
+        if token:
+            await revoke_token(token)
         response = JSONResponse(
             status_code=status.HTTP_200_OK,
             content={"message": "Logged out successfully"},
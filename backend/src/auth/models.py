@@ -1,5 +1,9 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field, EmailStr
 
+from ..users.models import UserRole
+
 
 class LoginModel(BaseModel):
     """The Login Model"""
@@ -30,6 +34,11 @@ class TokenData(BaseModel):
         id (Optional[str]): The unique identifier of the user.
         username (Optional[str]): The username of the user.
         email (Optional[str]): The email address of the user.
+        role (Optional[UserRole]): The role of the user.
+        first_name (Optional[str]): The first name of the user.
+        last_name (Optional[str]): The last name of the user.
+        token_version (int): The token version of the user when the token was issued.
+        jti (Optional[str]): The unique identifier of the token.
     """
 
     id: str = Field(..., title="User ID", description="Unique identifier of the user")
@@ -43,6 +52,23 @@ class TokenData(BaseModel):
         title="Email",
         description="Email address of the user",
     )
+    role: Optional[UserRole] = Field(
+        None, title="Role", description="Role of the user"
+    )
+    first_name: Optional[str] = Field(
+        None, title="First Name", description="First name of the user"
+    )
+    last_name: Optional[str] = Field(
+        None, title="Last Name", description="Last name of the user"
+    )
+    token_version: int = Field(
+        0,
+        title="Token Version",
+        description="Token version of the user when the token was issued",
+    )
+    jti: Optional[str] = Field(
+        None, title="Token ID", description="Unique identifier of the token"
+    )
 
 class ResetTokenData(BaseModel):
     """The Reset Token Data Model
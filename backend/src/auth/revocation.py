@@ -0,0 +1,166 @@
+"""
+Revocation of access tokens.
+
+Revocations are written to Mongo and mirrored in memory by every worker, so
+checking whether a token is revoked is a dictionary lookup. Two kinds exist:
+
+- user revocations raise the minimum token version of a user, which rejects
+  every token issued before a password change, role change or deletion
+- token revocations reject a single token by its `jti`, used on logout
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Tuple
+
+from ..helpers.db import db, CollectionNames
+from ..helpers.logger import auth_logger, log_error
+from ..helpers.settings import get_settings
+
+environmentConfig = get_settings()
+
+# Token version used to revoke every token of a deleted user
+DELETED_USER_TOKEN_VERSION = 2**31 - 1
+# Overlap between refreshes, so revocations written with a slightly older
+# timestamp by another worker are not missed
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class RevocationStore:
+    """
+    In-memory mirror of the token_revocations collection.
+
+    The mirror is refreshed incrementally: each refresh only reads the
+    revocations created since the previous one. Revocations are dropped from
+    it once every token they reject has expired.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        # Minimum token version of each user, and when the tokens issued
+        # before it was raised have all expired
+        self.min_token_versions: Dict[str, Tuple[int, datetime]] = {}
+        self.revoked_tokens: Dict[str, datetime] = {}
+        self._synced_until: datetime | None = None
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def is_revoked(self, user_id: str, token_version: int, jti: str | None) -> bool:
+        """
+        Check whether a token has been revoked.
+
+        Args:
+            user_id: ID of the user the token was issued to
+            token_version: Token version of the user when the token was issued
+            jti: Unique ID of the token, if any
+
+        Returns:
+            True if the token must be rejected
+        """
+        min_token_version = self.min_token_versions.get(user_id)
+        if min_token_version is not None and token_version < min_token_version[0]:
+            return True
+        return jti is not None and jti in self.revoked_tokens
+
+    def _apply(self, revocation: dict):
+        if revocation.get("jti"):
+            self.revoked_tokens[revocation["jti"]] = revocation["expiresAt"]
+        if revocation.get("userId"):
+            # Expires with the tokens issued before the revocation
+            token_version, expires_at = self.min_token_versions.get(
+                revocation["userId"], (0, revocation["expiresAt"])
+            )
+            self.min_token_versions[revocation["userId"]] = (
+                max(token_version, revocation["tokenVersion"]),
+                max(expires_at, revocation["expiresAt"]),
+            )
+
+    def _prune(self, now: datetime):
+        """
+        Drop the revocations whose tokens have all expired.
+
+        Args:
+            now: Current time, naive UTC like the stored expiry times
+        """
+        self.revoked_tokens = {
+            jti: expires_at
+            for jti, expires_at in self.revoked_tokens.items()
+            if expires_at > now
+        }
+        self.min_token_versions = {
+            user_id: min_token_version
+            for user_id, min_token_version in self.min_token_versions.items()
+            if min_token_version[1] > now
+        }
+
+    async def refresh_if_stale(self):
+        """
+        Read the revocations created since the last refresh, at most every
+        `refresh_seconds`.
+        """
+        if time.monotonic() - self._refreshed_at < self.refresh_seconds:
+            return
+        async with self._lock:
+            if time.monotonic() - self._refreshed_at < self.refresh_seconds:
+                return
+            try:
+                started_at = datetime.now(timezone.utc)
+                query = {}
+                if self._synced_until is not None:
+                    query = {"createdAt": {"$gte": self._synced_until - REFRESH_OVERLAP}}
+                async for revocation in db.get_collection(
+                    CollectionNames.TOKEN_REVOCATIONS
+                ).find(query):
+                    self._apply(revocation)
+
+                self._prune(datetime.now(timezone.utc).replace(tzinfo=None))
+                self._synced_until = started_at
+            except Exception as e:
+                # Keep serving from the current mirror and retry on the next refresh
+                log_error(auth_logger, e, "Error refreshing token revocations")
+            self._refreshed_at = time.monotonic()
+
+    async def _insert(self, revocation: dict):
+        now = datetime.now(timezone.utc)
+        revocation.setdefault(
+            "expiresAt",
+            now + timedelta(minutes=environmentConfig.ACCESS_TOKEN_EXPIRE_MINUTES),
+        )
+        revocation["createdAt"] = now
+        await db.get_collection(CollectionNames.TOKEN_REVOCATIONS).insert_one(revocation)
+        self._apply(
+            {**revocation, "expiresAt": revocation["expiresAt"].replace(tzinfo=None)}
+        )
+
+    async def revoke_user(self, user_id: str, token_version: int):
+        """
+        Reject every token of a user issued with a lower token version.
+
+        Args:
+            user_id: ID of the user
+            token_version: Lowest token version that stays valid
+        """
+        await self._insert({"userId": str(user_id), "tokenVersion": token_version})
+
+    async def revoke_token(self, jti: str, expires_at: datetime):
+        """
+        Reject a single token.
+
+        Args:
+            jti: Unique ID of the token
+            expires_at: When the token expires anyway
+        """
+        await self._insert({"jti": jti, "expiresAt": expires_at})
+
+
+revocation_store = RevocationStore(environmentConfig.REVOCATION_REFRESH_SECONDS)
+
+
+async def ensure_revocation_indexes():
+    """
+    Create the index expiring revocations once their tokens have expired.
+    """
+    collection = db.get_collection(CollectionNames.TOKEN_REVOCATIONS)
+    await collection.create_index("expiresAt", expireAfterSeconds=0)
+    await collection.create_index("createdAt")
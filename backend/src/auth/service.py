@@ -1,5 +1,9 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Annotated, Optional
+from uuid import uuid4
 
 import jwt
 from bson import ObjectId
@@ -7,11 +11,15 @@ from fastapi import Depends, HTTPException, status, Body
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
+from pymongo import ReturnDocument
 
-from ..helpers.db import db
+from ..helpers.cache import TTLCache
+from ..helpers.db import db, CollectionNames
+from ..helpers.ratelimit import SlidingWindowLimiter
 from ..helpers.settings import get_settings
 from ..users.models import UserModel
 from .models import TokenData, ResetTokenData
+from .revocation import DELETED_USER_TOKEN_VERSION, revocation_store
 
 environmentConfig = get_settings()
 
@@ -20,10 +28,39 @@ ALGORITHM = (
     environmentConfig.JWT_ALGORITHM if environmentConfig.JWT_ALGORITHM else "HS256"
 )
 
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+ACCESS_TOKEN_EXPIRE_MINUTES = environmentConfig.ACCESS_TOKEN_EXPIRE_MINUTES
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Validated users keyed by user id, so authenticated requests skip the database
+user_cache = TTLCache(
+    maxsize=environmentConfig.USER_CACHE_MAX_SIZE,
+    ttl=environmentConfig.USER_CACHE_TTL_SECONDS,
+)
+# Version of the user cache known to this worker. Bumped in Mongo on every
+# invalidation so other workers drop their cached users too.
+_user_cache_version: int | None = None
+_user_cache_checked_at = 0.0
+
+
+# bcrypt is CPU bound, so it runs in its own bounded pool instead of the event loop
+password_executor = ThreadPoolExecutor(
+    max_workers=environmentConfig.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash",
+)
+# Password jobs running or waiting in the pool
+_password_jobs = 0
+
+# Login throttling, checked before any password work starts
+login_ip_limiter = SlidingWindowLimiter(
+    limit=environmentConfig.LOGIN_MAX_ATTEMPTS_PER_IP,
+    window_seconds=environmentConfig.LOGIN_THROTTLE_WINDOW_SECONDS,
+)
+login_username_limiter = SlidingWindowLimiter(
+    limit=environmentConfig.LOGIN_MAX_FAILURES_PER_USERNAME,
+    window_seconds=environmentConfig.LOGIN_THROTTLE_WINDOW_SECONDS,
+)
+
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -33,8 +70,74 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+async def run_password_job(func, *args):
+    """
+    Run a password hashing function in the password pool.
+
+    Sheds load with a 429 once PASSWORD_HASH_MAX_QUEUE jobs are pending so a
+    login storm cannot queue up unbounded CPU work.
+
+    Args:
+        func: Function to run
+        *args: Arguments of the function
+
+    Returns:
+        The result of the function
+    """
+    global _password_jobs
+
+    if _password_jobs >= environmentConfig.PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Server is busy, please try again later",
+            headers={"Retry-After": "1"},
+        )
+    _password_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        _password_jobs -= 1
+
+
+async def averify_password(plain_password, hashed_password) -> bool:
+    return await run_password_job(verify_password, plain_password, hashed_password)
+
+
+async def aget_password_hash(password) -> str:
+    return await run_password_job(get_password_hash, password)
+
+
+def check_login_throttle(username: str, client_ip: str | None):
+    """
+    Reject a login attempt when its client IP or username is throttled.
+
+    Args:
+        username: Username of the login attempt
+        client_ip: IP address of the client, if known
+
+    Raises:
+        HTTPException: 429 if the attempt is throttled
+    """
+    retry_after = max(
+        login_ip_limiter.retry_after(client_ip) if client_ip else 0,
+        login_username_limiter.retry_after(username.lower()),
+    )
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, please try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+    if client_ip:
+        login_ip_limiter.hit(client_ip)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
+    # Unique token id, so a single token can be revoked on logout
+    if not to_encode.get("jti"):
+        to_encode["jti"] = uuid4().hex
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
@@ -80,20 +183,77 @@ async def validate_reset_token(reset_token: Annotated[str, Body(...)]) -> dict:
 async def authenticate_user(username: str, password: str, db=db) -> TokenData | None:
     user = await db.get_collection("users").find_one({"username": username})
     if not user:
+        login_username_limiter.hit(username.lower())
         return None
     user = UserModel(**user)
 
-    if not verify_password(password, user.password):
+    if not await averify_password(password, user.password):
+        login_username_limiter.hit(username.lower())
         return None
+    login_username_limiter.reset(username.lower())
 
+    # Carry the claims needed to authenticate requests without a database read
     jwt_token_data = TokenData(
-        id=str(user.id), username=user.username, email=user.email
+        id=str(user.id),
+        username=user.username,
+        email=user.email,
+        role=user.role,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        token_version=user.token_version,
     )
 
     return jwt_token_data
 
 
-async def validate_token(token: Annotated[str, Depends(oauth2_scheme)]) -> dict:
+async def sync_user_cache_version():
+    """
+    Drop the cached users if another worker invalidated a user since the
+    last check. Checks at most every USER_CACHE_VERSION_CHECK_SECONDS.
+    """
+    global _user_cache_version, _user_cache_checked_at
+
+    now = time.monotonic()
+    if now - _user_cache_checked_at < environmentConfig.USER_CACHE_VERSION_CHECK_SECONDS:
+        return
+    _user_cache_checked_at = now
+
+    version_doc = await db.get_collection(CollectionNames.CACHE_VERSIONS).find_one(
+        {"_id": CollectionNames.USERS}
+    )
+    version = version_doc["version"] if version_doc else 0
+    if version != _user_cache_version:
+        user_cache.clear()
+        _user_cache_version = version
+
+
+async def invalidate_cached_user(user_id: str):
+    """
+    Remove a user from the cache of every worker.
+
+    Must be called whenever a user record is changed or deleted.
+
+    Args:
+        user_id: ID of the changed user
+    """
+    global _user_cache_version
+
+    user_cache.delete(str(user_id))
+    version_doc = await db.get_collection(CollectionNames.CACHE_VERSIONS).find_one_and_update(
+        {"_id": CollectionNames.USERS},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if version_doc["version"] == (_user_cache_version or 0) + 1:
+        # Only our own invalidation happened since the last check
+        _user_cache_version = version_doc["version"]
+    else:
+        user_cache.clear()
+        _user_cache_version = version_doc["version"]
+
+
+async def validate_token(token: Annotated[str, Depends(oauth2_scheme)]) -> UserModel:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         token_data = TokenData(**payload)
@@ -103,14 +263,95 @@ async def validate_token(token: Annotated[str, Depends(oauth2_scheme)]) -> dict:
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = await db.get_collection("users").find_one({"_id": ObjectId(token_data.id)})
-    if not user:
+
+    await revocation_store.refresh_if_stale()
+    if revocation_store.is_revoked(
+        token_data.id, token_data.token_version, token_data.jti
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail="Token has been revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return UserModel(**user).model_dump(exclude=["password"])
+
+    if environmentConfig.AUTH_STATELESS and token_data.role is not None:
+        # The signature and revocation checks above are all that is needed
+        return UserModel.model_construct(
+            id=token_data.id,
+            role=token_data.role,
+            username=token_data.username,
+            email=token_data.email,
+            first_name=token_data.first_name,
+            last_name=token_data.last_name,
+            token_version=token_data.token_version,
+        )
+
+    await sync_user_cache_version()
+    user = user_cache.get(token_data.id)
+    if user is None:
+        user_db = await db.get_collection("users").find_one(
+            {"_id": ObjectId(token_data.id)}, projection={"password": 0}
+        )
+        if not user_db:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        user = UserModel(**user_db)
+        user_cache.set(token_data.id, user)
+    if token_data.token_version < user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    # Callers get their own copy so the cached user cannot be modified
+    return user.model_copy()
+
+
+async def revoke_user_tokens(user_id: str, deleted: bool = False):
+    """
+    Revoke every token issued to a user so far.
+
+    Must be called when a user's password, role or existence changes.
+
+    Args:
+        user_id: ID of the user
+        deleted: Whether the user was deleted
+
+    Returns:
+        None
+    """
+    if deleted:
+        await revocation_store.revoke_user(user_id, DELETED_USER_TOKEN_VERSION)
+        return
+    user = await db.get_collection("users").find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$inc": {"tokenVersion": 1}},
+        projection={"tokenVersion": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if user:
+        await revocation_store.revoke_user(user_id, user["tokenVersion"])
+
+
+async def revoke_token(token: str):
+    """
+    Revoke a single access token, e.g. on logout.
+
+    Args:
+        token: The encoded access token
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except InvalidTokenError:
+        # Invalid or expired tokens are rejected anyway
+        return
+    if payload.get("jti"):
+        await revocation_store.revoke_token(
+            payload["jti"], datetime.fromtimestamp(payload["exp"], timezone.utc)
+        )
 
 
 async def get_user_by_email(email: str, db=db) -> UserModel | None:
@@ -141,12 +382,16 @@ async def get_user_by_id(user_id: str, db=db) -> UserModel | None:
 
 async def update_user_password(user: UserModel, new_password: str, db=db) -> UserModel:
     try:
-        hashed_password = get_password_hash(new_password)
+        hashed_password = await aget_password_hash(new_password)
         await db.get_collection("users").update_one(
             {"_id": ObjectId(user.id)}, {"$set": {"password": hashed_password}}
         )
+        await revoke_user_tokens(user.id)
+        await invalidate_cached_user(user.id)
         user.password = hashed_password
         return user
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
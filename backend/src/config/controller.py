@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from ..helpers.db import db
 from .models import ConfigModel
+from .service import config_service
 from .service import get_user_agents as get_user_agents_service
 from .service import get_proxy_servers as get_proxy_servers_service
 
@@ -46,12 +46,10 @@ async def update_user_agents(user_agents: list[str]):
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User agents list cannot be empty",
             )
-        result = await db.get_collection("user_agents").delete_many({})
-        if result.deleted_count > 0:
-            await db.get_collection("user_agents").insert_many(
-                [{"user_agent": ua} for ua in user_agents]
-            )
+        await config_service.update_config(user_agents=user_agents)
         return {"message": "User agents updated successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
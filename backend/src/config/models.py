@@ -30,4 +30,8 @@ class ConfigModel(BaseModel):
         default_factory=list,
         description="List of proxy servers to be used for requests",
         alias="proxyServers",
-    )
\ No newline at end of file
+    )
+    version: int = Field(
+        default=0,
+        description="Incremented on every change of the configuration",
+    )
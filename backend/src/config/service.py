@@ -1,21 +1,165 @@
+import asyncio
+import threading
+import time
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+
 from ..helpers.db import db, CollectionNames
+from ..helpers.settings import get_settings
 from .models import ConfigModel
-from typing import List, Optional
-from bson import ObjectId
 
+environment = get_settings()
+
+# ID of the configuration document
+DEFAULT_CONFIG_ID = "default"
+
+
+class ConfigService:
+    """
+    Serves the `default` configuration document from memory.
+
+    Every write goes through this service and increments the document's
+    `version` field. Readers check that field at most every
+    CONFIG_VERSION_CHECK_SECONDS and reload the document only when it changed,
+    so writes made by other workers are picked up without reading the whole
+    document on every call.
+
+    The returned ConfigModel is shared and must not be modified.
+    """
+
+    def __init__(self, check_seconds: float):
+        self.check_seconds = check_seconds
+        self._config: Optional[ConfigModel] = None
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._async_lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._config is not None
+            and time.monotonic() - self._checked_at < self.check_seconds
+        )
+
+    def _store(self, config_db: Optional[dict]):
+        with self._lock:
+            self._config = ConfigModel(**config_db) if config_db else None
+            self._version = config_db.get("version", 0) if config_db else None
+            self._checked_at = time.monotonic()
+
+    def _mark_checked(self):
+        with self._lock:
+            self._checked_at = time.monotonic()
+
+    async def get_config(self) -> ConfigModel:
+        """
+        Get the configuration, reloading it if its version changed.
+
+        Raises:
+            ValueError: If the configuration document does not exist
+        """
+        if not self._is_fresh():
+            async with self._async_lock:
+                if not self._is_fresh():
+                    collection = db.get_collection(CollectionNames.CONFIGS)
+                    version_doc = await collection.find_one(
+                        {"_id": DEFAULT_CONFIG_ID}, projection={"version": 1}
+                    )
+                    if (
+                        version_doc is None
+                        or self._config is None
+                        or version_doc.get("version", 0) != self._version
+                    ):
+                        self._store(await collection.find_one({"_id": DEFAULT_CONFIG_ID}))
+                    else:
+                        self._mark_checked()
+        if self._config is None:
+            raise ValueError("No configuration found")
+        return self._config
+
+    def get_config_sync(self) -> ConfigModel:
+        """
+        Get the configuration from a worker thread, such as a scheduled job.
+
+        Raises:
+            ValueError: If the configuration document does not exist
+        """
+        # Imported here so API-only code paths never touch the sync client
+        from ..scheduler.scheduling import db as sync_db
+
+        if not self._is_fresh():
+            collection = sync_db.get_collection(CollectionNames.CONFIGS)
+            version_doc = collection.find_one(
+                {"_id": DEFAULT_CONFIG_ID}, projection={"version": 1}
+            )
+            if (
+                version_doc is None
+                or self._config is None
+                or version_doc.get("version", 0) != self._version
+            ):
+                self._store(collection.find_one({"_id": DEFAULT_CONFIG_ID}))
+            else:
+                self._mark_checked()
+        if self._config is None:
+            raise ValueError("No configuration found")
+        return self._config
+
+    async def update_config(self, **changes) -> ConfigModel:
+        """
+        Update fields of the configuration and bump its version.
+
+        Args:
+            **changes: ConfigModel fields to set, by field name
+
+        Returns:
+            The updated configuration
+        """
+        update = ConfigModel.model_validate(changes).model_dump(
+            by_alias=True, include=set(changes)
+        )
+        config_db = await db.get_collection(CollectionNames.CONFIGS).find_one_and_update(
+            {"_id": DEFAULT_CONFIG_ID},
+            {"$set": update, "$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._store(config_db)
+        return self._config
+
+    async def create_default_config(self, user_agents: List[str]) -> bool:
+        """
+        Create the configuration document if it does not exist yet.
+
+        Args:
+            user_agents: User agents of the new configuration
+
+        Returns:
+            True if the document was created, False if it already existed
+        """
+        result = await db.get_collection(CollectionNames.CONFIGS).update_one(
+            {"_id": DEFAULT_CONFIG_ID},
+            {
+                "$setOnInsert": {
+                    "userAgents": user_agents,
+                    "proxyServers": [],
+                    "version": 1,
+                }
+            },
+            upsert=True,
+        )
+        self._checked_at = 0.0
+        return result.upserted_id is not None
+
+
+config_service = ConfigService(environment.CONFIG_VERSION_CHECK_SECONDS)
 
 
 async def get_user_agents() -> dict:
-    configs_db = await db.get_collection(CollectionNames.CONFIGS).find_one({"_id": "default"})
-    if not configs_db:
-        raise ValueError("No user agents found")
-    configs = ConfigModel(**configs_db)
+    configs = await config_service.get_config()
     return configs.model_dump(exclude={"proxy_servers"})
 
 
 async def get_proxy_servers() -> dict:
-    configs_db = await db.get_collection(CollectionNames.CONFIGS).find_one({"_id": "default"})
-    if not configs_db:
-        raise ValueError("No proxy servers found")
-    configs = ConfigModel(**configs_db)
-    return configs.model_dump(exclude={"user_agents"})
\ No newline at end of file
+    configs = await config_service.get_config()
+    return configs.model_dump(exclude={"user_agents"})
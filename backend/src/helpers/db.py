@@ -5,6 +5,7 @@ from pydantic import BeforeValidator
 from pymongo import AsyncMongoClient
 
 from .settings import get_settings
+from ..monitoring.mongo import command_listener
 
 
 environmentConfig = get_settings()
@@ -12,6 +13,7 @@ mongo_uri = environmentConfig.MONGO_URI.strip()
 
 client = AsyncMongoClient(
     mongo_uri,
+    event_listeners=[command_listener],
 )
 db = client[environmentConfig.MONGO_DB]
 
@@ -23,4 +25,13 @@ PyObjectId = Annotated[str, BeforeValidator(str)]
 class CollectionNames:
     USERS = "users"
     CONFIGS = "config"  # Changed to match the collection created earlier
-    PRODUCTS = "products"
\ No newline at end of file
+    PRODUCTS = "products"
+    SCRAPE_BUDGETS = "scrape_budgets"
+    SCHEDULER_NODES = "scheduler_nodes"
+    SCRAPE_LEASES = "scrape_leases"
+    CACHE_VERSIONS = "cache_versions"
+    TOKEN_REVOCATIONS = "token_revocations"
+    PRICE_EVENTS = "price_events"
+    LOCKS = "locks"
+    MAIL_QUEUE = "mail_queue"
+    SCHEMA_MIGRATIONS = "schema_migrations"
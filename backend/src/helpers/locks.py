@@ -0,0 +1,102 @@
+"""
+Locks shared by every process using the database.
+
+A lock is a document of the `locks` collection naming its owner and when it
+expires. It is taken by upserting the document only if it is free, expired or
+already ours, so acquiring a held lock fails on the duplicate `_id`. Expiry
+frees the locks of processes that died while holding them.
+"""
+
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from uuid import uuid4
+
+from pymongo.errors import DuplicateKeyError
+
+from .db import CollectionNames, db
+
+# Identifies this process as the owner of its locks
+PROCESS_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+
+
+class MongoLock:
+    """
+    Named lock held by at most one process at a time.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, poll_seconds: float = 0.5):
+        """
+        Args:
+            name: Name of the lock
+            ttl_seconds: Time after which the lock is released if not renewed
+            poll_seconds: Time between two attempts while waiting for the lock
+        """
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.poll_seconds = poll_seconds
+
+    async def acquire(self) -> bool:
+        """
+        Take the lock if it is free, or extend it if this process holds it.
+
+        Returns:
+            True if this process holds the lock
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            await db.get_collection(CollectionNames.LOCKS).update_one(
+                {
+                    "_id": self.name,
+                    "$or": [{"owner": PROCESS_ID}, {"expiresAt": {"$lte": now}}],
+                },
+                {
+                    "$set": {
+                        "owner": PROCESS_ID,
+                        "expiresAt": now + timedelta(seconds=self.ttl_seconds),
+                    }
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # Held by another process
+            return False
+
+    async def wait(self, timeout: Optional[float] = None):
+        """
+        Wait until the lock is taken.
+
+        Args:
+            timeout: Longest wait in seconds, defaults to twice the lock's ttl,
+                long enough for the lock of a dead process to expire
+
+        Raises:
+            TimeoutError: If the lock was not taken in time
+        """
+        deadline = time.monotonic() + (
+            timeout if timeout is not None else 2 * self.ttl_seconds
+        )
+        while not await self.acquire():
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for the {self.name} lock")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def release(self):
+        """
+        Release the lock if this process holds it.
+        """
+        await db.get_collection(CollectionNames.LOCKS).delete_one(
+            {"_id": self.name, "owner": PROCESS_ID}
+        )
+
+    async def __aenter__(self) -> "MongoLock":
+        # The block must finish within the ttl, the lock is not renewed
+        await self.wait()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.release()
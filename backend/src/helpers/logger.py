@@ -1,11 +1,22 @@
 """This file contains the configurations for the logger."""
 
+import atexit
+import gzip
+import json
 import logging
+import os
+import queue
+import random
+import shutil
 import sys
-from datetime import datetime
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
 from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
 from uvicorn.logging import ColourizedFormatter
 
@@ -13,9 +24,47 @@ from .settings import get_settings
 
 settings = get_settings()
 
-# Create logs directory if it doesn't exist
+# Created with the first log file
 LOGS_DIR = Path(__file__).parent.parent.parent / "logs"
-LOGS_DIR.mkdir(exist_ok=True)
+# Several API workers share the logs directory, each writes and rotates its own files
+PROCESS_SUFFIX = f"-{os.getpid()}" if settings.WORKERS > 1 else ""
+
+
+# Attributes every LogRecord has, anything else was passed with `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "color_message",
+    "levelprefix",
+    "endpoint",
+    "taskName",
+}
+
+
+def get_record_fields(record: logging.LogRecord) -> dict:
+    """
+    Get the structured fields passed to a log call with `extra`.
+
+    Args:
+        record: Log record
+
+    Returns:
+        Dictionary of the extra fields of the record
+    """
+    return {
+        key: value
+        for key, value in record.__dict__.items()
+        if key not in RECORD_ATTRIBUTES and not key.startswith("_")
+    }
+
+
+def format_record_fields(record: logging.LogRecord) -> str:
+    """
+    Format the structured fields of a record as ` key=value` pairs.
+    """
+    return "".join(
+        f" {key}={value}" for key, value in get_record_fields(record).items()
+    )
 
 
 class PriceTrackerFormatter(ColourizedFormatter):
@@ -34,7 +83,7 @@ class PriceTrackerFormatter(ColourizedFormatter):
         # Add custom context to the record if needed
         if hasattr(record, "endpoint"):
             record.name = f"{record.name}:{record.endpoint}"
-        return super().formatMessage(record)
+        return super().formatMessage(record) + format_record_fields(record)
 
 
 class PriceTrackerFileFormatter(logging.Formatter):
@@ -47,21 +96,349 @@ class PriceTrackerFileFormatter(logging.Formatter):
             fmt = "%(asctime)s - %(levelname)s - [%(name)s] %(message)s"
         super().__init__(fmt, datefmt="%Y-%m-%d %H:%M:%S")
 
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        return super().formatMessage(record) + format_record_fields(record)
+
+
+class PriceTrackerJSONFormatter(logging.Formatter):
+    """
+    Formatter writing each record as a single JSON object.
+
+    The structured fields passed with `extra` become top-level keys.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **get_record_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# ID of the HTTP request being handled, added to every record logged for it
+request_id_context: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Adds the ID of the current HTTP request to the records, if any.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_context.get()
+        if request_id is not None:
+            record.request_id = request_id
+        return True
+
 
-def get_log_file_path(logger_name: str) -> Path:
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the info and debug records of high-volume loggers.
+
+    Warnings and errors are always kept. Records are dropped before they are
+    queued, so sampled out records are never formatted nor written.
+    """
+
+    def __init__(self, sample_rates: Dict[str, float]):
+        """
+        Args:
+            sample_rates: Fraction of records kept, by logger name
+        """
+        super().__init__()
+        self.sample_rates = sample_rates
+        self.sampled_out = Counter()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        sample_rate = self.sample_rates.get(record.name, 1.0)
+        if sample_rate >= 1.0 or random.random() < sample_rate:
+            return True
+        self.sampled_out[record.name] += 1
+        return False
+
+
+def get_log_file_path(logger_name: str, date_str: Optional[str] = None) -> Path:
     """
     Get the log file path for a given logger name.
 
     Args:
         logger_name: Name of the logger
+        date_str: Day of the log file (YYYY-MM-DD), defaults to today
 
     Returns:
         Path object for the log file
     """
     # Create daily log files
-    date_str = datetime.now().strftime("%Y-%m-%d")
+    if date_str is None:
+        date_str = datetime.now().strftime("%Y-%m-%d")
     safe_name = logger_name.replace(".", "_")
-    return LOGS_DIR / f"{safe_name}_{date_str}.log"
+    return LOGS_DIR / f"{safe_name}{PROCESS_SUFFIX}_{date_str}.log"
+
+
+class DailyRotatingFileHandler(logging.FileHandler):
+    """
+    File handler that starts a new log file every day and whenever the
+    current file grows past `max_bytes`.
+
+    Rotated files are handed to the log maintenance thread for compression.
+    Rotation happens in the logging thread, never on the request path.
+    """
+
+    def __init__(self, logger_name: str, max_bytes: int):
+        self.logger_name = logger_name
+        self.max_bytes = max_bytes
+        self.date_str = datetime.now().strftime("%Y-%m-%d")
+        super().__init__(
+            get_log_file_path(logger_name, self.date_str),
+            mode="a",
+            encoding="utf-8",
+            delay=True,
+        )
+
+    def _open(self):
+        LOGS_DIR.mkdir(exist_ok=True)
+        return super()._open()
+
+    def should_rollover(self) -> bool:
+        if datetime.now().strftime("%Y-%m-%d") != self.date_str:
+            return True
+        return (
+            self.max_bytes > 0
+            and self.stream is not None
+            and self.stream.tell() >= self.max_bytes
+        )
+
+    def do_rollover(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+        today = datetime.now().strftime("%Y-%m-%d")
+        if today != self.date_str:
+            # Yesterday's file is complete
+            log_maintenance.compress(Path(self.baseFilename))
+            self.date_str = today
+            self.baseFilename = str(get_log_file_path(self.logger_name, today))
+        else:
+            backup_path = rotate_log_file(self.logger_name, max_size_mb=0)
+            if backup_path is not None:
+                log_maintenance.compress(backup_path)
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.should_rollover():
+                self.do_rollover()
+        except Exception:
+            self.handleError(record)
+        super().emit(record)
+
+
+class LogMaintenanceThread(threading.Thread):
+    """
+    Background thread compressing rotated log files and enforcing retention.
+
+    Started with the first log file, so importing the app, as the supervisor
+    of `fastapi run --workers` does, scans nothing.
+    """
+
+    def __init__(self, interval_seconds: float):
+        super().__init__(name="log-maintenance", daemon=True)
+        self.interval_seconds = interval_seconds
+        self._files_to_compress: queue.Queue = queue.Queue()
+        self._start_lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._start_lock:
+            if self.ident is None:
+                self.start()
+
+    def compress(self, log_file: Path):
+        """
+        Queue a rotated log file for compression.
+        """
+        self._files_to_compress.put(log_file)
+
+    def run(self):
+        next_retention_run = datetime.now()
+        while True:
+            timeout = max(0.0, (next_retention_run - datetime.now()).total_seconds())
+            try:
+                compress_log_file(self._files_to_compress.get(timeout=timeout))
+                continue
+            except queue.Empty:
+                pass
+            try:
+                # Files left uncompressed by a previous run or a crash
+                for log_file in get_log_files():
+                    if log_file.suffix == ".log" and not is_active_log_file(log_file):
+                        compress_log_file(log_file)
+                clean_old_logs(settings.LOG_RETENTION_DAYS, settings.LOG_MAX_TOTAL_SIZE_MB)
+            except Exception as e:
+                sys.stderr.write(f"Log maintenance failed: {e}\n")
+            next_retention_run = datetime.now() + timedelta(
+                seconds=self.interval_seconds
+            )
+
+
+class FileRouterHandler(logging.Handler):
+    """
+    Handler writing each record to the log file of the logger that created it.
+
+    File handlers are opened on first use, from the logging thread. The
+    first one starts the log maintenance thread.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.file_handlers: dict[str, DailyRotatingFileHandler] = {}
+        if settings.LOG_FORMAT == "json":
+            self.file_formatter = PriceTrackerJSONFormatter()
+        else:
+            self.file_formatter = PriceTrackerFileFormatter()
+
+    def get_file_handler(self, logger_name: str) -> DailyRotatingFileHandler:
+        file_handler = self.file_handlers.get(logger_name)
+        if file_handler is None:
+            file_handler = DailyRotatingFileHandler(
+                logger_name, settings.LOG_MAX_SIZE_MB * 1024 * 1024
+            )
+            file_handler.setFormatter(self.file_formatter)
+            self.file_handlers[logger_name] = file_handler
+            log_maintenance.ensure_started()
+        return file_handler
+
+    def emit(self, record: logging.LogRecord):
+        self.get_file_handler(record.name).handle(record)
+
+    def close(self):
+        for file_handler in self.file_handlers.values():
+            file_handler.close()
+        super().close()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Queue handler that never blocks the calling thread for long.
+
+    With the "drop" policy a record is dropped as soon as the queue is full.
+    With the "block" policy the caller waits up to LOG_QUEUE_BLOCK_TIMEOUT
+    seconds for room before the record is dropped. Dropped records are counted
+    per logger.
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy: str, block_timeout: float):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = Counter()
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so the record is passed as is and
+        # its message is only built by the logging thread if it gets written.
+        # Arguments must therefore not be mutated after the log call.
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.policy == "block":
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped[record.name] += 1
+        queue_listener.ensure_started()
+
+
+class LazyQueueListener(QueueListener):
+    """
+    Queue listener whose thread is started by the first queued record.
+
+    Importing the app, as the supervisor of `fastapi run --workers` does to
+    find it, therefore starts no thread unless something is logged.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._start_lock = threading.Lock()
+        self._stopped = False
+
+    def ensure_started(self):
+        if self._thread is not None or self._stopped:
+            return
+        with self._start_lock:
+            if self._thread is None and not self._stopped:
+                self.start()
+
+    def stop(self):
+        """
+        Write the queued records and stop the thread, if it was started.
+        """
+        with self._start_lock:
+            self._stopped = True
+            if self._thread is not None:
+                super().stop()
+
+
+# Records are handed to a background thread which does all formatting and I/O
+log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+queue_handler = NonBlockingQueueHandler(
+    log_queue, settings.LOG_QUEUE_POLICY, settings.LOG_QUEUE_BLOCK_TIMEOUT
+)
+
+sampling_filter = SamplingFilter(settings.LOG_SAMPLE_RATES)
+request_id_filter = RequestIdFilter()
+
+console_handler = logging.StreamHandler(sys.stdout)
+if settings.LOG_FORMAT == "json":
+    console_handler.setFormatter(PriceTrackerJSONFormatter())
+else:
+    console_handler.setFormatter(PriceTrackerFormatter(use_colors=True))
+file_router_handler = FileRouterHandler()
+
+# The file handler runs first as the console formatter may rename the record
+queue_listener = LazyQueueListener(
+    log_queue, file_router_handler, console_handler, respect_handler_level=True
+)
+log_maintenance = LogMaintenanceThread(settings.LOG_MAINTENANCE_INTERVAL_SECONDS)
+
+
+@atexit.register
+def stop_queue_listener():
+    """
+    Flush the queued records and close the log files on exit.
+    """
+    queue_listener.stop()
+    file_router_handler.close()
+
+
+def get_dropped_log_count() -> dict[str, int]:
+    """
+    Get the number of log records dropped because the log queue was full.
+
+    Returns:
+        Dictionary mapping logger names to dropped record counts
+    """
+    return dict(queue_handler.dropped)
+
+
+def get_sampled_out_log_count() -> dict[str, int]:
+    """
+    Get the number of log records discarded by sampling.
+
+    Returns:
+        Dictionary mapping logger names to discarded record counts
+    """
+    return dict(sampling_filter.sampled_out)
 
 
 @lru_cache
@@ -69,6 +446,9 @@ def get_logger(name: str = "pricetracker") -> logging.Logger:
     """
     Get a configured logger instance that extends uvicorn's logging.
 
+    Records are queued and written to the console and the logger's daily
+    log file by a background thread.
+
     Args:
         name: Logger name, defaults to "pricetracker"
 
@@ -81,20 +461,9 @@ def get_logger(name: str = "pricetracker") -> logging.Logger:
     if logger.handlers:
         return logger
 
-    # Create console handler with colored formatter
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_formatter = PriceTrackerFormatter(use_colors=True)
-    console_handler.setFormatter(console_formatter)
-
-    # Create file handler with non-colored formatter
-    log_file_path = get_log_file_path(name)
-    file_handler = logging.FileHandler(log_file_path, mode="a", encoding="utf-8")
-    file_formatter = PriceTrackerFileFormatter()
-    file_handler.setFormatter(file_formatter)
-
-    # Add both handlers to logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    logger.addHandler(queue_handler)
+    logger.addFilter(sampling_filter)
+    logger.addFilter(request_id_filter)
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
@@ -111,33 +480,7 @@ def get_endpoint_logger(endpoint_name: str) -> logging.Logger:
     Returns:
         Logger configured for the specific endpoint
     """
-    logger_name = f"pricetracker.{endpoint_name}"
-    logger = logging.getLogger(logger_name)
-
-    # Avoid adding handlers multiple times
-    if logger.handlers:
-        return logger
-
-    # Create console handler with colored formatter
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_formatter = PriceTrackerFormatter(
-        fmt="%(levelprefix)s [%(name)s] %(message)s", use_colors=True
-    )
-    console_handler.setFormatter(console_formatter)
-
-    # Create file handler with non-colored formatter
-    log_file_path = get_log_file_path(logger_name)
-    file_handler = logging.FileHandler(log_file_path, mode="a", encoding="utf-8")
-    file_formatter = PriceTrackerFileFormatter()
-    file_handler.setFormatter(file_formatter)
-
-    # Add both handlers to logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    logger.setLevel(logging.INFO)
-    logger.propagate = False
-
-    return logger
+    return get_logger(f"pricetracker.{endpoint_name}")
 
 
 def log_request(
@@ -159,8 +502,17 @@ def log_request(
         process_time: Request processing time in seconds
         client_ip: Client IP address (optional)
     """
-    client_info = f" - {client_ip}" if client_ip else ""
-    logger.info(f'"{method} {path}" {status_code} - {process_time:.2f}s{client_info}')
+    fields = {
+        "method": method,
+        "path": path,
+        "status_code": status_code,
+        "duration_ms": round(process_time * 1000, 2),
+    }
+    if client_ip:
+        fields["client_ip"] = client_ip
+    logger.info(
+        '"%s %s" %s - %.2fs', method, path, status_code, process_time, extra=fields
+    )
 
 
 def log_startup_event(logger: logging.Logger, event: str, details: str = None):
@@ -210,50 +562,120 @@ def log_database_operation(
         result: Operation result (optional)
         duration: Operation duration in seconds (optional)
     """
-    msg = f"DB {operation.upper()} on {collection}"
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    fields = {"db_operation": operation, "collection": collection}
     if duration:
-        msg += f" - {duration:.3f}s"
+        fields["duration_ms"] = round(duration * 1000, 2)
     if result and isinstance(result, dict):
         if "acknowledged" in result:
-            msg += f" - {'success' if result['acknowledged'] else 'failed'}"
+            fields["acknowledged"] = result["acknowledged"]
         if "matched_count" in result:
-            msg += f" - matched: {result['matched_count']}"
+            fields["matched_count"] = result["matched_count"]
         if "modified_count" in result:
-            msg += f" - modified: {result['modified_count']}"
+            fields["modified_count"] = result["modified_count"]
 
-    logger.info(msg)
+    logger.info("DB %s on %s", operation.upper(), collection, extra=fields)
 
 
 def get_log_files() -> list[Path]:
     """
-    Get all log files in the logs directory.
+    Get all log files in the logs directory, compressed or not.
 
     Returns:
         List of Path objects for log files
     """
-    return list(LOGS_DIR.glob("*.log"))
+    return list(LOGS_DIR.glob("*.log")) + list(LOGS_DIR.glob("*.log.gz"))
 
 
-def clean_old_logs(days_to_keep: int = 30):
+def is_active_log_file(log_file: Path) -> bool:
     """
-    Remove log files older than specified days.
+    Check whether a log file is currently being written to.
 
     Args:
-        days_to_keep: Number of days to keep logs (default: 30)
+        log_file: Path of the log file
+
+    Returns:
+        True if a logger writes to the file or will write to it today
     """
-    from datetime import timedelta
+    if log_file.suffix != ".log":
+        return False
+    active_files = {
+        Path(file_handler.baseFilename)
+        for file_handler in list(file_router_handler.file_handlers.values())
+    }
+    today = datetime.now().strftime("%Y-%m-%d")
+    return log_file in active_files or log_file.stem.endswith(today)
 
+
+def compress_log_file(log_file: Path) -> Optional[Path]:
+    """
+    Compress a log file with gzip and remove the original.
+
+    Args:
+        log_file: Path of the log file
+
+    Returns:
+        Path of the compressed file, None if the file no longer exists
+    """
+    if not log_file.exists():
+        return None
+    compressed_path = log_file.with_name(f"{log_file.name}.gz")
+    # Written under a name of its own, another worker may be compressing
+    # the same file
+    temporary_path = log_file.with_name(f"{log_file.name}.gz.{os.getpid()}")
+    try:
+        with open(log_file, "rb") as source, gzip.open(temporary_path, "wb") as target:
+            shutil.copyfileobj(source, target)
+    except FileNotFoundError:
+        temporary_path.unlink(missing_ok=True)
+        return None
+    os.replace(temporary_path, compressed_path)
+    log_file.unlink(missing_ok=True)
+    return compressed_path
+
+
+def clean_old_logs(days_to_keep: int = 30, max_total_size_mb: Optional[int] = None):
+    """
+    Remove log files older than specified days, then the oldest log files
+    until the logs directory fits in the size limit.
+
+    Args:
+        days_to_keep: Number of days to keep logs (default: 30)
+        max_total_size_mb: Maximum total size of the log files in MB (optional)
+    """
     cutoff_date = datetime.now() - timedelta(days=days_to_keep)
+    logger = get_logger("pricetracker")
 
+    log_files = []
     for log_file in get_log_files():
         try:
-            # Get file creation time
-            file_time = datetime.fromtimestamp(log_file.stat().st_mtime)
-            if file_time < cutoff_date:
-                log_file.unlink()
-                print(f"Removed old log file: {log_file.name}")
+            stat = log_file.stat()
+            # Get file modification time
+            file_time = datetime.fromtimestamp(stat.st_mtime)
+            if file_time < cutoff_date and not is_active_log_file(log_file):
+                log_file.unlink(missing_ok=True)
+                logger.info(f"Removed old log file: {log_file.name}")
+            else:
+                log_files.append((stat.st_mtime, stat.st_size, log_file))
+        except Exception as e:
+            logger.error(f"Error removing log file {log_file.name}: {e}")
+
+    if max_total_size_mb is None:
+        return
+    total_size = sum(size for _, size, _ in log_files)
+    max_total_size = max_total_size_mb * 1024 * 1024
+    for _, size, log_file in sorted(log_files):
+        if total_size <= max_total_size:
+            break
+        if is_active_log_file(log_file):
+            continue
+        try:
+            log_file.unlink(missing_ok=True)
+            total_size -= size
+            logger.info(f"Removed log file over the size limit: {log_file.name}")
         except Exception as e:
-            print(f"Error removing log file {log_file.name}: {e}")
+            logger.error(f"Error removing log file {log_file.name}: {e}")
 
 
 def get_log_file_size(logger_name: str) -> int:
@@ -273,26 +695,36 @@ def get_log_file_size(logger_name: str) -> int:
         return 0
 
 
-def rotate_log_file(logger_name: str, max_size_mb: int = 10):
+def rotate_log_file(logger_name: str, max_size_mb: int = 10) -> Optional[Path]:
     """
     Rotate log file if it exceeds maximum size.
 
+    The file is renamed to the next free `<name>_<date>.<n>.log`.
+
     Args:
         logger_name: Name of the logger
         max_size_mb: Maximum file size in MB before rotation
+
+    Returns:
+        Path of the rotated file, None if the file was not rotated
     """
     log_file = get_log_file_path(logger_name)
     max_size_bytes = max_size_mb * 1024 * 1024
 
     if log_file.exists() and log_file.stat().st_size > max_size_bytes:
-        # Create backup filename with timestamp
-        timestamp = datetime.now().strftime("%H%M%S")
-        backup_name = f"{log_file.stem}_{timestamp}_backup.log"
-        backup_path = log_file.parent / backup_name
+        index = 1
+        while True:
+            backup_path = log_file.with_name(f"{log_file.stem}.{index}.log")
+            if not backup_path.exists() and not backup_path.with_name(
+                f"{backup_path.name}.gz"
+            ).exists():
+                break
+            index += 1
 
         # Move current log to backup
         log_file.rename(backup_path)
-        print(f"Rotated log file: {log_file.name} -> {backup_name}")
+        return backup_path
+    return None
 
 
 # Pre-configured loggers for common use cases
@@ -302,3 +734,5 @@ products_logger = get_endpoint_logger("products")
 users_logger = get_endpoint_logger("users")
 scrapers_logger = get_endpoint_logger("scrapers")
 config_logger = get_endpoint_logger("config")
+scheduler_logger = get_endpoint_logger("scheduler")
+migrations_logger = get_endpoint_logger("migrations")
@@ -0,0 +1,79 @@
+"""In-process rate limiting."""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Hashable
+
+
+class SlidingWindowLimiter:
+    """
+    Counts events per key over a sliding time window.
+
+    Only the most recently used `max_keys` keys are tracked so the limiter
+    cannot grow without bound under a flood of distinct keys.
+    """
+
+    def __init__(self, limit: int, window_seconds: float, max_keys: int = 100_000):
+        """
+        Args:
+            limit: Number of events allowed per key within the window
+            window_seconds: Length of the window in seconds
+            max_keys: Maximum number of keys tracked
+        """
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._events: OrderedDict[Hashable, deque[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, key: Hashable, now: float) -> deque[float] | None:
+        events = self._events.get(key)
+        if events is None:
+            return None
+        while events and events[0] <= now - self.window_seconds:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def is_limited(self, key: Hashable) -> bool:
+        """
+        Check whether a key has used up its events for the current window.
+        """
+        with self._lock:
+            events = self._prune(key, time.monotonic())
+            return events is not None and len(events) >= self.limit
+
+    def retry_after(self, key: Hashable) -> int:
+        """
+        Get the number of seconds until the key may send another event.
+        """
+        with self._lock:
+            now = time.monotonic()
+            events = self._prune(key, now)
+            if events is None or len(events) < self.limit:
+                return 0
+            return max(1, int(events[0] + self.window_seconds - now) + 1)
+
+    def hit(self, key: Hashable):
+        """
+        Record an event for a key.
+        """
+        with self._lock:
+            now = time.monotonic()
+            events = self._prune(key, now)
+            if events is None:
+                events = self._events[key] = deque()
+            events.append(now)
+            self._events.move_to_end(key)
+            while len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+
+    def reset(self, key: Hashable):
+        """
+        Forget every event recorded for a key.
+        """
+        with self._lock:
+            self._events.pop(key, None)
@@ -1,7 +1,37 @@
 import requests
 from requests import Response
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
 import random
+import time
+
+from .logger import scrapers_logger
+from .settings import get_settings
+from ..monitoring.service import record_scrape_fetch
+from ..monitoring.tracing import span
+
+settings = get_settings()
+
+
+def remap_url(url: str) -> Tuple[str, Optional[str]]:
+    """
+    Point a URL at the base URL its host is remapped to in SCRAPE_HOST_REMAP.
+
+    Args:
+        url (str): The URL of the product page.
+
+    Returns:
+        Tuple[str, Optional[str]]: The URL to request, and the original host to
+        send in the Host header, or None if the host is not remapped.
+    """
+    if not settings.SCRAPE_HOST_REMAP:
+        return url, None
+    parts = urlsplit(url)
+    target = settings.SCRAPE_HOST_REMAP.get(parts.hostname or "")
+    if target is None:
+        return url, None
+    base = urlsplit(target)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, "")), parts.netloc
 
 
 def make_request(
@@ -9,16 +39,19 @@ def make_request(
     user_agents: Optional[List[str]] = None,
     proxy_servers: Optional[List[str]] = None,
     timeout: int = 60,
+    platform: str = "unknown",
 ) -> Optional[Response]:
     """
     Makes a GET request to the specified URL and returns the response.
 
     Args:
         url (str): The URL to make the request to.
+        platform (str): Platform the page belongs to, used to label the fetch metrics.
 
     Returns:
         requests.Response: The response object from the GET request.
     """
+    started = time.perf_counter()
     try:
         headers = {
             "User-Agent": (
@@ -30,6 +63,12 @@ def make_request(
             "Accept-Language": "en-US,en;q=0.5",
         }
 
+        url, original_host = remap_url(url)
+        if original_host is not None:
+            # Remapped hosts are local stand-ins, reached directly
+            headers["Host"] = original_host
+            proxy_servers = None
+
         if proxy_servers:
             proxy = {
                 "http": random.choice(proxy_servers),
@@ -38,12 +77,28 @@ def make_request(
         else:
             proxy = None
 
-        response = requests.get(url, headers=headers, proxies=proxy, timeout=timeout)
+        with span("fetch", platform=platform, proxy=proxy is not None) as fetch_span:
+            # Streamed so the wait for the response headers, which includes DNS,
+            # connecting through the proxy and the server's response time, is
+            # measured apart from the download of the page
+            with span("fetch.headers"):
+                response = requests.get(
+                    url, headers=headers, proxies=proxy, timeout=timeout, stream=True
+                )
+            with span("fetch.body"):
+                content = response.content
+            if fetch_span is not None:
+                fetch_span.set(status_code=response.status_code, bytes=len(content))
+        record_scrape_fetch(
+            platform, time.perf_counter() - started, len(content), failed=not response.ok
+        )
         response.raise_for_status()  # Raise an error for bad responses
         return response
     except requests.RequestException as e:
-        print(f"An error occurred: {e}")
+        if e.response is None:
+            record_scrape_fetch(platform, time.perf_counter() - started, 0, failed=True)
+        scrapers_logger.warning("Request to %s failed: %s", url, e)
         return None
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        scrapers_logger.error("Unexpected error requesting %s: %s", url, e)
         return None
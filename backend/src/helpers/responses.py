@@ -0,0 +1,54 @@
+"""
+JSON responses serialized with orjson.
+
+Documents read from MongoDB can be returned as they are: ObjectIds and the
+other BSON types are converted while serializing, so the documents never go
+through Pydantic models just to be turned into JSON.
+"""
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def default(value: Any) -> Any:
+    """
+    Convert the values orjson does not serialize natively.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return float(value.to_decimal())
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize content to JSON bytes.
+
+    Args:
+        content: Content to serialize, which may contain MongoDB documents
+
+    Returns:
+        The JSON document
+    """
+    return orjson.dumps(content, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response serialized with orjson, which also handles BSON types.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
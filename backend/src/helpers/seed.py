@@ -1,6 +1,8 @@
 from .db import db, CollectionNames
+from ..config.service import config_service
 from ..users.models import UserModel, UserRole
-from ..auth.service import get_password_hash
+from ..auth.service import aget_password_hash
+from .logger import log_startup_event, main_logger
 from .settings import get_settings
 
 
@@ -49,13 +51,10 @@ async def add_user_agents():
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:136.0) Gecko/20100101 Firefox/136.",
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/107.0.0.0 Safari/537.3",
         ]
-        # Insert user agents into the database
-        result = await db.get_collection(collections.CONFIGS).insert_one(
-            {"_id": "default", "userAgents": user_agents}
-        )
-        if not result.acknowledged:
-            raise Exception("Failed to add user agents")
-        print(f"User agents added successfully with ID: {result.inserted_id}")
+        # Create the configuration, or fill in the user agents of an existing one
+        if not await config_service.create_default_config(user_agents):
+            await config_service.update_config(user_agents=user_agents)
+        print("User agents added successfully")
     except Exception as e:
         print(f"Error adding user agents: {e}")
         raise e
@@ -85,7 +84,7 @@ async def create_user():
         user = UserModel(
             role=UserRole.admin,
             username=environment.ADMIN_USERNAME,
-            password=get_password_hash(environment.ADMIN_PASSWORD),
+            password=await aget_password_hash(environment.ADMIN_PASSWORD),
             email=environment.ADMIN_EMAIL,
             firstName="Admin",
             lastName="User",
@@ -103,3 +102,39 @@ async def create_user():
     except Exception as e:
         print(f"Error creating admin user: {e}")
         raise e
+
+
+async def seed_user_agents():
+    """
+    Add the default user agents if the configuration has none.
+    """
+    log_startup_event(main_logger, "Checking for user agents in the database")
+    if not await check_if_user_agents_exist():
+        log_startup_event(main_logger, "No user agents found", "Adding default user agents")
+        await add_user_agents()
+        log_startup_event(main_logger, "Default user agents added successfully")
+    else:
+        log_startup_event(main_logger, "User agents already exist in the database")
+
+
+async def seed_admin_user():
+    """
+    Create the admin user of the settings if it does not exist.
+    """
+    log_startup_event(main_logger, "Checking for admin user in the database")
+    if not await check_if_user_exists(environment.ADMIN_USERNAME):
+        log_startup_event(
+            main_logger,
+            f"Admin user '{environment.ADMIN_USERNAME}' does not exist",
+            "Creating admin user",
+        )
+        await create_user()
+        log_startup_event(
+            main_logger,
+            f"Admin user '{environment.ADMIN_USERNAME}' created successfully",
+        )
+    else:
+        log_startup_event(
+            main_logger,
+            f"Admin user '{environment.ADMIN_USERNAME}' already exists in the database",
+        )
@@ -1,7 +1,7 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
-from typing import Optional
+from typing import Dict, Literal, Optional
 
 
 # Load settings from environment variables
@@ -20,6 +20,77 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str # SMTP server password
     SMTP_FROM_NAME: str # name to display in the "from" field of emails
     SMTP_FROM_EMAIL: str # email address to use in the "from" field of emails
+    SCRAPE_DEFAULT_INTERVAL_MINUTES: int = 1440 # default interval between scrapes of a product (daily)
+    SCRAPE_MIN_INTERVAL_MINUTES: int = 15 # lower bound for adaptive scrape intervals
+    SCRAPE_MAX_INTERVAL_MINUTES: int = 10080 # upper bound for adaptive scrape intervals (weekly)
+    SCRAPE_PLATFORM_BUDGETS: Dict[str, int] = {
+        "amazon": 120,
+        "newegg": 120,
+        "ebay": 120,
+    } # maximum number of scheduled fetches per hour for each platform
+    SCRAPE_HOST_REMAP: Dict[str, str] = {} # product page hosts fetched from another base URL instead, e.g. {"www.amazon.com": "http://127.0.0.1:8081"} for a fake retailer
+    SCHEDULER_HEARTBEAT_SECONDS: int = 15 # how often a scheduler node renews its heartbeat and rebalances jobs
+    SCHEDULER_NODE_TTL_SECONDS: int = 45 # a node is considered dead when its heartbeat is older than this
+    SCRAPE_LEASE_SECONDS: int = 300 # how long a node holds a product while scraping it
+    SCHEDULER_ENABLED: bool = True # run the scheduler inside the API process (disable when running src.worker)
+    WORKER_MAX_THREADS: int = 10 # number of scrape jobs a standalone worker runs concurrently
+    USER_CACHE_TTL_SECONDS: int = 60 # how long an authenticated user is served from memory
+    USER_CACHE_MAX_SIZE: int = 10000 # maximum number of authenticated users kept in memory
+    USER_CACHE_VERSION_CHECK_SECONDS: float = 2 # how often a worker checks for invalidations made by other workers
+    PASSWORD_HASH_WORKERS: int = 4 # threads hashing and checking passwords
+    PASSWORD_HASH_MAX_QUEUE: int = 64 # password jobs allowed in flight before requests are rejected with 429
+    LOGIN_THROTTLE_WINDOW_SECONDS: int = 300 # window over which login attempts are counted
+    LOGIN_MAX_ATTEMPTS_PER_IP: int = 30 # login attempts allowed per client IP within the window
+    LOGIN_MAX_FAILURES_PER_USERNAME: int = 5 # failed logins allowed per username within the window
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 # lifetime of access tokens
+    AUTH_STATELESS: bool = False # build the current user from token claims instead of reading the database
+    REVOCATION_REFRESH_SECONDS: float = 5 # how often a worker reads new token revocations
+    CONFIG_VERSION_CHECK_SECONDS: float = 5 # how often a worker checks whether the configuration changed
+    LOG_QUEUE_SIZE: int = 10000 # log records buffered for the logging thread
+    LOG_QUEUE_POLICY: Literal["drop", "block"] = "drop" # what to do with a record when the log queue is full
+    LOG_QUEUE_BLOCK_TIMEOUT: float = 0.05 # longest wait for room in the queue with the "block" policy
+    LOG_MAX_SIZE_MB: int = 10 # size at which a log file is rotated, 0 to rotate daily only
+    LOG_RETENTION_DAYS: int = 30 # days rotated log files are kept
+    LOG_MAX_TOTAL_SIZE_MB: int = 1024 # oldest log files are removed once the logs directory is larger
+    LOG_MAINTENANCE_INTERVAL_SECONDS: int = 3600 # how often retention is enforced
+    LOG_FORMAT: Literal["text", "json"] = "text" # "json" writes one JSON object per record
+    LOG_SAMPLE_RATES: Dict[str, float] = {
+        "pricetracker.scrapers": 0.1,
+        "pricetracker.products": 0.1,
+    } # fraction of info and debug records kept, by logger name
+    METRICS_ENABLED: bool = True # expose the Prometheus metrics at /metrics
+    METRICS_TOKEN: Optional[str] = None # token Prometheus must send as "Authorization: Bearer <token>" to read /metrics, which is public when unset
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = 0.5 # how often the event loop lag is measured
+    EVENT_LOOP_STALL_THRESHOLD_SECONDS: float = 0.1 # callbacks blocking the event loop longer than this are logged with their stack, 0 to disable
+    WORKER_METRICS_PORT: int = 9100 # port of the worker's /metrics endpoint, 0 to disable
+    MONGO_SLOW_COMMAND_MS: float = 100 # MongoDB commands slower than this are logged and sampled
+    TRACE_BUFFER_SIZE: int = 200 # number of finished traces kept in memory
+    TRACE_SLOW_MS: float = 2000 # traces slower than this are always kept
+    TRACE_SAMPLE_RATE: float = 0.01 # fraction of the faster traces kept
+    PROFILING_MAX_SECONDS: float = 60 # longest CPU or memory profile an admin can take
+    PROFILING_SAMPLE_INTERVAL_SECONDS: float = 0.01 # time between two samples of the CPU profiler
+    PROFILING_TRACEMALLOC_FRAMES: int = 10 # frames kept for each allocation traced by memory profiles
+    GZIP_MINIMUM_SIZE: int = 1024 # responses smaller than this are sent uncompressed
+    GZIP_COMPRESS_LEVEL: int = 5 # 1 is the fastest, 9 the smallest
+    PRICE_EVENTS_MAX_SIZE_MB: int = 16 # size of the capped collection live price events are tailed from
+    PRICE_EVENTS_QUEUE_SIZE: int = 100 # price events buffered per connected client before the oldest are dropped
+    PRICE_EVENTS_KEEPALIVE_SECONDS: float = 15 # idle time after which a comment is sent to keep event streams open
+    USERS_PAGE_SIZE: int = 50 # users per page of the admin user listing
+    USERS_MAX_PAGE_SIZE: int = 200 # largest page of users a client may ask for
+    USER_COUNT_CACHE_SECONDS: float = 60 # how long the estimated number of users is cached
+    MAIL_SENDERS: int = 2 # mails each API worker sends concurrently, 0 to only queue them
+    MAIL_MAX_ATTEMPTS: int = 5 # sends attempted before a mail is marked as failed
+    MAIL_RETRY_BASE_SECONDS: float = 30 # delay before the first retry, doubled on every further retry
+    MAIL_POLL_SECONDS: float = 5 # how often idle senders look for mails queued by other workers
+    MAIL_SEND_TIMEOUT_SECONDS: float = 30 # timeout of the SMTP commands
+    MAIL_SMTP_IDLE_SECONDS: float = 60 # idle SMTP connections are closed after this time
+    MAIL_RETENTION_DAYS: int = 7 # sent and failed mails are removed from the queue after this many days
+    MIGRATION_BATCH_SIZE: int = 500 # documents rewritten per batch by online migrations
+    MIGRATION_THROTTLE_RATIO: float = 1.0 # pause after each batch, as a multiple of the time the batch took
+    MIGRATION_LOCK_TTL_SECONDS: float = 120 # time after which migrations left by a stopped process can be resumed
+    WORKERS: int = 1 # API worker processes started by the container
+    STARTUP_LOCK_TTL_SECONDS: float = 120 # longest time a worker may spend seeding and building indexes
+    SCHEDULER_LOCK_TTL_SECONDS: float = 30 # time after which another worker takes over the scheduler of a stopped one
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,236 @@
+"""
+Serving of the SvelteKit single page app.
+
+The site directory is indexed once into a manifest, so requests never touch
+the filesystem to find a file. Small files are read into memory with it, so
+serving them never blocks the event loop, and `fallback.html` is served for
+every client-side route. Asset paths missing from the manifest are 404s, not
+the fallback page, so a stale chunk is never served as HTML.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+# Precompressed variants written next to the files by the frontend build,
+# in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# Hashed build output, whose content never changes for a given URL
+IMMUTABLE_PREFIX = "_app/immutable/"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Other files are cached, but checked with their ETag on every use
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Files of the build output, which are never client-side routes
+ASSETS_PREFIX = "_app/"
+# Files up to this size are kept in memory
+MAX_MEMORY_FILE_SIZE = 1024 * 1024
+
+
+@dataclass
+class StaticFileVariant:
+    """
+    One encoding of a static file.
+    """
+
+    path: str
+    stat_result: os.stat_result
+    etag: str
+    content: Optional[bytes] = None
+
+
+@dataclass
+class StaticFile:
+    """
+    Static file of the site with its precompressed variants.
+    """
+
+    media_type: str
+    cache_control: str
+    # Variants by content encoding, "identity" being the file itself
+    variants: Dict[str, StaticFileVariant] = field(default_factory=dict)
+
+
+def make_etag(stat_result: os.stat_result, encoding: str) -> str:
+    etag_base = f"{stat_result.st_mtime_ns}-{stat_result.st_size}-{encoding}"
+    return f'"{hashlib.md5(etag_base.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def get_accepted_encodings(accept_encoding: str) -> set[str]:
+    """
+    Get the content encodings accepted by the client.
+
+    Args:
+        accept_encoding: Value of the Accept-Encoding header
+
+    Returns:
+        The accepted encodings, without those refused with q=0
+    """
+    encodings = set()
+    for item in accept_encoding.split(","):
+        name, _, parameters = item.strip().partition(";")
+        parameters = parameters.replace(" ", "")
+        if parameters.startswith("q="):
+            try:
+                if float(parameters[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            encodings.add(name.lower())
+    return encodings
+
+
+class StaticSite:
+    """
+    Serves the files of a directory from a manifest built once, with
+    precompressed variants, cache headers and ETag revalidation.
+    """
+
+    def __init__(self, directory: str, fallback: str = "fallback.html"):
+        """
+        Args:
+            directory: Directory holding the built site
+            fallback: File served for paths that are not files of the site
+        """
+        self.directory = directory
+        self.fallback = fallback
+        self.files: Dict[str, StaticFile] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _index_file(self, relative_path: str, path: str):
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type in (
+            "application/javascript",
+            "application/json",
+        ):
+            media_type += "; charset=utf-8"
+        static_file = StaticFile(
+            media_type=media_type,
+            cache_control=(
+                IMMUTABLE_CACHE_CONTROL
+                if relative_path.startswith(IMMUTABLE_PREFIX)
+                else REVALIDATE_CACHE_CONTROL
+            ),
+        )
+        for encoding, suffix in (("identity", ""),) + ENCODINGS:
+            variant_path = path + suffix
+            if encoding != "identity" and not os.path.isfile(variant_path):
+                continue
+            stat_result = os.stat(variant_path)
+            content = None
+            if stat_result.st_size <= MAX_MEMORY_FILE_SIZE:
+                with open(variant_path, "rb") as variant_file:
+                    content = variant_file.read()
+            static_file.variants[encoding] = StaticFileVariant(
+                variant_path, stat_result, make_etag(stat_result, encoding), content
+            )
+        self.files[relative_path] = static_file
+
+    def load(self):
+        """
+        Build the manifest of the site directory and read its small files.
+        """
+        with self._lock:
+            if self._loaded:
+                return
+            compressed_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+            for root, _, file_names in os.walk(self.directory):
+                for file_name in file_names:
+                    if file_name.endswith(compressed_suffixes):
+                        continue
+                    path = os.path.join(root, file_name)
+                    relative_path = os.path.relpath(path, self.directory).replace(
+                        os.sep, "/"
+                    )
+                    self._index_file(relative_path, path)
+
+            fallback = self.files.get(self.fallback)
+            if fallback is not None:
+                identity = fallback.variants["identity"]
+                if identity.content is None:
+                    with open(identity.path, "rb") as fallback_file:
+                        identity.content = fallback_file.read()
+                if "gzip" not in fallback.variants:
+                    fallback.variants["gzip"] = StaticFileVariant(
+                        identity.path,
+                        identity.stat_result,
+                        make_etag(identity.stat_result, "gzip"),
+                        gzip.compress(identity.content, mtime=0),
+                    )
+            self._loaded = True
+
+    def get_file(self, relative_path: str) -> Optional[StaticFile]:
+        """
+        Get a file of the site, or the fallback page for client-side routes.
+
+        Paths under `_app/` or with a file extension are files, never routes,
+        so they get no fallback page.
+
+        Returns:
+            The file, None if it does not exist and the path is not a route or
+            the site has no fallback page
+        """
+        if not self._loaded:
+            self.load()
+        static_file = self.files.get(relative_path)
+        if static_file is not None:
+            return static_file
+        if relative_path.startswith(ASSETS_PREFIX) or os.path.splitext(
+            relative_path.rsplit("/", 1)[-1]
+        )[1]:
+            return None
+        return self.files.get(self.fallback)
+
+    def response(self, request: Request, relative_path: str) -> Response:
+        """
+        Build the response serving a path of the site.
+
+        Args:
+            request: Request for the file
+            relative_path: Path of the file relative to the site directory
+
+        Returns:
+            The file in the best encoding accepted by the client, or an empty
+            304 response when the client's copy is still current
+        """
+        static_file = self.get_file(relative_path)
+        if static_file is None:
+            return Response(status_code=404)
+
+        accepted = get_accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next(
+            (name for name, _ in ENCODINGS if name in accepted and name in static_file.variants),
+            "identity",
+        )
+        variant = static_file.variants[encoding]
+        headers = {"ETag": variant.etag, "Cache-Control": static_file.cache_control}
+        if len(static_file.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (
+            if_none_match.strip() == "*"
+            or variant.etag in (tag.strip() for tag in if_none_match.split(","))
+        ):
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if variant.content is not None:
+            return Response(
+                variant.content, media_type=static_file.media_type, headers=headers
+            )
+        return FileResponse(
+            variant.path,
+            media_type=static_file.media_type,
+            headers=headers,
+            stat_result=variant.stat_result,
+        )
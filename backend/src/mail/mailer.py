@@ -1,61 +1,81 @@
 """
 Email service for the PriceTracker application.
 Handles sending emails for price alerts, user registration, password resets etc.
+
+Emails are rendered from the Jinja templates in `templates`, which are
+compiled once per process, and sent through the queue in `queue.py`.
 """
 
-from typing import List, Optional, Dict, Any, Union
-import os
+from email.message import EmailMessage
+from email.utils import formataddr
+from functools import lru_cache
+from typing import List, Dict, Any, TYPE_CHECKING
 from pathlib import Path
-from datetime import datetime
-
-
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
 
 from ..helpers.logger import get_logger
 from ..helpers.settings import get_settings
 
+if TYPE_CHECKING:
+    from jinja2 import Environment
+
 # Define the directory for email templates
 TEMPLATES_DIR = Path(__file__).parent / "templates"
-os.makedirs(TEMPLATES_DIR, exist_ok=True)
 
 # Initialize logger
 logger = get_logger("pricetracker_mail")
 settings = get_settings()
 
-mail_config = ConnectionConfig(
-    MAIL_USERNAME=settings.SMTP_USERNAME,
-    MAIL_PASSWORD=settings.SMTP_PASSWORD,
-    MAIL_FROM=settings.SMTP_FROM_EMAIL,
-    MAIL_PORT=settings.SMTP_PORT,
-    MAIL_SERVER=settings.SMTP_HOST,
-    MAIL_FROM_NAME=settings.SMTP_FROM_NAME,
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=TEMPLATES_DIR,
-)
-
-
-def create_email_message(subject: str, recipients: List[str], body: Dict[str, any]):
+
+@lru_cache
+def get_template_environment() -> "Environment":
+    """
+    Get the Jinja environment of the email templates, created on first use.
+
+    Templates are compiled on their first use and kept, without checking the
+    files for changes on every render.
+    """
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=select_autoescape(["html"]),
+        auto_reload=False,
+    )
+
+
+def render_template(template_name: str, body: Dict[str, Any]) -> str:
+    """
+    Render an email template.
+
+    Args:
+        template_name (str): Name of the template in the templates directory.
+        body (Dict[str, Any]): Variables of the template.
+
+    Returns:
+        str: The rendered template.
+    """
+    return get_template_environment().get_template(template_name).render(**body)
+
+
+def create_email_message(
+    subject: str, recipients: List[str], body: Dict[str, Any], template_name: str
+) -> EmailMessage:
     """
     Create an email message with the given subject, recipients and body.
 
     Args:
         subject (str): Subject of the email.
         recipients (List[str]): List of recipient email addresses.
-        body (Dict[str, Any]): Body of the email, can include HTML content.
+        body (Dict[str, Any]): Variables of the template.
+        template_name (str): Name of the HTML template of the email.
 
     Returns:
-        MessageSchema: Configured email message ready to be sent.
+        EmailMessage: Configured email message ready to be sent.
     """
-    return MessageSchema(
-        subject=subject,
-        recipients=recipients,
-        template_body=body,
-        subtype=MessageType.html,
-        headers={"X-Mailer": "PriceTracker Mailer"},
-    )
-
-
-mailer = FastMail(mail_config)
+    message = EmailMessage()
+    message["From"] = formataddr((settings.SMTP_FROM_NAME, settings.SMTP_FROM_EMAIL))
+    message["To"] = ", ".join(recipients)
+    message["Subject"] = subject
+    message["X-Mailer"] = "PriceTracker Mailer"
+    message.set_content(render_template(template_name, body), subtype="html")
+    return message
@@ -1,3 +1,4 @@
+from enum import Enum
 from typing import List, Optional, Dict, Any, Union
 from pydantic import BaseModel, EmailStr
 
@@ -5,4 +6,10 @@ from pydantic import BaseModel, EmailStr
 class EmailSchema(BaseModel):
     email: List[EmailStr]
     body: Optional[Dict[str, Any]] = None
-    
+
+
+class MailStatus(str, Enum):
+    pending = "pending"
+    sending = "sending"
+    sent = "sent"
+    failed = "failed"
@@ -0,0 +1,302 @@
+"""
+Outbound mail queue.
+
+Mails are stored in the mail_queue collection and sent by background senders
+running in each API worker, so requests return as soon as a mail is queued
+and queued mails survive a restart. Each sender keeps its SMTP connection
+open between mails, and failed sends are retried with exponential backoff.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+from ..helpers.db import CollectionNames, db
+from ..helpers.logger import log_error, log_startup_event
+from ..helpers.metrics import registry
+from ..helpers.settings import get_settings
+from .mailer import create_email_message, logger
+from .models import MailStatus
+
+settings = get_settings()
+
+# Pause of a sender after an error recording a delivery, such as the database
+# being unreachable, before it claims the next mail
+DELIVERY_ERROR_BACKOFF_SECONDS = 1.0
+
+mails = registry.counter(
+    "pricetracker_mails_total",
+    "Queued mails handled by the senders, by result (sent, retried, failed)",
+    ["result"],
+)
+
+
+def build_mail(
+    subject: str, recipients: List[str], template_name: str, body: Dict[str, Any]
+) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "subject": subject,
+        "recipients": recipients,
+        "template": template_name,
+        "body": body,
+        "status": MailStatus.pending.value,
+        "attempts": 0,
+        "nextAttemptAt": now,
+        "createdAt": now,
+    }
+
+
+async def enqueue_mail(
+    subject: str, recipients: List[str], template_name: str, body: Dict[str, Any]
+) -> str:
+    """
+    Queue an email to be sent in the background.
+
+    Args:
+        subject: Subject of the email
+        recipients: Email addresses of the recipients
+        template_name: Name of the HTML template in mail/templates
+        body: Variables of the template
+
+    Returns:
+        ID of the queued mail
+    """
+    result = await db.get_collection(CollectionNames.MAIL_QUEUE).insert_one(
+        build_mail(subject, recipients, template_name, body)
+    )
+    mail_queue.notify()
+    return str(result.inserted_id)
+
+
+async def enqueue_mails(mails_to_send: List[Dict[str, Any]]) -> int:
+    """
+    Queue many emails at once, such as notifications sent to many users.
+
+    Args:
+        mails_to_send: Keyword arguments of `enqueue_mail` for each email
+
+    Returns:
+        Number of queued mails
+    """
+    if not mails_to_send:
+        return 0
+    result = await db.get_collection(CollectionNames.MAIL_QUEUE).insert_many(
+        [build_mail(**mail) for mail in mails_to_send], ordered=False
+    )
+    mail_queue.notify()
+    return len(result.inserted_ids)
+
+
+async def ensure_mail_queue_indexes():
+    """
+    Create the index used to pick the next mail and the one expiring
+    the mails that were sent or given up on.
+    """
+    collection = db.get_collection(CollectionNames.MAIL_QUEUE)
+    await collection.create_index([("status", 1), ("nextAttemptAt", 1)])
+    await collection.create_index(
+        "finishedAt", expireAfterSeconds=settings.MAIL_RETENTION_DAYS * 24 * 3600
+    )
+
+
+class SMTPConnection:
+    """
+    SMTP connection kept open between mails and reopened when needed.
+    """
+
+    def __init__(self):
+        self.smtp = None
+        self.last_used = 0.0
+
+    async def connect(self):
+        import aiosmtplib
+
+        self.smtp = aiosmtplib.SMTP(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            username=settings.SMTP_USERNAME,
+            password=settings.SMTP_PASSWORD,
+            use_tls=False,
+            start_tls=False,
+            validate_certs=True,
+            timeout=settings.MAIL_SEND_TIMEOUT_SECONDS,
+        )
+        # Logs in as well, since credentials are given
+        await self.smtp.connect()
+
+    async def send(self, message: EmailMessage):
+        """
+        Send a message, connecting first if the connection is not open.
+        """
+        if self.smtp is None or not self.smtp.is_connected or self.is_idle():
+            await self.close()
+            await self.connect()
+        try:
+            await self.smtp.send_message(message)
+        except Exception:
+            # Sent again on a new connection by the retry, the server may have
+            # dropped this one
+            await self.close()
+            raise
+        self.last_used = time.monotonic()
+
+    def is_idle(self) -> bool:
+        return time.monotonic() - self.last_used > settings.MAIL_SMTP_IDLE_SECONDS
+
+    async def close(self):
+        if self.smtp is None:
+            return
+        smtp, self.smtp = self.smtp, None
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
+
+
+class MailQueue:
+    """
+    Background senders of the queued mails.
+    """
+
+    def __init__(self):
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self, senders: int):
+        """
+        Start the senders.
+
+        Args:
+            senders: Number of mails sent concurrently, each over its own
+                SMTP connection
+        """
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self.run_sender(SMTPConnection()), name=f"mail-sender-{index}")
+            for index in range(senders)
+        ]
+        log_startup_event(logger, "Mail senders started", f"{senders} senders")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """
+        Wake the senders of this worker up, a mail was queued.
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def claim(self) -> Optional[dict]:
+        """
+        Take the next mail due, or a mail whose sender stopped while sending it.
+        """
+        now = datetime.now(timezone.utc)
+        return await db.get_collection(CollectionNames.MAIL_QUEUE).find_one_and_update(
+            {
+                "$or": [
+                    {"status": MailStatus.pending.value, "nextAttemptAt": {"$lte": now}},
+                    {"status": MailStatus.sending.value, "lockedUntil": {"$lte": now}},
+                ]
+            },
+            {
+                "$set": {
+                    "status": MailStatus.sending.value,
+                    "lockedUntil": now
+                    + timedelta(seconds=2 * settings.MAIL_SEND_TIMEOUT_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("nextAttemptAt", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def deliver(self, mail: dict, connection: SMTPConnection):
+        """
+        Send a claimed mail, then mark it as sent or schedule its retry.
+        """
+        collection = db.get_collection(CollectionNames.MAIL_QUEUE)
+        now = datetime.now(timezone.utc)
+        try:
+            message = create_email_message(
+                mail["subject"], mail["recipients"], mail["body"], mail["template"]
+            )
+            await connection.send(message)
+        except Exception as e:
+            if mail["attempts"] >= settings.MAIL_MAX_ATTEMPTS:
+                update = {"status": MailStatus.failed.value, "finishedAt": now}
+                mails.inc(result="failed")
+                log_error(logger, e, f"Giving up on mail {mail['_id']}")
+            else:
+                delay = settings.MAIL_RETRY_BASE_SECONDS * 2 ** (mail["attempts"] - 1)
+                update = {
+                    "status": MailStatus.pending.value,
+                    "nextAttemptAt": now + timedelta(seconds=delay),
+                }
+                mails.inc(result="retried")
+                logger.warning(
+                    "Could not send mail %s, retrying in %ss: %s",
+                    mail["_id"],
+                    delay,
+                    e,
+                    extra={"mail_id": str(mail["_id"]), "attempts": mail["attempts"]},
+                )
+            await collection.update_one(
+                {"_id": mail["_id"]},
+                {"$set": {**update, "lastError": str(e)}, "$unset": {"lockedUntil": ""}},
+            )
+            return
+
+        await collection.update_one(
+            {"_id": mail["_id"]},
+            {
+                "$set": {"status": MailStatus.sent.value, "finishedAt": now},
+                "$unset": {"lockedUntil": ""},
+            },
+        )
+        mails.inc(result="sent")
+
+    async def run_sender(self, connection: SMTPConnection):
+        """
+        Send the queued mails one after the other, until cancelled.
+        """
+        try:
+            while True:
+                self._wakeup.clear()
+                try:
+                    mail = await self.claim()
+                except Exception as e:
+                    log_error(logger, e, "Error reading the mail queue")
+                    mail = None
+                if mail is not None:
+                    try:
+                        await self.deliver(mail, connection)
+                    except Exception as e:
+                        # The mail is claimed again once its lock expires
+                        log_error(logger, e, f"Error delivering mail {mail['_id']}")
+                        await asyncio.sleep(DELIVERY_ERROR_BACKOFF_SECONDS)
+                    continue
+
+                # Mails queued by other workers are found by polling
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), settings.MAIL_POLL_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                if connection.is_idle():
+                    await connection.close()
+        finally:
+            await connection.close()
+
+
+mail_queue = MailQueue()
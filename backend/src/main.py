@@ -1,27 +1,36 @@
+import asyncio
 import os
 import time
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, Response, HTTPException
 from contextlib import asynccontextmanager
+from fastapi.datastructures import Default
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse
 
 
 from .auth.controller import router as AuthRouter
 from .users.controller import router as UsersRouter
 from .config.controller import router as ConfigRouter
 from .products.controller import router as ProductsRouter
+from .products.events import price_events
+from .monitoring.controller import metrics_router as MetricsRouter
+from .monitoring.controller import router as MonitoringRouter
+from .monitoring.middleware import MetricsMiddleware, RequestTracingMiddleware
+from .monitoring.service import StartupProfile, monitor_event_loop_lag
+from .monitoring.stalls import stall_watchdog
 from .helpers.db import client
-from .helpers.logger import main_logger, log_startup_event, log_request
-from .helpers.seed import (
-    add_user_agents,
-    check_if_user_agents_exist,
-    check_if_user_exists,
-    create_user,
-)
+from .helpers.locks import MongoLock
+from .mail.queue import mail_queue
+from .migrations.service import apply_migrations, run_online_migrations
+from .migrations.versions import MIGRATIONS
+from .helpers.logger import main_logger, log_error, log_startup_event, log_request
+from .helpers.responses import ORJSONResponse
 from .helpers.settings import get_settings
+from .helpers.spa import StaticSite
 from .scheduler.scheduling import scheduler
+from .scheduler.cluster import join_cluster, leave_cluster
 
 load_dotenv()
 
@@ -35,6 +44,57 @@ backend_dir = os.path.abspath(
 )
 site_directory = os.path.join(backend_dir, "site")
 static_directory = os.path.join(backend_dir, "static")
+static_site = StaticSite(site_directory)
+
+# With several API workers, seeding and index builds run in one worker at a
+# time, and the scheduler runs in a single worker
+startup_lock = MongoLock("startup", environment.STARTUP_LOCK_TTL_SECONDS)
+scheduler_lock = MongoLock("scheduler", environment.SCHEDULER_LOCK_TTL_SECONDS)
+
+
+def load_static_site():
+    static_site.load()
+    log_startup_event(logger, "Static site indexed", f"{len(static_site.files)} files")
+
+
+def start_scheduler():
+    scheduler.start()
+    join_cluster()
+    log_startup_event(logger, "Scheduler started")
+
+
+async def lead_scheduler():
+    """
+    Start the scheduler if this worker holds the scheduler lock.
+
+    Called again every third of the lock's ttl to renew it, so another worker
+    takes over once this one is gone.
+    """
+    if await scheduler_lock.acquire() and not scheduler.running:
+        await asyncio.to_thread(start_scheduler)
+
+
+async def keep_leading_scheduler():
+    while True:
+        await asyncio.sleep(environment.SCHEDULER_LOCK_TTL_SECONDS / 3)
+        try:
+            await lead_scheduler()
+        except Exception as e:
+            log_error(logger, e, "Error renewing the scheduler lock")
+
+
+async def run_shared_setup(profile: StartupProfile):
+    """
+    Apply the pending startup migrations, one worker at a time.
+
+    The first worker applies them and the others find them applied.
+    """
+    with profile.phase("startup_lock"):
+        await startup_lock.wait()
+    try:
+        await profile.run("migrations", apply_migrations(MIGRATIONS, online=False))
+    finally:
+        await startup_lock.release()
 
 
 @asynccontextmanager
@@ -43,47 +103,67 @@ async def lifespan(app: FastAPI):
     Lifespan context manager for the FastAPI application.
     This can be used to initialize resources or perform startup tasks.
     """
+    lag_monitor = asyncio.create_task(
+        monitor_event_loop_lag(environment.EVENT_LOOP_LAG_INTERVAL_SECONDS),
+        name="event-loop-lag",
+    )
+    if environment.EVENT_LOOP_STALL_THRESHOLD_SECONDS > 0:
+        stall_watchdog.start()
+    profile = StartupProfile()
+    scheduler_leader = None
+    online_migrations = None
     try:
         # Initialize the MongoDB client
         app.state.mongo_client = client
-        await app.state.mongo_client.aconnect()
-        # Note: AsyncMongoClient doesn't have aconnect() method
-        # It connects automatically when a query is executed
-        scheduler.start()
+        with profile.phase("mongo_connect"):
+            await app.state.mongo_client.aconnect()
         log_startup_event(logger, "MongoDB client initialized")
 
-        log_startup_event(logger, "Checking for user agents in the database")
-        if not await check_if_user_agents_exist():
-            log_startup_event(
-                logger, "No user agents found", "Adding default user agents"
-            )
-            await add_user_agents()
-            log_startup_event(logger, "Default user agents added successfully")
+        # The startup steps do not depend on each other, so they run
+        # concurrently and the blocking ones run in threads
+        startup_steps = [
+            profile.run("static_site", asyncio.to_thread(load_static_site)),
+            run_shared_setup(profile),
+        ]
+        if environment.SCHEDULER_ENABLED:
+            startup_steps.append(profile.run("scheduler", lead_scheduler()))
         else:
-            log_startup_event(logger, "User agents already exist in the database")
-
-        log_startup_event(logger, "Checking for admin user in the database")
-        if not await check_if_user_exists(environment.ADMIN_USERNAME):
             log_startup_event(
-                logger,
-                f"Admin user '{environment.ADMIN_USERNAME}' does not exist",
-                "Creating admin user",
+                logger, "Scheduler disabled", "Scrape jobs run in the standalone worker"
             )
-            await create_user()
-            log_startup_event(
-                logger,
-                f"Admin user '{environment.ADMIN_USERNAME}' created successfully",
-            )
-        else:
-            log_startup_event(
-                logger,
-                f"Admin user '{environment.ADMIN_USERNAME}' already exists in the database",
+        await asyncio.gather(*startup_steps)
+        if environment.SCHEDULER_ENABLED:
+            if not scheduler.running:
+                log_startup_event(logger, "Scheduler runs in another worker")
+            scheduler_leader = asyncio.create_task(
+                keep_leading_scheduler(), name="scheduler-leader"
             )
+        if environment.MAIL_SENDERS > 0:
+            mail_queue.start(environment.MAIL_SENDERS)
+        # Rewrites documents while the application serves requests
+        online_migrations = asyncio.create_task(
+            run_online_migrations(MIGRATIONS), name="online-migrations"
+        )
+        profile.log()
 
         yield
     finally:
         # Cleanup resources on shutdown
-        scheduler.shutdown()
+        lag_monitor.cancel()
+        stall_watchdog.stop()
+        if scheduler_leader is not None:
+            scheduler_leader.cancel()
+        if online_migrations is not None:
+            # Waited for, so the migrations lock is released before the client closes
+            online_migrations.cancel()
+            await asyncio.gather(online_migrations, return_exceptions=True)
+        await price_events.stop()
+        await mail_queue.stop()
+        if scheduler.running:
+            scheduler.shutdown()
+            leave_cluster()
+            # Lets another worker take over without waiting for the lock to expire
+            await scheduler_lock.release()
         await app.state.mongo_client.aclose()
         log_startup_event(logger, "MongoDB client disconnected successfully")
         log_startup_event(logger, "Application shutdown complete")
@@ -95,6 +175,9 @@ pricetracker = FastAPI(
     debug=True,
     version="0.0.1",
     lifespan=lifespan,
+    # Kept as a default so routes with a response model still serialize
+    # straight to bytes through Pydantic
+    default_response_class=Default(ORJSONResponse),
 )
 
 
@@ -110,37 +193,39 @@ pricetracker.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Compresses the API responses, the static site is served precompressed
+pricetracker.add_middleware(
+    GZipMiddleware,
+    minimum_size=environment.GZIP_MINIMUM_SIZE,
+    compresslevel=environment.GZIP_COMPRESS_LEVEL,
+)
+
+# Added last so they also time the other middlewares
+pricetracker.add_middleware(MetricsMiddleware)
+pricetracker.add_middleware(RequestTracingMiddleware)
+
 
 pricetracker.include_router(AuthRouter, prefix="/api", tags=["Authentication"])
 pricetracker.include_router(UsersRouter, prefix="/api/users", tags=["Users"])
 pricetracker.include_router(ConfigRouter, prefix="/api/config", tags=["Configuration"])
 pricetracker.include_router(ProductsRouter, prefix="/api/products", tags=["Products"])
-
-# Mount the entire site directory as static files (this serves all SvelteKit assets)
-pricetracker.mount(
-    "/_app",
-    StaticFiles(directory=os.path.join(site_directory, "_app")),
-    name="static_app",
-)
-
+pricetracker.include_router(MonitoringRouter, tags=["Monitoring"])
+if environment.METRICS_ENABLED:
+    pricetracker.include_router(MetricsRouter, tags=["Monitoring"])
 
 # Serve the root path
 @pricetracker.get("/")
-async def serve_root():
-    return FileResponse(os.path.join(site_directory, "fallback.html"))
+async def serve_root(request: Request):
+    return static_site.response(request, static_site.fallback)
 
 
 # Serve the SPA and its assets
 @pricetracker.get("/{full_path:path}")
-async def serve_spa(full_path: str):
+async def serve_spa(request: Request, full_path: str):
     # Paths that should be handled by the API
     if full_path.startswith("api/"):
         return {"detail": "Not Found"}
 
-    # Check if the requested path is a file in the site directory
-    requested_path = os.path.join(site_directory, full_path)
-    if os.path.isfile(requested_path):
-        return FileResponse(requested_path)
-
-    # For all other paths, return the SPA entry point (fallback.html)
-    return FileResponse(os.path.join(site_directory, "fallback.html"))
+    # Files of the site are served as is, every other path gets the SPA
+    # entry point (fallback.html)
+    return static_site.response(request, full_path)
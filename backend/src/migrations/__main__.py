@@ -0,0 +1,45 @@
+"""
+Apply the pending database migrations.
+
+    python -m src.migrations            apply every pending migration
+    python -m src.migrations --dry-run  report the work without writing
+"""
+
+import argparse
+import asyncio
+import sys
+
+from ..helpers.db import client
+from .service import apply_migrations, migrations_lock
+from .versions import MIGRATIONS
+
+
+async def main(dry_run: bool):
+    try:
+        if dry_run:
+            reports = await apply_migrations(MIGRATIONS, dry_run=True)
+        else:
+            if not await migrations_lock.acquire():
+                sys.exit("Migrations are being applied by another process")
+            try:
+                reports = await apply_migrations(MIGRATIONS, lock=migrations_lock)
+            finally:
+                await migrations_lock.release()
+    finally:
+        await client.aclose()
+
+    if not reports:
+        print("No pending migrations")
+    for report in reports:
+        kind = "online" if report["online"] else "startup"
+        print(f"{report['version']:>4}  {report['name']} ({kind})")
+        for action in report["actions"]:
+            print(f"      - {action}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the pending database migrations")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="report the work without writing anything"
+    )
+    asyncio.run(main(parser.parse_args().dry_run))
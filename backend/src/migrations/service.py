@@ -0,0 +1,275 @@
+"""
+Versioned migrations of the database.
+
+Each migration has a version and is applied once, in version order. Applied
+versions are recorded in the schema_migrations collection. Steps are written
+to be idempotent, so a migration interrupted halfway can simply run again.
+
+Quick migrations, such as indexes and seed data, are applied at startup.
+Online migrations rewrite documents in throttled batches while the
+application keeps serving traffic, and checkpoint their progress so an
+interrupted run resumes where it stopped. They run in the background in one
+worker, or from the command line:
+
+    python -m src.migrations [--dry-run]
+"""
+
+import asyncio
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from ..helpers.db import CollectionNames, db
+from ..helpers.locks import MongoLock
+from ..helpers.logger import log_error, log_startup_event, migrations_logger
+from ..helpers.settings import get_settings
+
+settings = get_settings()
+
+# Held while migrations are applied, by the background runner or the command line
+migrations_lock = MongoLock("migrations", settings.MIGRATION_LOCK_TTL_SECONDS)
+
+
+@dataclass
+class Migration:
+    """
+    Step of the evolution of the database.
+    """
+
+    version: int
+    name: str
+    apply: Callable[["MigrationContext"], Awaitable[None]]
+    # Rewrites documents in batches, so it is applied in the background
+    # instead of delaying the startup
+    online: bool = False
+
+
+class MigrationContext:
+    """
+    Operations available to a migration.
+
+    In dry-run mode nothing is written and each operation only describes the
+    work it would do in the report.
+    """
+
+    def __init__(self, migration: Migration, dry_run: bool, lock: Optional[MongoLock] = None):
+        """
+        Args:
+            migration: Migration being applied
+            dry_run: Whether to only report the work
+            lock: Lock renewed between batches, held by the caller
+        """
+        self.migration = migration
+        self.dry_run = dry_run
+        self.lock = lock
+        self.report: List[str] = []
+
+    async def run(self, description: str, step: Callable[[], Awaitable[Any]]):
+        """
+        Run an idempotent step.
+
+        Args:
+            description: What the step does, for the dry-run report
+            step: Coroutine function doing it
+        """
+        if self.dry_run:
+            self.report.append(description)
+            return
+        await step()
+
+    async def create_index(self, collection_name: str, keys: Any, **kwargs: Any):
+        """
+        Create an index, if it does not exist.
+        """
+        if self.dry_run:
+            self.report.append(f"Create index {keys} on {collection_name}")
+            return
+        await db.get_collection(collection_name).create_index(keys, **kwargs)
+
+    async def update_documents(
+        self,
+        collection_name: str,
+        query: dict,
+        update: Optional[dict] = None,
+        transform: Optional[Callable[[dict], Optional[dict]]] = None,
+        projection: Optional[dict] = None,
+        batch_size: Optional[int] = None,
+    ) -> int:
+        """
+        Update the documents matching a query, in batches of consecutive ids.
+
+        The query must stop matching a document once it is migrated, so each
+        document is migrated once even if the migration is run again. After
+        each batch the migration checkpoints the last id, then pauses for
+        MIGRATION_THROTTLE_RATIO times the duration of the batch.
+
+        Args:
+            collection_name: Collection to migrate
+            query: Documents still to migrate
+            update: Update applied to every document
+            transform: Gets the update of one document, None to leave it as is
+            projection: Fields of the documents passed to `transform`
+            batch_size: Documents per batch, defaults to MIGRATION_BATCH_SIZE
+
+        Returns:
+            Number of documents migrated, or to migrate in dry-run mode
+        """
+        collection = db.get_collection(collection_name)
+        batch_size = batch_size or settings.MIGRATION_BATCH_SIZE
+        if self.dry_run:
+            count = await collection.count_documents(query)
+            self.report.append(
+                f"Update {count} documents of {collection_name} "
+                f"in {math.ceil(count / batch_size)} batches of {batch_size}"
+            )
+            return count
+
+        migrations = db.get_collection(CollectionNames.SCHEMA_MIGRATIONS)
+        record = await migrations.find_one({"_id": self.migration.version}) or {}
+        last_id = record.get("checkpoints", {}).get(collection_name)
+        migrated = 0
+        while True:
+            batch_query = query if last_id is None else {"$and": [query, {"_id": {"$gt": last_id}}]}
+            documents = await collection.find(
+                batch_query,
+                projection=projection if transform else {"_id": 1},
+                sort=[("_id", 1)],
+                limit=batch_size,
+            ).to_list(length=batch_size)
+            if not documents:
+                break
+
+            started = time.perf_counter()
+            if transform is not None:
+                requests = [
+                    UpdateOne({"_id": document["_id"]}, document_update)
+                    for document in documents
+                    if (document_update := transform(document)) is not None
+                ]
+                if requests:
+                    await collection.bulk_write(requests, ordered=False)
+            else:
+                ids = [document["_id"] for document in documents]
+                await collection.update_many({"$and": [query, {"_id": {"$in": ids}}]}, update)
+            last_id = documents[-1]["_id"]
+            migrated += len(documents)
+            await migrations.update_one(
+                {"_id": self.migration.version},
+                {"$set": {f"checkpoints.{collection_name}": last_id}},
+            )
+            if self.lock is not None:
+                await self.lock.acquire()
+            # Leaves the database to the application between batches
+            await asyncio.sleep((time.perf_counter() - started) * settings.MIGRATION_THROTTLE_RATIO)
+
+        migrations_logger.info(
+            "Migrated %s documents of %s",
+            migrated,
+            collection_name,
+            extra={"migration": self.migration.version, "collection": collection_name},
+        )
+        return migrated
+
+
+async def get_applied_versions() -> set[int]:
+    """
+    Get the versions of the migrations already applied.
+    """
+    cursor = db.get_collection(CollectionNames.SCHEMA_MIGRATIONS).find(
+        {"status": "applied"}, projection={"_id": 1}
+    )
+    return {record["_id"] for record in await cursor.to_list(length=None)}
+
+
+async def apply_migrations(
+    migrations: List[Migration],
+    online: bool = True,
+    dry_run: bool = False,
+    lock: Optional[MongoLock] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Apply the pending migrations in version order.
+
+    Args:
+        migrations: Every migration of the application
+        online: Whether to apply the online migrations. Without them, the
+            migrations stop at the first pending online one, since the later
+            ones may depend on it
+        dry_run: Whether to only report the work of each pending migration
+        lock: Lock renewed while documents are migrated, held by the caller
+
+    Returns:
+        One report per applied migration, with its version, name and actions
+    """
+    collection = db.get_collection(CollectionNames.SCHEMA_MIGRATIONS)
+    applied = await get_applied_versions()
+    reports = []
+    for migration in sorted(migrations, key=lambda migration: migration.version):
+        if migration.version in applied:
+            continue
+        if migration.online and not online:
+            break
+
+        context = MigrationContext(migration, dry_run, lock)
+        started = time.perf_counter()
+        if not dry_run:
+            await collection.update_one(
+                {"_id": migration.version},
+                {
+                    "$set": {
+                        "name": migration.name,
+                        "status": "running",
+                        "startedAt": datetime.now(timezone.utc),
+                    }
+                },
+                upsert=True,
+            )
+        await migration.apply(context)
+        duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        if not dry_run:
+            await collection.update_one(
+                {"_id": migration.version},
+                {
+                    "$set": {
+                        "status": "applied",
+                        "appliedAt": datetime.now(timezone.utc),
+                        "durationMs": duration_ms,
+                    }
+                },
+            )
+            log_startup_event(
+                migrations_logger,
+                f"Migration {migration.version} applied",
+                f"{migration.name} ({duration_ms:.0f}ms)",
+            )
+        reports.append(
+            {
+                "version": migration.version,
+                "name": migration.name,
+                "online": migration.online,
+                "actions": context.report,
+            }
+        )
+    return reports
+
+
+async def run_online_migrations(migrations: List[Migration]):
+    """
+    Apply the pending migrations, online ones included, if no other process
+    is applying them.
+
+    Meant to run in the background once the application has started. A run
+    interrupted by a restart resumes from its checkpoints on the next one.
+    """
+    if not await migrations_lock.acquire():
+        return
+    try:
+        await apply_migrations(migrations, online=True, lock=migrations_lock)
+    except Exception as e:
+        log_error(migrations_logger, e, "Error applying online migrations")
+    finally:
+        await migrations_lock.release()
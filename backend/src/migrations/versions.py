@@ -0,0 +1,55 @@
+"""
+Migrations of the PriceTracker database, in version order.
+
+New migrations are appended to MIGRATIONS with the next version. Applied
+migrations must never be changed, write a new one instead.
+"""
+
+from ..auth.revocation import ensure_revocation_indexes
+from ..helpers.db import CollectionNames
+from ..helpers.seed import seed_admin_user, seed_user_agents
+from ..mail.queue import ensure_mail_queue_indexes
+from ..products.events import ensure_price_events_collection
+from ..scheduler.models import ProductSchedule
+from ..users.service import ensure_user_indexes
+from .service import Migration, MigrationContext
+
+
+async def create_indexes(context: MigrationContext):
+    await context.run("Create the token revocation indexes", ensure_revocation_indexes)
+    await context.run("Create the user search indexes", ensure_user_indexes)
+    await context.run("Create the mail queue indexes", ensure_mail_queue_indexes)
+    await context.run("Create the price events collection", ensure_price_events_collection)
+    await context.create_index(CollectionNames.PRODUCTS, "user_id")
+
+
+async def add_default_user_agents(context: MigrationContext):
+    await context.run("Add the default user agents if there are none", seed_user_agents)
+
+
+async def create_admin_user(context: MigrationContext):
+    await context.run("Create the admin user of the settings", seed_admin_user)
+
+
+async def backfill_product_schedules(context: MigrationContext):
+    # Products added before schedules existed are scraped with the defaults,
+    # stored so they can be listed and adapted like the others
+    await context.update_documents(
+        CollectionNames.PRODUCTS,
+        {"schedule": {"$exists": False}},
+        update={"$set": {"schedule": ProductSchedule().model_dump(by_alias=True)}},
+    )
+
+
+async def index_schedule_changes(context: MigrationContext):
+    # Scheduler nodes look up the schedules set since their previous heartbeat
+    await context.create_index(CollectionNames.PRODUCTS, "schedule.updatedAt")
+
+
+MIGRATIONS = [
+    Migration(1, "Create indexes", create_indexes),
+    Migration(2, "Add the default user agents", add_default_user_agents),
+    Migration(3, "Create the admin user", create_admin_user),
+    Migration(4, "Backfill product schedules", backfill_product_schedules, online=True),
+    Migration(5, "Index product schedule changes", index_schedule_changes),
+]
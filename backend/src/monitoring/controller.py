@@ -0,0 +1,172 @@
+import asyncio
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+
+from ..auth.controller import get_current_user
+from ..helpers.metrics import CONTENT_TYPE, registry
+from ..helpers.settings import get_settings
+from ..users.models import UserModel, UserRole
+from .mongo import command_listener
+from .service import is_metrics_request_authorized
+from .profiling import (
+    dump_stacks,
+    profile_cpu,
+    profile_filename,
+    profile_memory,
+    profiling_lock,
+)
+from .tracing import tracer
+
+router = APIRouter()
+# Served only when METRICS_ENABLED is on, unlike the admin endpoints
+metrics_router = APIRouter()
+environment = get_settings()
+
+ProfileSeconds = Annotated[
+    float, Query(gt=0, le=environment.PROFILING_MAX_SECONDS, description="Duration of the profile")
+]
+
+
+def check_admin(current_user: UserModel, detail: str):
+    if current_user.role != UserRole.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+
+def check_not_profiling():
+    if profiling_lock.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already being taken in this process",
+        )
+
+
+def download(content: str, filename: str) -> Response:
+    return Response(
+        content=content,
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Annotated[str | None, Header()] = None):
+    """
+    Expose the metrics of this process in the Prometheus text format.
+    Requires the METRICS_TOKEN bearer token when it is set.
+    """
+    if not is_metrics_request_authorized(authorization):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+
+@router.get("/api/monitoring/mongo/slow-commands")
+async def get_slow_mongo_commands(
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+):
+    """
+    Get the most recent slow MongoDB commands of this process, with the shape
+    of their filters.
+    Requires existing user to have role 'admin'.
+    """
+    check_admin(current_user, "You do not have permission to view slow commands")
+    return {
+        "thresholdMs": command_listener.slow_command_ms,
+        "commands": command_listener.get_slow_samples(),
+    }
+
+
+@router.get("/api/monitoring/traces")
+async def get_traces(
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+):
+    """
+    List the slow and sampled traces kept by this process, newest first.
+    Requires existing user to have role 'admin'.
+    """
+    check_admin(current_user, "You do not have permission to view traces")
+    return {"traces": [trace.summary() for trace in tracer.get_traces()]}
+
+
+@router.get("/api/monitoring/traces/{trace_id}")
+async def get_trace(
+    trace_id: str,
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+):
+    """
+    Get the spans of a trace. The trace id of a request is its X-Request-ID.
+    Requires existing user to have role 'admin'.
+    """
+    check_admin(current_user, "You do not have permission to view traces")
+    trace = tracer.find_trace(trace_id)
+    if trace is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Trace not found"
+        )
+    return trace.to_dict()
+
+
+@router.post("/api/monitoring/traces/export")
+async def export_traces(
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+):
+    """
+    Write the traces kept by this process to a file in the Chrome trace event
+    format, which chrome://tracing and Perfetto open.
+    Requires existing user to have role 'admin'.
+    """
+    check_admin(current_user, "You do not have permission to export traces")
+    path = await asyncio.to_thread(tracer.export)
+    return {"path": str(path), "traces": len(tracer.traces)}
+
+
+@router.post("/api/monitoring/profile/cpu")
+async def take_cpu_profile(
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+    seconds: ProfileSeconds = 10,
+):
+    """
+    Sample the stacks of every thread of this process for some seconds.
+    The file is in the folded stacks format, which speedscope and
+    flamegraph.pl open as a flame graph.
+    Requires existing user to have role 'admin'.
+    """
+    check_admin(current_user, "You do not have permission to profile the process")
+    check_not_profiling()
+    async with profiling_lock:
+        profile = await profile_cpu(seconds)
+    return download(profile, profile_filename("cpu", "folded"))
+
+
+@router.post("/api/monitoring/profile/memory")
+async def take_memory_profile(
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+    seconds: ProfileSeconds = 30,
+    limit: Annotated[int, Query(ge=1, le=500, description="Lines in the report")] = 50,
+):
+    """
+    Report the lines of code whose memory allocations grew the most over
+    some seconds, from two tracemalloc snapshots of this process.
+    Requires existing user to have role 'admin'.
+    """
+    check_admin(current_user, "You do not have permission to profile the process")
+    check_not_profiling()
+    async with profiling_lock:
+        report = await profile_memory(seconds, limit)
+    return download(report, profile_filename("memory", "txt"))
+
+
+@router.get("/api/monitoring/profile/tasks")
+async def get_task_stacks(
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+):
+    """
+    Dump the stacks of the asyncio tasks and threads of this process.
+    Requires existing user to have role 'admin'.
+    """
+    check_admin(current_user, "You do not have permission to profile the process")
+    return download(dump_stacks(), profile_filename("tasks", "txt"))
@@ -0,0 +1,121 @@
+import re
+import time
+from uuid import uuid4
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..helpers.logger import get_endpoint_logger, log_request, request_id_context
+from .service import record_request
+from .tracing import tracer
+
+access_logger = get_endpoint_logger("access")
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Request ids sent by clients or proxies are only reused when they look sane
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+
+def get_route_label(scope: Scope) -> str:
+    """
+    Get the route template of a request, so metrics are not labelled with ids.
+
+    Args:
+        scope: ASGI scope after the request was routed
+
+    Returns:
+        The route template, the mount path for mounted apps or "unmatched"
+    """
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path_format", None) or route.path
+    # Mounted apps, such as the static files, only set their root path
+    return scope.get("root_path") or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Records the count, status and latency of every HTTP request by route and
+    writes an access log line through `log_request`.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            method = scope["method"]
+            record_request(method, get_route_label(scope), status_code, duration)
+            client = scope.get("client")
+            log_request(
+                access_logger,
+                method,
+                scope["path"],
+                status_code,
+                duration,
+                client[0] if client else None,
+            )
+
+
+def get_request_id(scope: Scope) -> str:
+    """
+    Get the request id sent in the X-Request-ID header, or a new one.
+    """
+    for name, value in scope["headers"]:
+        if name == REQUEST_ID_HEADER:
+            request_id = value.decode("latin-1")
+            if REQUEST_ID_PATTERN.match(request_id):
+                return request_id
+    return uuid4().hex
+
+
+class RequestTracingMiddleware:
+    """
+    Gives every HTTP request an id and records a trace of its handling.
+
+    The id is returned in the X-Request-ID response header, added to the log
+    records of the request and used as the trace id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = get_request_id(scope)
+
+        async def send_with_request_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Request-ID", request_id)
+            await send(message)
+
+        request_id_token = request_id_context.set(request_id)
+        try:
+            with tracer.trace(scope["method"], request_id, path=scope["path"]) as trace:
+                try:
+                    await self.app(scope, receive, send_with_request_id)
+                finally:
+                    # Named after the route, only known once the request was routed
+                    trace.name = f"{scope['method']} {get_route_label(scope)}"
+                    trace.root.name = trace.name
+        finally:
+            request_id_context.reset(request_id_token)
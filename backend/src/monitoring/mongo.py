@@ -0,0 +1,206 @@
+"""
+MongoDB command monitoring.
+
+A pymongo CommandListener registered on every client records the latency of
+each command by command name and collection, the number of documents it
+returned and samples of slow commands. Only the shape of the filters is
+kept, never the values, so samples are safe to log and expose.
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from pymongo import monitoring
+
+from ..helpers.logger import get_endpoint_logger
+from ..helpers.metrics import registry
+from ..helpers.settings import get_settings
+from .tracing import tracer
+
+environment = get_settings()
+mongo_logger = get_endpoint_logger("mongo")
+
+# Commands sent by the driver itself, not worth recording
+IGNORED_COMMANDS = {
+    "hello",
+    "ismaster",
+    "isMaster",
+    "ping",
+    "buildInfo",
+    "saslStart",
+    "saslContinue",
+    "endSessions",
+    "killCursors",
+}
+# Field of the command holding the collection name, when not the command name
+COLLECTION_FIELDS = {"getMore": "collection"}
+
+command_duration = registry.histogram(
+    "pricetracker_mongo_command_duration_seconds",
+    "Time spent on MongoDB commands, by command and collection",
+    ["command", "collection"],
+)
+documents_returned = registry.counter(
+    "pricetracker_mongo_documents_returned_total",
+    "Documents returned or affected by MongoDB commands, by command and collection",
+    ["command", "collection"],
+)
+command_failures = registry.counter(
+    "pricetracker_mongo_command_failures_total",
+    "Failed MongoDB commands, by command and collection",
+    ["command", "collection"],
+)
+slow_commands = registry.counter(
+    "pricetracker_mongo_slow_commands_total",
+    "MongoDB commands slower than MONGO_SLOW_COMMAND_MS, by command and collection",
+    ["command", "collection"],
+)
+
+
+def get_query_shape(value: Any) -> Any:
+    """
+    Replace every value of a query with "?", keeping its field names and
+    operators.
+
+    Args:
+        value: Filter, update or pipeline stage
+
+    Returns:
+        The shape of the query
+    """
+    if isinstance(value, dict):
+        return {key: get_query_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value):
+            return [get_query_shape(item) for item in value]
+        return "?"
+    return "?"
+
+
+def get_command_filter(command_name: str, command: dict) -> Optional[dict]:
+    """
+    Get the filter of a command.
+
+    Returns:
+        The filter, None for commands without one
+    """
+    if command_name in ("find", "count", "distinct", "findAndModify"):
+        return command.get("filter", command.get("query"))
+    if command_name == "update" and command.get("updates"):
+        return command["updates"][0].get("q")
+    if command_name == "delete" and command.get("deletes"):
+        return command["deletes"][0].get("q")
+    if command_name == "aggregate" and command.get("pipeline"):
+        first_stage = command["pipeline"][0]
+        return first_stage.get("$match")
+    return None
+
+
+def count_documents(command_name: str, reply: dict) -> int:
+    """
+    Get the number of documents returned or affected by a command.
+    """
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") is not None else 0
+    n = reply.get("n")
+    return n if isinstance(n, int) else 0
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Records the latency, result size and slow samples of MongoDB commands.
+    """
+
+    def __init__(self, slow_command_ms: float, max_samples: int = 100):
+        """
+        Args:
+            slow_command_ms: Duration from which a command is sampled as slow
+            max_samples: Number of slow command samples kept
+        """
+        self.slow_command_ms = slow_command_ms
+        self.slow_samples: deque[dict] = deque(maxlen=max_samples)
+        self._pending: dict[tuple, tuple[str, str, Optional[dict]]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        field = COLLECTION_FIELDS.get(event.command_name, event.command_name)
+        collection = event.command.get(field)
+        if not isinstance(collection, str):
+            collection = ""
+        query_filter = get_command_filter(event.command_name, event.command)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                event.command_name,
+                collection,
+                get_query_shape(query_filter) if query_filter else None,
+            )
+
+    def _finish(self, event) -> Optional[tuple[str, str, Optional[dict]]]:
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        pending = self._finish(event)
+        if pending is None:
+            return
+        command_name, collection, filter_shape = pending
+        duration = event.duration_micros / 1_000_000
+        end = time.perf_counter()
+        tracer.add_span(
+            f"mongo.{command_name}", end - duration, end, collection=collection
+        )
+        command_duration.observe(duration, command=command_name, collection=collection)
+        documents = count_documents(command_name, event.reply)
+        if documents:
+            documents_returned.inc(
+                documents, command=command_name, collection=collection
+            )
+
+        if duration * 1000 >= self.slow_command_ms:
+            slow_commands.inc(command=command_name, collection=collection)
+            sample = {
+                "command": command_name,
+                "collection": collection,
+                "durationMs": round(duration * 1000, 2),
+                "documents": documents,
+                "filterShape": filter_shape,
+                "at": datetime.now(timezone.utc).isoformat(),
+            }
+            self.slow_samples.append(sample)
+            mongo_logger.warning(
+                "Slow MongoDB %s on %s", command_name, collection, extra=sample
+            )
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        pending = self._finish(event)
+        if pending is None:
+            return
+        command_name, collection, _ = pending
+        duration = event.duration_micros / 1_000_000
+        end = time.perf_counter()
+        tracer.add_span(
+            f"mongo.{command_name}",
+            end - duration,
+            end,
+            collection=collection,
+            failed=True,
+        )
+        command_duration.observe(duration, command=command_name, collection=collection)
+        command_failures.inc(command=command_name, collection=collection)
+
+    def get_slow_samples(self) -> list[dict]:
+        """
+        Get the most recent slow commands, newest first.
+        """
+        return list(reversed(self.slow_samples))
+
+
+command_listener = CommandMetricsListener(environment.MONGO_SLOW_COMMAND_MS)
@@ -0,0 +1,198 @@
+"""
+On-demand profiling of the running process.
+
+- CPU: a sampling profiler reads the stack of every thread at a fixed
+  interval and counts identical stacks. The result is in the folded stacks
+  format, one "frame;frame;frame count" line per stack, which speedscope
+  (https://www.speedscope.app) and flamegraph.pl open as a flame graph.
+- Memory: tracemalloc snapshots taken before and after a period are
+  compared, so the lines whose allocations grew come first.
+- Tasks: the stack of every asyncio task and thread, to see what the
+  process is waiting on.
+
+Profiles cover the process that served the request only. One profile runs
+at a time, as each one slows the process down a little.
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from types import FrameType
+from typing import Dict, List, Optional
+
+from ..helpers.settings import get_settings
+
+environment = get_settings()
+
+profiling_lock = asyncio.Lock()
+
+
+def describe_frame(frame: FrameType) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_qualname} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def fold_stack(frame: Optional[FrameType]) -> List[str]:
+    """
+    Describe the frames of a stack, outermost first.
+    """
+    frames = []
+    while frame is not None:
+        frames.append(describe_frame(frame))
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+class SamplingProfiler:
+    """
+    Counts the stacks of every thread, sampled from a background thread.
+    """
+
+    def __init__(self, interval: float):
+        """
+        Args:
+            interval: Seconds between samples
+        """
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+
+    def sample(self, ignored_thread: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == ignored_thread:
+                continue
+            stack = [names.get(thread_id, str(thread_id))] + fold_stack(frame)
+            self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def run(self, seconds: float):
+        """
+        Sample the threads until `seconds` elapsed or `stop` is called.
+        """
+        own_thread = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            started = time.monotonic()
+            self.sample(own_thread)
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stop(self):
+        self._stop.set()
+
+    def to_folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+async def profile_cpu(seconds: float) -> str:
+    """
+    Sample the stacks of every thread of the process for a period.
+
+    Args:
+        seconds: Duration of the profile
+
+    Returns:
+        The counted stacks in the folded stacks format. Each stack starts
+        with the name of its thread, MainThread for the event loop
+    """
+    profiler = SamplingProfiler(environment.PROFILING_SAMPLE_INTERVAL_SECONDS)
+    sampler = threading.Thread(
+        target=profiler.run, args=(seconds,), name="cpu-profiler", daemon=True
+    )
+    sampler.start()
+    try:
+        while sampler.is_alive():
+            await asyncio.sleep(0.1)
+    finally:
+        # Stops sampling when the client goes away
+        profiler.stop()
+    return profiler.to_folded()
+
+
+async def profile_memory(seconds: float, limit: int) -> str:
+    """
+    Compare the memory allocated by each line of code before and after a period.
+
+    Allocations are traced from the start of the period only, unless
+    tracemalloc was already tracing, so memory allocated earlier and still
+    alive is not part of the report.
+
+    Args:
+        seconds: Duration between the two snapshots
+        limit: Number of lines in the report
+
+    Returns:
+        Text report of the lines whose allocations changed the most
+    """
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(environment.PROFILING_TRACEMALLOC_FRAMES)
+    try:
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+    report = io.StringIO()
+    report.write(
+        f"Memory allocations of process {os.getpid()} over {seconds:g}s\n"
+        f"Traced: {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n"
+    )
+    report.write(f"Top {limit} lines by growth\n")
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        report.write(f"{stat}\n")
+
+    report.write(f"\nTop {min(limit, 10)} growing allocation tracebacks\n")
+    for stat in after.compare_to(before, "traceback")[: min(limit, 10)]:
+        if stat.size_diff <= 0:
+            continue
+        report.write(f"\n{stat.size_diff / 1024:+.1f} KiB in {stat.count_diff:+d} blocks\n")
+        report.write("\n".join(stat.traceback.format(most_recent_first=True)))
+        report.write("\n")
+    return report.getvalue()
+
+
+def dump_stacks() -> str:
+    """
+    Describe the stack of every asyncio task of the event loop and of every thread.
+
+    Must be called from the event loop.
+    """
+    report = io.StringIO()
+    tasks = sorted(asyncio.all_tasks(), key=lambda task: task.get_name())
+    report.write(f"Process {os.getpid()} - {len(tasks)} asyncio tasks\n")
+    for task in tasks:
+        report.write(f"\n--- Task {task.get_name()}: {task.get_coro()!r}\n")
+        task.print_stack(file=report)
+
+    names: Dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+    frames = sys._current_frames()
+    report.write(f"\n{len(frames)} threads\n")
+    for thread_id, frame in frames.items():
+        report.write(f"\n--- Thread {names.get(thread_id, thread_id)} ({thread_id})\n")
+        report.write("".join(traceback.format_stack(frame)))
+    return report.getvalue()
+
+
+def profile_filename(kind: str, extension: str) -> str:
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+    return f"{kind}_{timestamp}_{os.getpid()}.{extension}"
@@ -0,0 +1,236 @@
+import asyncio
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, Iterator, Optional, TypeVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..helpers.logger import log_error, log_startup_event, main_logger
+from ..helpers.metrics import CONTENT_TYPE, registry
+from ..helpers.settings import get_settings
+from .tracing import tracer
+
+T = TypeVar("T")
+environment = get_settings()
+
+http_requests = registry.counter(
+    "pricetracker_http_requests_total",
+    "HTTP requests handled, by route and status code",
+    ["method", "route", "status"],
+)
+http_request_duration = registry.histogram(
+    "pricetracker_http_request_duration_seconds",
+    "Time spent handling HTTP requests, by route",
+    ["method", "route"],
+)
+
+scrape_fetch_duration = registry.histogram(
+    "pricetracker_scrape_fetch_seconds",
+    "Time spent downloading product pages, by platform",
+    ["platform"],
+)
+scrape_parse_duration = registry.histogram(
+    "pricetracker_scrape_parse_seconds",
+    "Time spent parsing product pages, by platform",
+    ["platform"],
+)
+scrape_response_bytes = registry.counter(
+    "pricetracker_scrape_response_bytes_total",
+    "Bytes of product pages downloaded, by platform",
+    ["platform"],
+)
+scrape_failures = registry.counter(
+    "pricetracker_scrape_failures_total",
+    "Failed scrapes, by platform and stage (fetch, parse)",
+    ["platform", "stage"],
+)
+
+event_loop_lag = registry.histogram(
+    "pricetracker_event_loop_lag_seconds",
+    "Delay between when an event loop callback was due and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+event_loop_last_lag = registry.gauge(
+    "pricetracker_event_loop_last_lag_seconds",
+    "Event loop lag measured by the last check",
+)
+
+startup_phase_duration = registry.gauge(
+    "pricetracker_startup_phase_seconds",
+    "Time spent in each phase of the last application startup",
+    ["phase"],
+)
+
+
+def record_request(method: str, route: str, status_code: int, duration: float):
+    """
+    Record a handled HTTP request.
+
+    Args:
+        method: HTTP method
+        route: Route template, such as /api/products/{product_id}
+        status_code: Status code of the response
+        duration: Time spent handling the request in seconds
+    """
+    http_requests.inc(method=method, route=route, status=str(status_code))
+    http_request_duration.observe(duration, method=method, route=route)
+
+
+def record_scrape_fetch(platform: str, duration: float, size: int, failed: bool):
+    """
+    Record the download of a product page.
+
+    Args:
+        platform: Platform of the product
+        duration: Time spent downloading the page in seconds
+        size: Size of the page in bytes
+        failed: Whether the download failed
+    """
+    scrape_fetch_duration.observe(duration, platform=platform)
+    if size:
+        scrape_response_bytes.inc(size, platform=platform)
+    if failed:
+        scrape_failures.inc(platform=platform, stage="fetch")
+
+
+def record_scrape_parse(platform: str, duration: float, failed: bool = False):
+    """
+    Record the parsing of a product page.
+
+    Also adds a `parse` span to the current trace.
+
+    Args:
+        platform: Platform of the product
+        duration: Time spent parsing the page in seconds
+        failed: Whether no usable product data was found
+    """
+    scrape_parse_duration.observe(duration, platform=platform)
+    end = time.perf_counter()
+    tracer.add_span("parse", end - duration, end, platform=platform, failed=failed)
+    if failed:
+        scrape_failures.inc(platform=platform, stage="parse")
+
+
+async def monitor_event_loop_lag(interval: float):
+    """
+    Measure how late the event loop wakes up from a sleep, until cancelled.
+
+    A blocking call on the event loop shows up as lag for every request
+    handled at the same time.
+
+    Args:
+        interval: Time between two measurements in seconds
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        event_loop_lag.observe(lag)
+        event_loop_last_lag.set(lag)
+
+
+class StartupProfile:
+    """
+    Times the phases of the application startup.
+
+    Phases may run concurrently, the total is the wall time since the profile
+    was created.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Time a phase of the startup around a block.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+            startup_phase_duration.set(self.phases[name], phase=name)
+
+    async def run(self, name: str, awaitable: Awaitable[T]) -> T:
+        """
+        Time a phase of the startup made of a single awaitable.
+        """
+        with self.phase(name):
+            return await awaitable
+
+    def log(self):
+        """
+        Log the duration of every phase and of the whole startup.
+        """
+        total = time.perf_counter() - self.started
+        startup_phase_duration.set(total, phase="total")
+        phases = ", ".join(
+            f"{name} {duration * 1000:.0f}ms" for name, duration in self.phases.items()
+        )
+        log_startup_event(main_logger, "Startup profile", f"{total * 1000:.0f}ms total ({phases})")
+
+
+def is_metrics_request_authorized(authorization: Optional[str]) -> bool:
+    """
+    Check the Authorization header of a request for the metrics.
+
+    Args:
+        authorization: Value of the Authorization header, if any
+
+    Returns:
+        True if METRICS_TOKEN is unset or the header holds it as a bearer token
+    """
+    if not environment.METRICS_TOKEN:
+        return True
+    scheme, _, token = (authorization or "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(
+        token.strip().encode(), environment.METRICS_TOKEN.encode()
+    )
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        if not is_metrics_request_authorized(self.headers.get("Authorization")):
+            self.send_response(401)
+            self.send_header("WWW-Authenticate", "Bearer")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not worth a log line
+        pass
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer | None:
+    """
+    Serve `/metrics` from a background thread, for processes without the API.
+
+    Args:
+        port: Port to listen on
+
+    Returns:
+        The running server, None if it could not be started
+    """
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), MetricsRequestHandler)
+    except OSError as e:
+        log_error(main_logger, e, f"Could not serve metrics on port {port}")
+        return None
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    log_startup_event(main_logger, "Serving metrics", f"port {port}")
+    return server
@@ -0,0 +1,150 @@
+"""
+Detection of blocking calls on the event loop.
+
+A watchdog thread posts a callback to the event loop at a fixed interval
+and waits for it to run. When it does not run within the threshold, the
+loop is blocked: the watchdog captures the stack of the event loop thread
+and the request or task being run, then waits for the loop to come back and
+logs the stall with its duration.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from ..helpers.logger import get_endpoint_logger, log_startup_event, request_id_context
+from ..helpers.metrics import registry
+from ..helpers.settings import get_settings
+from .tracing import current_trace
+
+environment = get_settings()
+logger = get_endpoint_logger("stalls")
+
+# A loop still blocked after this long is reported right away, as it may
+# never come back
+LONG_STALL_SECONDS = 5.0
+
+event_loop_stalls = registry.counter(
+    "pricetracker_event_loop_stalls_total",
+    "Times a callback blocked the event loop for longer than the stall threshold",
+)
+event_loop_stall_duration = registry.histogram(
+    "pricetracker_event_loop_stall_seconds",
+    "Time the event loop was seen blocked, for the stalls longer than the threshold",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+def describe_running(loop: asyncio.AbstractEventLoop) -> dict:
+    """
+    Describe what the event loop is running: the request, or the task.
+
+    Called from the watchdog thread, while the loop is blocked.
+    """
+    task = asyncio.current_task(loop)
+    if task is None:
+        return {"running": "event loop callback"}
+    context = task.get_context()
+    trace = context.get(current_trace)
+    if trace is not None and "path" in trace.attributes:
+        # Request traces are named after their route once they finish
+        fields = {"running": f"{trace.name} {trace.attributes['path']}"}
+        request_id = context.get(request_id_context)
+        if request_id is not None:
+            fields["request_id"] = request_id
+        return fields
+    if trace is not None:
+        return {"running": trace.name}
+    return {"running": f"task {task.get_name()}"}
+
+
+class StallWatchdog:
+    """
+    Watches an event loop from a background thread.
+    """
+
+    def __init__(self, threshold: float):
+        """
+        Args:
+            threshold: Seconds a callback may block the loop before it is a stall
+        """
+        self.threshold = threshold
+        self.interval = threshold / 2
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Watch the running event loop. Must be called from the loop.
+        """
+        loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.watch,
+            args=(loop, threading.get_ident()),
+            name="event-loop-watchdog",
+            daemon=True,
+        )
+        self._thread.start()
+        log_startup_event(
+            logger, "Event loop watchdog started", f"threshold {self.threshold * 1000:.0f}ms"
+        )
+
+    def stop(self):
+        self._stop.set()
+
+    def watch(self, loop: asyncio.AbstractEventLoop, loop_thread: int):
+        while not self._stop.wait(self.interval):
+            ran = threading.Event()
+            posted = time.perf_counter()
+            try:
+                loop.call_soon_threadsafe(ran.set)
+            except RuntimeError:
+                # The loop was closed
+                return
+            if ran.wait(self.threshold):
+                continue
+            self.report_stall(loop, loop_thread, ran, posted)
+
+    def report_stall(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        loop_thread: int,
+        ran: threading.Event,
+        posted: float,
+    ):
+        """
+        Capture what blocks the loop, then wait for it to run again and log the stall.
+        """
+        frame = sys._current_frames().get(loop_thread)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+        fields = describe_running(loop)
+
+        if not ran.wait(LONG_STALL_SECONDS - self.threshold):
+            logger.error(
+                "Event loop blocked for more than %.0fs by %s\n%s",
+                LONG_STALL_SECONDS,
+                fields["running"],
+                stack,
+                extra=fields,
+            )
+            while not ran.wait(self.interval):
+                if self._stop.is_set():
+                    return
+
+        duration = time.perf_counter() - posted
+        event_loop_stalls.inc()
+        event_loop_stall_duration.observe(duration)
+        logger.warning(
+            "Event loop blocked for %.0fms by %s\n%s",
+            duration * 1000,
+            fields["running"],
+            stack,
+            extra={**fields, "duration_ms": round(duration * 1000, 2)},
+        )
+
+
+stall_watchdog = StallWatchdog(environment.EVENT_LOOP_STALL_THRESHOLD_SECONDS)
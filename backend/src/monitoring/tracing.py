@@ -0,0 +1,289 @@
+"""
+Lightweight in-process tracing.
+
+A trace covers one request or one scheduled job and is made of spans, one
+per stage (config lookup, fetch, parse, database commands...). Spans follow
+the current trace through a context variable, so code that is not traced
+pays a single lookup per span.
+
+Finished traces are kept in a ring buffer when they are slower than
+TRACE_SLOW_MS, and a TRACE_SAMPLE_RATE fraction of the others. The buffer
+can be exported in the Chrome trace event format, which chrome://tracing
+and https://ui.perfetto.dev open.
+"""
+
+import functools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional
+from uuid import uuid4
+
+from ..helpers.logger import LOGS_DIR, request_id_context
+from ..helpers.settings import get_settings
+
+environment = get_settings()
+
+TRACES_DIR = LOGS_DIR / "traces"
+# Converts perf_counter() readings to epoch seconds
+PERF_COUNTER_OFFSET = time.time() - time.perf_counter()
+
+
+class Span:
+    """
+    Timed stage of a trace.
+    """
+
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "thread_id", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], start: float, attributes: dict):
+        self.name = name
+        self.span_id = uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = start
+        self.end: Optional[float] = None
+        self.thread_id = threading.get_ident()
+        self.attributes = attributes
+
+    def set(self, **attributes: Any):
+        """
+        Add attributes to the span.
+        """
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "spanId": self.span_id,
+            "parentId": self.parent_id,
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """
+    Spans recorded for one request or job.
+    """
+
+    def __init__(self, trace_id: str, name: str, attributes: dict):
+        self.trace_id = trace_id
+        self.name = name
+        self.attributes = attributes
+        self.started_at = datetime.now(timezone.utc)
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+        # Set for traces that must not be buffered
+        self.discarded = False
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ms if self.root else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "name": self.name,
+            "startedAt": self.started_at.isoformat(),
+            "durationMs": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "spans": len(self.spans),
+        }
+
+    def to_dict(self) -> dict:
+        return {**self.summary(), "spans": [span.to_dict() for span in self.spans]}
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Records traces and keeps the slow and sampled ones in a ring buffer.
+    """
+
+    def __init__(self, buffer_size: int, slow_ms: float, sample_rate: float):
+        """
+        Args:
+            buffer_size: Number of finished traces kept
+            slow_ms: Duration from which a trace is always kept
+            sample_rate: Fraction of the faster traces kept
+        """
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.traces: deque[Trace] = deque(maxlen=buffer_size)
+
+    @contextmanager
+    def trace(self, name: str, trace_id: Optional[str] = None, **attributes: Any) -> Iterator[Trace]:
+        """
+        Record a trace around a block, with a root span of the same name.
+
+        Args:
+            name: Name of the trace, such as the route or job
+            trace_id: ID of the trace, defaults to the current request id
+            **attributes: Attributes of the trace
+        """
+        trace = Trace(trace_id or request_id_context.get() or uuid4().hex, name, attributes)
+        trace_token = current_trace.set(trace)
+        try:
+            with self.span(name) as root:
+                trace.root = root
+                yield trace
+        finally:
+            current_trace.reset(trace_token)
+            if not trace.discarded and (
+                trace.duration_ms >= self.slow_ms or random.random() < self.sample_rate
+            ):
+                self.traces.append(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """
+        Record a span around a block, when a trace is being recorded.
+
+        Args:
+            name: Name of the stage
+            **attributes: Attributes of the span
+
+        Yields:
+            The span, None outside of a trace
+        """
+        trace = current_trace.get()
+        if trace is None:
+            yield None
+            return
+        parent = current_span.get()
+        span = Span(name, parent.span_id if parent else None, time.perf_counter(), attributes)
+        span_token = current_span.set(span)
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            current_span.reset(span_token)
+            trace.spans.append(span)
+
+    def discard(self):
+        """
+        Do not buffer the current trace, if any.
+
+        Used by long-lived requests such as event streams, which would always
+        be kept as slow traces and push the useful ones out of the buffer.
+        """
+        trace = current_trace.get()
+        if trace is not None:
+            trace.discarded = True
+
+    def add_span(self, name: str, start: float, end: float, **attributes: Any):
+        """
+        Add a span measured elsewhere to the current trace, if any.
+
+        Args:
+            name: Name of the stage
+            start: perf_counter() reading when the stage started
+            end: perf_counter() reading when the stage ended
+            **attributes: Attributes of the span
+        """
+        trace = current_trace.get()
+        if trace is None:
+            return
+        parent = current_span.get()
+        span = Span(name, parent.span_id if parent else None, start, attributes)
+        span.end = end
+        trace.spans.append(span)
+
+    def traced(self, name: str) -> Callable:
+        """
+        Decorator recording a trace around each call of a function.
+        """
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.trace(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def get_traces(self) -> List[Trace]:
+        """
+        Get the buffered traces, newest first.
+        """
+        return list(reversed(self.traces))
+
+    def find_trace(self, trace_id: str) -> Optional[Trace]:
+        return next((trace for trace in self.get_traces() if trace.trace_id == trace_id), None)
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Convert the buffered traces to the Chrome trace event format.
+
+        Each trace is shown on its own row.
+
+        Returns:
+            The trace events document
+        """
+        pid = os.getpid()
+        events = []
+        for row, trace in enumerate(list(self.traces), start=1):
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": row,
+                    "args": {"name": f"{trace.name} {trace.trace_id}"},
+                }
+            )
+            for span in trace.spans:
+                events.append(
+                    {
+                        "name": span.name,
+                        "cat": trace.name,
+                        "ph": "X",
+                        "ts": (span.start + PERF_COUNTER_OFFSET) * 1_000_000,
+                        "dur": span.duration_ms * 1000,
+                        "pid": pid,
+                        "tid": row,
+                        "args": {"traceId": trace.trace_id, **span.attributes},
+                    }
+                )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: Optional[Path] = None) -> Path:
+        """
+        Write the buffered traces to a file in the Chrome trace event format.
+
+        Args:
+            path: File to write, defaults to a timestamped file in logs/traces
+
+        Returns:
+            Path of the written file
+        """
+        if path is None:
+            TRACES_DIR.mkdir(parents=True, exist_ok=True)
+            timestamp = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+            path = TRACES_DIR / f"traces_{timestamp}_{os.getpid()}.json"
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(self.to_chrome_trace(), trace_file, default=str)
+        return path
+
+
+tracer = Tracer(
+    environment.TRACE_BUFFER_SIZE, environment.TRACE_SLOW_MS, environment.TRACE_SAMPLE_RATE
+)
+span = tracer.span
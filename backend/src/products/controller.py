@@ -1,17 +1,26 @@
-from typing import Annotated
+import asyncio
+import time
+from typing import Annotated, List, Optional
 
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, Path, status, Body
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status, Body
+from fastapi.responses import JSONResponse, StreamingResponse
 from ..auth.controller import get_current_user
 from ..helpers.db import db, CollectionNames
 from ..helpers.logger import products_logger, log_error, log_database_operation
+from .events import (
+    MAX_REPLAYED_EVENTS,
+    find_price_events_after,
+    format_price_event,
+    price_events,
+)
 from .models import ProductModel, ProductValidation
 from ..users.models import UserModel
 from ..helpers.requester import make_request
-from ..config.service import get_user_agents, get_proxy_servers
-from ..config.models import ConfigModel
+from ..monitoring.service import record_scrape_parse
+from ..monitoring.tracing import span, tracer
+from ..config.service import config_service
 from ..scrapers.amazon import AmazonScraper
 from ..scrapers.newegg import NeweggScraper
 from ..scrapers.ebay import EbayScraper
@@ -20,9 +29,14 @@ from ..scrapers.models import (
     ScrapedProductSeller,
     ScrapedProductCoupon,
 )
+from ..scheduler.models import ProductSchedule
+from ..scheduler.service import schedule_product
+from ..helpers.settings import get_settings
+from datetime import datetime, timedelta, timezone
 
 
 router = APIRouter()
+environment = get_settings()
 
 
 @router.get("/")
@@ -34,11 +48,11 @@ async def get_user_products(
 
     Requires existing user to have role 'admin'.
     """
-    products_logger.info(f"Fetching products for user: {current_user.username}")
+    products_logger.info("Fetching products for user: %s", current_user.username)
     try:
         # products = await db.get_collection("products").find()
         # products = await db.products.find({"user_id": ObjectId(current_user.id)}).to_list(length=None)
-        # log_database_operation(products_logger, "get_user_products", current_user.id, "products")
+        # log_database_operation(products_logger, "find", CollectionNames.PRODUCTS)
         # return {"products": [ProductModel(**product).model_dump() for product in products]}
         return JSONResponse(
             content={"message": "Products fetched successfully.", "products": []},
@@ -56,6 +70,83 @@ async def get_user_products(
         )
 
 
+@router.get("/events")
+async def stream_price_events(
+    request: Request,
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+    product_ids: Annotated[
+        Optional[List[str]],
+        Query(alias="productId", description="Products to follow, defaults to all of them"),
+    ] = None,
+):
+    """
+    Streams the new prices of the current user's products as server-sent events.
+
+    A client reconnecting with the Last-Event-ID header first receives the
+    events it missed, as long as they are still in the capped collection.
+    """
+    # Open for as long as the client is connected, which says nothing about
+    # the performance of the request
+    tracer.discard()
+    # Subscribed before reading the missed events, so none falls in between
+    subscription = price_events.subscribe(
+        current_user.id, set(product_ids) if product_ids else None
+    )
+    try:
+        missed = []
+        last_event_id = request.headers.get("last-event-id")
+        if last_event_id:
+            try:
+                last_id = ObjectId(last_event_id)
+            except InvalidId:
+                last_id = None
+            if last_id is not None:
+                missed = [
+                    event
+                    for event in await find_price_events_after(
+                        current_user.id, last_id, MAX_REPLAYED_EVENTS
+                    )
+                    if subscription.matches(event)
+                ]
+    except Exception as e:
+        price_events.unsubscribe(subscription)
+        log_error(
+            products_logger,
+            e,
+            f"Error subscribing to price events for user: {current_user.username}",
+        )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while subscribing to price events",
+        )
+
+    async def stream():
+        try:
+            replayed = set()
+            for event in missed:
+                replayed.add(event["_id"])
+                yield format_price_event(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), environment.PRICE_EVENTS_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield b": keepalive\n\n"
+                    continue
+                if event["_id"] not in replayed:
+                    yield format_price_event(event)
+        finally:
+            price_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/validate/amazon")
 async def validate_amazon_product(
     product: Annotated[ProductValidation, Body(..., embed=False)],
@@ -67,35 +158,53 @@ async def validate_amazon_product(
     This function also creates the document in the db for tracking the product.
     """
     try:
-        products_logger.info(
-            f"Validating Amazon product for user: {current_user.username}"
-        )
-        products_logger.debug(f"Product URL: {product.product_url}")
+        log_fields = {"platform": "amazon", "username": current_user.username}
+        products_logger.info("Validating Amazon product", extra=log_fields)
+        products_logger.debug("Product URL: %s", product.product_url)
 
-        user_agents = ConfigModel(**await get_user_agents()).user_agents
-        proxy_server = ConfigModel(**await get_proxy_servers()).proxy_servers
+        with span("config"):
+            configs = await config_service.get_config()
+        user_agents = configs.user_agents
+        proxy_server = configs.proxy_servers
 
-        products_logger.info("Making request to product URL")
+        products_logger.info("Making request to product URL", extra=log_fields)
+        fetch_started = time.perf_counter()
         response = make_request(
             url=product.product_url,
             user_agents=user_agents if user_agents else None,
             proxy_servers=proxy_server if len(proxy_server) > 0 else None,
+            platform="amazon",
         )
 
         if response is None or response.status_code != 200:
             products_logger.warning(
-                f"Invalid product link - Status: {response.status_code if response else 'None'}"
+                "Invalid product link - Status: %s",
+                response.status_code if response else None,
+                extra=log_fields,
             )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid product link or product not found.",
             )
 
-        products_logger.info("Scraping product data")
+        products_logger.info(
+            "Scraping product data",
+            extra={
+                **log_fields,
+                "status_code": response.status_code,
+                "fetch_ms": round((time.perf_counter() - fetch_started) * 1000, 2),
+            },
+        )
+        parse_started = time.perf_counter()
         scraper = AmazonScraper(response.text)
         seller_info = scraper.get_product_seller()
         if not seller_info:
-            products_logger.warning("No seller information found in the product page.")
+            products_logger.warning(
+                "No seller information found in the product page.", extra=log_fields
+            )
+            record_scrape_parse(
+                "amazon", time.perf_counter() - parse_started, failed=True
+            )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Product link is valid but no seller information found.",
@@ -122,9 +231,12 @@ async def validate_amazon_product(
         )
 
         products_logger.info(
-            f"Successfully scraped product: {scraped_data.product_title}"
+            "Successfully scraped product: %s",
+            scraped_data.product_title,
+            extra={**log_fields, "price": scraped_data.product_price},
         )
-        products_logger.debug(f"Product price: {scraped_data.product_price}")
+
+        record_scrape_parse("amazon", time.perf_counter() - parse_started)
 
         return {
             "message": "Product link is valid.",
@@ -158,36 +270,54 @@ async def validate_newegg_product(
     Requires existing user to have role 'admin'.
     """
     try:
-        products_logger.info(
-            f"Validating Newegg product for user: {current_user.username}"
-        )
-        products_logger.debug(f"Product URL: {product.product_url}")
+        log_fields = {"platform": "newegg", "username": current_user.username}
+        products_logger.info("Validating Newegg product", extra=log_fields)
+        products_logger.debug("Product URL: %s", product.product_url)
 
-        user_agents = ConfigModel(**await get_user_agents()).user_agents
-        proxy_server = ConfigModel(**await get_proxy_servers()).proxy_servers
-        products_logger.info("Making request to product URL")
+        with span("config"):
+            configs = await config_service.get_config()
+        user_agents = configs.user_agents
+        proxy_server = configs.proxy_servers
+        products_logger.info("Making request to product URL", extra=log_fields)
+        fetch_started = time.perf_counter()
 
         response = make_request(
             product.product_url,
             user_agents=user_agents if user_agents else None,
             proxy_servers=proxy_server if len(proxy_server) > 0 else None,
+            platform="newegg",
         )
 
         if response is None or response.status_code != 200:
             products_logger.warning(
-                f"Invalid product link - Status: {response.status_code if response else 'None'}"
+                "Invalid product link - Status: %s",
+                response.status_code if response else None,
+                extra=log_fields,
             )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid product link or product not found.",
             )
 
-        products_logger.info("Scraping product data")
+        products_logger.info(
+            "Scraping product data",
+            extra={
+                **log_fields,
+                "status_code": response.status_code,
+                "fetch_ms": round((time.perf_counter() - fetch_started) * 1000, 2),
+            },
+        )
+        parse_started = time.perf_counter()
         scraper = NeweggScraper(response.text)
 
         seller_info = scraper.get_product_seller()
         if not seller_info:
-            products_logger.warning("No seller information found in the product page.")
+            products_logger.warning(
+                "No seller information found in the product page.", extra=log_fields
+            )
+            record_scrape_parse(
+                "newegg", time.perf_counter() - parse_started, failed=True
+            )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Product link is valid but no seller information found.",
@@ -214,9 +344,12 @@ async def validate_newegg_product(
         )
 
         products_logger.info(
-            f"Successfully scraped product: {scraped_data.product_title}"
+            "Successfully scraped product: %s",
+            scraped_data.product_title,
+            extra={**log_fields, "price": scraped_data.product_price},
         )
-        products_logger.debug(f"Product price: {scraped_data.product_price}")
+
+        record_scrape_parse("newegg", time.perf_counter() - parse_started)
 
         return {
             "message": "Product link is valid.",
@@ -250,36 +383,54 @@ async def validate_ebay_product(
     """
     try:
 
-        products_logger.info(
-            f"Validating eBay product for user: {current_user.username}"
-        )
-        products_logger.debug(f"Product URL: {product.product_url}")
+        log_fields = {"platform": "ebay", "username": current_user.username}
+        products_logger.info("Validating eBay product", extra=log_fields)
+        products_logger.debug("Product URL: %s", product.product_url)
 
-        user_agents = ConfigModel(**await get_user_agents()).user_agents
-        proxy_server = ConfigModel(**await get_proxy_servers()).proxy_servers
-        products_logger.info("Making request to product URL")
+        with span("config"):
+            configs = await config_service.get_config()
+        user_agents = configs.user_agents
+        proxy_server = configs.proxy_servers
+        products_logger.info("Making request to product URL", extra=log_fields)
+        fetch_started = time.perf_counter()
 
         response = make_request(
             product.product_url,
             user_agents=user_agents if user_agents else None,
             proxy_servers=proxy_server if len(proxy_server) > 0 else None,
+            platform="ebay",
         )
 
         if response is None or response.status_code != 200:
             products_logger.warning(
-                f"Invalid product link - Status: {response.status_code if response else 'None'}"
+                "Invalid product link - Status: %s",
+                response.status_code if response else None,
+                extra=log_fields,
             )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid product link or product not found.",
             )
 
-        products_logger.info("Scraping product data")
+        products_logger.info(
+            "Scraping product data",
+            extra={
+                **log_fields,
+                "status_code": response.status_code,
+                "fetch_ms": round((time.perf_counter() - fetch_started) * 1000, 2),
+            },
+        )
+        parse_started = time.perf_counter()
         scraper = EbayScraper(response.text)
         
         seller_info = scraper.get_product_seller()
         if not seller_info:
-            products_logger.warning("No seller information found in the product page.")
+            products_logger.warning(
+                "No seller information found in the product page.", extra=log_fields
+            )
+            record_scrape_parse(
+                "ebay", time.perf_counter() - parse_started, failed=True
+            )
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Product link is valid but no seller information found.",
@@ -305,6 +456,8 @@ async def validate_ebay_product(
             productCoupon=product_coupon,
         )
 
+        record_scrape_parse("ebay", time.perf_counter() - parse_started)
+
         return {
             "message": "Product link is valid.",
             "product_url": product.product_url,
@@ -336,8 +489,8 @@ async def add_product(
     Requires existing user to have role 'admin'.
     """
     try:
-        products_logger.info(f"Adding product for user: {current_user.username}")
-        products_logger.debug(f"Product data: {product.model_dump()}")
+        products_logger.info("Adding product for user: %s", current_user.username)
+        products_logger.debug("Product data: %s", product)
 
         # Validate the product data
         if not product.product_link:
@@ -347,13 +500,27 @@ async def add_product(
             )
 
         # Create a new product document
-        product_data = jsonable_encoder(product)
+        product.schedule.updated_at = datetime.now(timezone.utc)
+        product.schedule.next_run_at = product.schedule.updated_at + timedelta(
+            minutes=product.schedule.interval_minutes
+        )
+        product_data = product.model_dump(by_alias=True, exclude={"id"})
         product_data["user_id"] = ObjectId(current_user.id)
 
         # Insert the product into the database
         result = await db.get_collection(CollectionNames.PRODUCTS).insert_one(product_data)
         log_database_operation(
-            products_logger, "add_product", current_user.id, "products"
+            products_logger,
+            "insert",
+            CollectionNames.PRODUCTS,
+            {"acknowledged": result.acknowledged},
+        )
+
+        # Schedule the recurring scrape of the product
+        with span("schedule"):
+            schedule_id = schedule_product(str(result.inserted_id), product.schedule)
+        await db.get_collection(CollectionNames.PRODUCTS).update_one(
+            {"_id": result.inserted_id}, {"$set": {"scheduleId": schedule_id}}
         )
 
         return JSONResponse(
@@ -375,4 +542,84 @@ async def add_product(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error while adding product",
-)
\ No newline at end of file
+)
+
+
+@router.put("/{product_id}/schedule")
+async def update_product_schedule(
+    product_id: Annotated[str, Path(description="ID of the product to update")],
+    schedule: Annotated[ProductSchedule, Body(..., embed=False)],
+    current_user: Annotated[UserModel, Depends(get_current_user)],
+):
+    """
+    Updates how often a product is scraped.
+
+    In 'adaptive' mode the interval is re-tuned after every scrape, within the given bounds.
+    """
+    try:
+        try:
+            product_object_id = ObjectId(product_id)
+        except InvalidId:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid product ID.",
+            )
+        if schedule.min_interval_minutes > schedule.max_interval_minutes:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Minimum interval cannot be greater than the maximum interval.",
+            )
+        schedule.interval_minutes = min(
+            max(schedule.interval_minutes, schedule.min_interval_minutes),
+            schedule.max_interval_minutes,
+        )
+
+        products = db.get_collection(CollectionNames.PRODUCTS)
+        product = await products.find_one(
+            {"_id": product_object_id, "user_id": ObjectId(current_user.id)}
+        )
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found.",
+            )
+
+        schedule.updated_at = datetime.now(timezone.utc)
+        schedule.next_run_at = schedule.updated_at + timedelta(
+            minutes=schedule.interval_minutes
+        )
+        await products.update_one(
+            {"_id": product_object_id},
+            {"$set": {"schedule": schedule.model_dump(by_alias=True)}},
+        )
+        # Reschedules the job if this node owns the product, otherwise the
+        # owning node picks the new interval up on its next heartbeat
+        schedule_id = schedule_product(product_id, schedule)
+        if product.get("scheduleId") != schedule_id:
+            await products.update_one(
+                {"_id": product_object_id}, {"$set": {"scheduleId": schedule_id}}
+            )
+        products_logger.info(
+            "Updated schedule of product %s for user: %s", product_id, current_user.username
+        )
+
+        return JSONResponse(
+            content={
+                "message": "Product schedule updated successfully.",
+                "schedule": schedule.model_dump(by_alias=True, mode="json"),
+            },
+            status_code=status.HTTP_200_OK,
+        )
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        log_error(
+            products_logger,
+            e,
+            f"Error updating schedule of product {product_id} for user: {current_user.username}",
+        )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while updating product schedule",
+        )
@@ -0,0 +1,292 @@
+"""
+Live price updates.
+
+Every price point recorded by a scrape is also written as a small event to
+the capped `price_events` collection, from whichever process ran the scrape.
+Each API worker tails that collection with a single cursor and fans the
+events out in memory to its subscribed clients, which receive them as
+server-sent events instead of polling their products.
+
+Event IDs are ObjectIds generated by the process that ran the scrape, so
+events from different processes do not sort in insertion order by ID. The
+tailer and the replay of missed events resume in natural (insertion) order
+instead, skipping the events up to the last one seen.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, FrozenSet, List, Optional, Set
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+from ..helpers.db import CollectionNames, db
+from ..helpers.logger import log_error, products_logger
+from ..helpers.metrics import registry
+from ..helpers.responses import dumps
+from ..helpers.settings import get_settings
+from .models import ProductModel, ProductTracking
+
+environment = get_settings()
+
+# Delay before tailing again once the cursor died, such as on an empty collection
+TAIL_RETRY_SECONDS = 1.0
+# Longest time a getMore waits on the server for new events
+TAIL_MAX_AWAIT_MS = 1000
+# Events replayed to a client reconnecting with Last-Event-ID
+MAX_REPLAYED_EVENTS = 100
+
+_price_events_collection_created = False
+
+dropped_price_events = registry.counter(
+    "pricetracker_price_events_dropped_total",
+    "Price events dropped because a client did not keep up",
+)
+
+
+@dataclass(eq=False)
+class PriceEventSubscription:
+    """
+    Price events of one connected client.
+    """
+
+    user_id: str
+    # Products the client follows, None for every product of the user
+    product_ids: Optional[FrozenSet[str]]
+    queue: asyncio.Queue = field(
+        default_factory=lambda: asyncio.Queue(environment.PRICE_EVENTS_QUEUE_SIZE)
+    )
+
+    def matches(self, event: dict) -> bool:
+        return self.product_ids is None or event["productId"] in self.product_ids
+
+
+def get_price_events_options() -> dict:
+    return {"capped": True, "size": environment.PRICE_EVENTS_MAX_SIZE_MB * 1024 * 1024}
+
+
+async def ensure_price_events_collection():
+    """
+    Create the capped collection the price events are tailed from.
+    """
+    try:
+        await db.create_collection(CollectionNames.PRICE_EVENTS, **get_price_events_options())
+    except CollectionInvalid:
+        # Already created, by this or another worker
+        pass
+
+
+def record_price_event(
+    sync_db,
+    product: ProductModel,
+    owner_id: str,
+    tracking_point: ProductTracking,
+    previous_price: Optional[float],
+):
+    """
+    Publish a new price point of a product to the subscribed clients.
+
+    Called from the scrape jobs, which use the synchronous client.
+
+    Args:
+        sync_db: Synchronous database of the caller
+        product: Product that was scraped
+        owner_id: ID of the user owning the product
+        tracking_point: Price point that was recorded
+        previous_price: Price of the previous point, if any
+    """
+    global _price_events_collection_created
+
+    try:
+        if not _price_events_collection_created:
+            try:
+                sync_db.create_collection(
+                    CollectionNames.PRICE_EVENTS, **get_price_events_options()
+                )
+            except CollectionInvalid:
+                pass
+            _price_events_collection_created = True
+
+        sync_db.get_collection(CollectionNames.PRICE_EVENTS).insert_one(
+            {
+                "productId": str(product.id),
+                "userId": owner_id,
+                "platform": product.platform.value,
+                "price": tracking_point.price,
+                "previousPrice": previous_price,
+                "timestamp": tracking_point.timestamp,
+                "createdAt": datetime.now(timezone.utc),
+            }
+        )
+    except Exception as e:
+        # Clients catch up on their next page load, the scrape itself succeeded
+        log_error(products_logger, e, f"Error publishing price event for product {product.id}")
+
+
+def format_price_event(event: dict) -> bytes:
+    """
+    Format a price event as a server-sent event.
+
+    Args:
+        event: Document of the price event
+
+    Returns:
+        The event, with its id usable as Last-Event-ID
+    """
+    data = dumps(
+        {
+            "productId": event["productId"],
+            "platform": event["platform"],
+            "price": event["price"],
+            "previousPrice": event.get("previousPrice"),
+            "timestamp": event["timestamp"],
+        }
+    )
+    return b"id: %s\nevent: price\ndata: %s\n\n" % (str(event["_id"]).encode(), data)
+
+
+async def find_price_events_after(user_id: str, last_id: ObjectId, limit: int) -> List[dict]:
+    """
+    Get the events of a user recorded after one of them, in insertion order.
+
+    Args:
+        user_id: ID of the user
+        last_id: ID of the last event the client received
+        limit: Most events returned
+
+    Returns:
+        The first `limit` events after `last_id`, or the first events of the
+        user if `last_id` is no longer in the capped collection
+    """
+    cursor = db.get_collection(CollectionNames.PRICE_EVENTS).find(
+        {"userId": user_id}, sort=[("$natural", 1)]
+    )
+    events = []
+    found = False
+    async for event in cursor:
+        if not found and event["_id"] == last_id:
+            found = True
+            events = []
+            continue
+        if len(events) < limit:
+            events.append(event)
+        elif found:
+            break
+    return events
+
+
+class PriceEventBus:
+    """
+    Fans the tailed price events out to the clients connected to this worker.
+
+    The collection is only tailed while the worker has had subscribers, with
+    one cursor shared by all of them.
+    """
+
+    def __init__(self):
+        self.subscriptions: Dict[str, Set[PriceEventSubscription]] = {}
+        self._tailer: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self.subscriptions.values())
+
+    def subscribe(
+        self, user_id: str, product_ids: Optional[Set[str]] = None
+    ) -> PriceEventSubscription:
+        """
+        Subscribe a client to the price events of a user's products.
+
+        Args:
+            user_id: ID of the user
+            product_ids: Products to follow, defaults to every product of the user
+
+        Returns:
+            The subscription, whose queue receives the events
+        """
+        subscription = PriceEventSubscription(
+            user_id, frozenset(product_ids) if product_ids else None
+        )
+        self.subscriptions.setdefault(user_id, set()).add(subscription)
+        if self._tailer is None or self._tailer.done():
+            self._tailer = asyncio.create_task(self.tail(), name="price-events-tailer")
+        return subscription
+
+    def unsubscribe(self, subscription: PriceEventSubscription):
+        subscriptions = self.subscriptions.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscriptions[subscription.user_id]
+
+    def dispatch(self, event: dict):
+        """
+        Queue an event for the subscriptions it matches.
+
+        A client that does not keep up loses its oldest events rather than
+        holding up the others.
+        """
+        for subscription in self.subscriptions.get(event["userId"], ()):
+            if not subscription.matches(event):
+                continue
+            if subscription.queue.full():
+                subscription.queue.get_nowait()
+                dropped_price_events.inc()
+            subscription.queue.put_nowait(event)
+
+    async def tail(self):
+        """
+        Dispatch the events added to the price_events collection, until cancelled.
+        """
+        collection = db.get_collection(CollectionNames.PRICE_EVENTS)
+        started = False
+        # Last event dispatched, None to dispatch the whole collection
+        last_id = None
+        while True:
+            try:
+                if not started:
+                    newest = await collection.find_one(sort=[("$natural", -1)])
+                    last_id = newest["_id"] if newest else None
+                    started = True
+                elif last_id is not None and not await collection.find_one(
+                    {"_id": last_id}, {"_id": 1}
+                ):
+                    # Overwritten by newer events while the cursor was down
+                    last_id = None
+                cursor = collection.find(
+                    cursor_type=CursorType.TAILABLE_AWAIT
+                ).max_await_time_ms(TAIL_MAX_AWAIT_MS)
+                skipping = last_id is not None
+                while cursor.alive:
+                    async for event in cursor:
+                        if skipping:
+                            skipping = event["_id"] != last_id
+                            continue
+                        last_id = event["_id"]
+                        self.dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_error(products_logger, e, "Error tailing price events")
+            await asyncio.sleep(TAIL_RETRY_SECONDS)
+
+    async def stop(self):
+        if self._tailer is not None:
+            self._tailer.cancel()
+            try:
+                await self._tailer
+            except asyncio.CancelledError:
+                pass
+            self._tailer = None
+
+
+price_events = PriceEventBus()
+
+registry.gauge(
+    "pricetracker_price_event_subscribers",
+    "Clients connected to the price event stream of this worker",
+    function=lambda: price_events.subscriber_count,
+)
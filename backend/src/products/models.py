@@ -6,6 +6,7 @@ from bson import ObjectId
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
 from ..helpers.db import PyObjectId
+from ..scheduler.models import ProductSchedule
 from ..scrapers.models import ScrapedProductSeller, ScrapedProductCoupon
 
 
@@ -76,6 +77,10 @@ class ProductModel(BaseModel):
         description="ID of the scheduling job for this product",
         alias="scheduleId",
     )
+    schedule: ProductSchedule = Field(
+        default_factory=ProductSchedule,
+        description="How often the product is scraped",
+    )
     created_at: Optional[str] = Field(
         default_factory=lambda: datetime.now().isoformat(),
         description="Timestamp when the product was added",
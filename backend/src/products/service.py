@@ -0,0 +1,83 @@
+from pydantic import ValidationError
+
+from ..helpers.logger import scrapers_logger
+from ..scrapers.amazon import AmazonScraper
+from ..scrapers.ebay import EbayScraper
+from ..scrapers.models import (
+    ScrapedProductCoupon,
+    ScrapedProductData,
+    ScrapedProductSeller,
+)
+from ..scrapers.newegg import NeweggScraper
+from .models import ProductPlatformEnum, ProductTracking
+
+# Scraper class used for each supported platform
+SCRAPERS = {
+    ProductPlatformEnum.amazon: AmazonScraper,
+    ProductPlatformEnum.newegg: NeweggScraper,
+    ProductPlatformEnum.ebay: EbayScraper,
+}
+
+
+def scrape_product_page(
+    platform: ProductPlatformEnum, html_content: str
+) -> ScrapedProductData:
+    """
+    Parse a product page with the scraper for its platform.
+
+    Args:
+        platform: Platform the page was fetched from
+        html_content: Raw HTML of the product page
+
+    Returns:
+        The scraped product data
+    """
+    scraper = SCRAPERS[ProductPlatformEnum(platform)](html_content)
+
+    seller_info = scraper.get_product_seller()
+    product_seller = (
+        ScrapedProductSeller(
+            shipsFrom=seller_info.get("ships_from"), soldBy=seller_info.get("sold_by")
+        )
+        if seller_info
+        else None
+    )
+
+    product_coupon = None
+    coupon_info = scraper.get_product_coupon()
+    if coupon_info:
+        try:
+            product_coupon = ScrapedProductCoupon(
+                value=coupon_info.get("value"),
+                discount_type=coupon_info.get("discount_type"),
+            )
+        except ValidationError:
+            # A malformed coupon should not prevent the price from being tracked
+            scrapers_logger.warning("Could not parse coupon: %s", coupon_info)
+
+    return ScrapedProductData(
+        productTitle=scraper.get_product_title(),
+        productPrice=scraper.get_product_price(),
+        productImage=scraper.get_product_image(),
+        productSeller=product_seller,
+        productCoupon=product_coupon,
+    )
+
+
+def build_tracking_point(scraped_data: ScrapedProductData) -> ProductTracking | None:
+    """
+    Build a price tracking record from scraped product data.
+
+    Args:
+        scraped_data: The scraped product data
+
+    Returns:
+        The tracking record, or None if no price was found on the page
+    """
+    if not scraped_data.product_price:
+        return None
+    return ProductTracking(
+        price=scraped_data.product_price,
+        seller=scraped_data.product_seller,
+        coupon=scraped_data.product_coupon,
+    )
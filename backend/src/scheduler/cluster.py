@@ -0,0 +1,368 @@
+"""
+Partitioning of scrape jobs across scheduler nodes.
+
+Every node running the scheduler registers a heartbeat in Mongo. Products are
+split among the live nodes with consistent hashing, so when a node joins or
+dies only the products it owned (or will own) move. Each node keeps the scrape
+jobs of the products it owns in its local job store. It rebuilds them from
+every product when the live nodes change, and otherwise only picks up the
+schedules set through the API since its previous heartbeat. A short lease per
+product guards against two nodes fetching the same product while ownership
+is moving.
+"""
+
+import bisect
+import hashlib
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from uuid import uuid4
+
+from apscheduler.triggers.interval import IntervalTrigger
+from pymongo.errors import DuplicateKeyError
+
+from ..helpers.db import CollectionNames
+from ..helpers.logger import log_error, scheduler_logger
+from ..helpers.settings import get_settings
+from .models import ProductSchedule
+from .scheduling import LOCAL_JOBSTORE, db, scheduler
+
+environment = get_settings()
+
+# Unique identifier of this scheduler node
+NODE_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+# ID of the job that renews the heartbeat and rebalances the scrape jobs
+HEARTBEAT_JOB_ID = "cluster-heartbeat"
+# Prefix of the IDs of product scrape jobs
+SCRAPE_JOB_PREFIX = "scrape:"
+# Schedule changes are looked up from this long before the previous heartbeat,
+# to cover the clock skew between processes and writes still in flight
+SCHEDULE_CHANGES_MARGIN = timedelta(minutes=1)
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping keys to nodes.
+
+    Each node is placed on the ring several times (virtual nodes) so keys are
+    spread evenly and only about 1/N of them move when a node joins or leaves.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 128):
+        self.replicas = replicas
+        self.nodes = sorted(set(nodes))
+        self._ring: List[tuple[int, str]] = sorted(
+            (self._hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def get_node(self, key: str) -> str | None:
+        """
+        Get the node owning a key.
+
+        Args:
+            key: Key to look up
+
+        Returns:
+            The owning node, or None if the ring is empty
+        """
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+_ring = HashRing()
+# Nodes of the ring the local jobs were last rebuilt for, None before the first rebalance
+_rebalanced_nodes: Optional[List[str]] = None
+# Start of the previous rebalance, schedule changes are looked up from there
+_schedules_checked_at: Optional[datetime] = None
+
+
+def get_scrape_job_id(product_id: str) -> str:
+    """
+    Get the ID of the scrape job of a product.
+    """
+    return f"{SCRAPE_JOB_PREFIX}{product_id}"
+
+
+def owns(product_id: str) -> bool:
+    """
+    Check whether this node currently owns a product.
+
+    Args:
+        product_id: ID of the product
+
+    Returns:
+        True if the product is assigned to this node
+    """
+    return _ring.get_node(product_id) == NODE_ID
+
+
+def register_heartbeat() -> List[str]:
+    """
+    Renew the heartbeat of this node and refresh the hash ring.
+
+    Returns:
+        IDs of the live nodes
+    """
+    global _ring
+
+    nodes = db.get_collection(CollectionNames.SCHEDULER_NODES)
+    now = datetime.now(timezone.utc)
+    nodes.update_one(
+        {"_id": NODE_ID},
+        {
+            "$set": {
+                "lastSeen": now,
+                "expiresAt": now + timedelta(seconds=environment.SCHEDULER_NODE_TTL_SECONDS),
+                "hostname": socket.gethostname(),
+                "pid": os.getpid(),
+            },
+            "$setOnInsert": {"startedAt": now},
+        },
+        upsert=True,
+    )
+
+    live_nodes = [
+        node["_id"]
+        for node in nodes.find({"expiresAt": {"$gt": now}}, projection={"_id": 1})
+    ]
+    if sorted(live_nodes) != _ring.nodes:
+        scheduler_logger.info(
+            "Scheduler nodes changed: %s -> %s live nodes", len(_ring.nodes), len(live_nodes)
+        )
+        _ring = HashRing(live_nodes)
+    return live_nodes
+
+
+def add_scrape_job(product_id: str, schedule: ProductSchedule):
+    """
+    Add or replace the local scrape job of a product.
+
+    The first run happens at the product's persisted next run time so that
+    moving a product to another node does not reset its schedule.
+
+    Args:
+        product_id: ID of the product
+        schedule: Schedule of the product
+    """
+    # Imported here as the job function lives with the scrape pipeline
+    from .service import scrape_product
+
+    now = datetime.now(timezone.utc)
+    start_date = schedule.next_run_at or now
+    if start_date.tzinfo is None:
+        start_date = start_date.replace(tzinfo=timezone.utc)
+    if start_date < now:
+        start_date = now
+
+    scheduler.add_job(
+        scrape_product,
+        IntervalTrigger(minutes=schedule.interval_minutes, start_date=start_date),
+        kwargs={"product_id": product_id},
+        id=get_scrape_job_id(product_id),
+        jobstore=LOCAL_JOBSTORE,
+        replace_existing=True,
+        coalesce=True,
+        misfire_grace_time=None,
+    )
+
+
+def remove_scrape_job(product_id: str):
+    """
+    Remove the local scrape job of a product, if this node has one.
+    """
+    job_id = get_scrape_job_id(product_id)
+    if scheduler.get_job(job_id, jobstore=LOCAL_JOBSTORE):
+        scheduler.remove_job(job_id, jobstore=LOCAL_JOBSTORE)
+
+
+def sync_scrape_job(product_id: str, schedule: ProductSchedule, job=None) -> bool:
+    """
+    Add the scrape job of an owned product, or replace it if its interval changed.
+
+    Returns:
+        True if the job was added or replaced
+    """
+    interval = timedelta(minutes=schedule.interval_minutes)
+    if job is not None and job.trigger.interval == interval:
+        return False
+    add_scrape_job(product_id, schedule)
+    return True
+
+
+def sync_all_scrape_jobs():
+    """
+    Make the local scrape jobs match every product this node owns.
+
+    Reads every product, so it only runs when ownership changed.
+    """
+    owned: Dict[str, ProductSchedule] = {}
+    for product in db.get_collection(CollectionNames.PRODUCTS).find(
+        {}, projection={"_id": 1, "schedule": 1}
+    ):
+        product_id = str(product["_id"])
+        if owns(product_id):
+            owned[product_id] = ProductSchedule(**(product.get("schedule") or {}))
+
+    local_jobs = {
+        job.id: job
+        for job in scheduler.get_jobs(jobstore=LOCAL_JOBSTORE)
+        if job.id.startswith(SCRAPE_JOB_PREFIX)
+    }
+
+    added = removed = 0
+    for job_id in local_jobs:
+        if job_id.removeprefix(SCRAPE_JOB_PREFIX) not in owned:
+            scheduler.remove_job(job_id, jobstore=LOCAL_JOBSTORE)
+            removed += 1
+
+    for product_id, schedule in owned.items():
+        if sync_scrape_job(product_id, schedule, local_jobs.get(get_scrape_job_id(product_id))):
+            added += 1
+
+    scheduler_logger.info(
+        "Rebalanced node %s: %s owned products, %s scheduled, %s released",
+        NODE_ID,
+        len(owned),
+        added,
+        removed,
+    )
+
+
+def sync_changed_scrape_jobs(since: datetime):
+    """
+    Update the local scrape jobs of the owned products whose schedule was set
+    through the API since a given time, such as new products.
+    """
+    added = 0
+    for product in db.get_collection(CollectionNames.PRODUCTS).find(
+        {"schedule.updatedAt": {"$gte": since}}, projection={"_id": 1, "schedule": 1}
+    ):
+        product_id = str(product["_id"])
+        if not owns(product_id):
+            continue
+        job = scheduler.get_job(get_scrape_job_id(product_id), jobstore=LOCAL_JOBSTORE)
+        if sync_scrape_job(product_id, ProductSchedule(**product["schedule"]), job):
+            added += 1
+
+    if added:
+        scheduler_logger.info("Node %s scheduled %s changed products", NODE_ID, added)
+
+
+def rebalance():
+    """
+    Renew the heartbeat and make the local scrape jobs match the products
+    this node owns.
+
+    Ownership of every product is only recomputed when the live nodes
+    changed. In between, only the schedules set since the previous rebalance
+    are read.
+    """
+    global _rebalanced_nodes, _schedules_checked_at
+
+    try:
+        register_heartbeat()
+        started = datetime.now(timezone.utc)
+        if _ring.nodes != _rebalanced_nodes:
+            sync_all_scrape_jobs()
+            _rebalanced_nodes = _ring.nodes
+        else:
+            sync_changed_scrape_jobs(_schedules_checked_at - SCHEDULE_CHANGES_MARGIN)
+        _schedules_checked_at = started
+    except Exception as e:
+        log_error(scheduler_logger, e, f"Error rebalancing scheduler node {NODE_ID}")
+
+
+def join_cluster():
+    """
+    Register this node and start the periodic heartbeat and rebalance.
+
+    Must be called after the scheduler is started.
+    """
+    nodes = db.get_collection(CollectionNames.SCHEDULER_NODES)
+    nodes.create_index("expiresAt", expireAfterSeconds=0)
+    leases = db.get_collection(CollectionNames.SCRAPE_LEASES)
+    leases.create_index("expiresAt", expireAfterSeconds=0)
+
+    # Scrape jobs created before partitioning lived in the shared job store,
+    # where every node would run them
+    for job in scheduler.get_jobs(jobstore="default"):
+        if job.func_ref.endswith(":scrape_product"):
+            scheduler.remove_job(job.id, jobstore="default")
+
+    scheduler.add_job(
+        rebalance,
+        "interval",
+        seconds=environment.SCHEDULER_HEARTBEAT_SECONDS,
+        id=HEARTBEAT_JOB_ID,
+        jobstore=LOCAL_JOBSTORE,
+        replace_existing=True,
+        next_run_time=datetime.now(timezone.utc),
+        coalesce=True,
+        max_instances=1,
+    )
+    scheduler_logger.info("Scheduler node %s joined the cluster", NODE_ID)
+
+
+def leave_cluster():
+    """
+    Remove this node from the cluster so its products move immediately.
+    """
+    try:
+        db.get_collection(CollectionNames.SCHEDULER_NODES).delete_one({"_id": NODE_ID})
+        db.get_collection(CollectionNames.SCRAPE_LEASES).delete_many({"owner": NODE_ID})
+        scheduler_logger.info("Scheduler node %s left the cluster", NODE_ID)
+    except Exception as e:
+        log_error(scheduler_logger, e, f"Error removing scheduler node {NODE_ID}")
+
+
+def acquire_lease(product_id: str) -> bool:
+    """
+    Take the scrape lease of a product.
+
+    Args:
+        product_id: ID of the product
+
+    Returns:
+        True if this node holds the lease, False if another node does
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        db.get_collection(CollectionNames.SCRAPE_LEASES).update_one(
+            {
+                "_id": product_id,
+                "$or": [{"owner": NODE_ID}, {"expiresAt": {"$lte": now}}],
+            },
+            {
+                "$set": {
+                    "owner": NODE_ID,
+                    "expiresAt": now + timedelta(seconds=environment.SCRAPE_LEASE_SECONDS),
+                }
+            },
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease exists and is held by another node
+        return False
+
+
+def release_lease(product_id: str):
+    """
+    Release the scrape lease of a product held by this node.
+
+    Args:
+        product_id: ID of the product
+    """
+    db.get_collection(CollectionNames.SCRAPE_LEASES).delete_one(
+        {"_id": product_id, "owner": NODE_ID}
+    )
@@ -1,7 +1,71 @@
+from datetime import datetime
 from enum import Enum
+from typing import Optional
+
 from pydantic import BaseModel, Field, ConfigDict
 
+from ..helpers.settings import get_settings
+
+environment = get_settings()
+
+
 class SchedulerTiggerType(str, Enum):
     date = "date"
     interval = "interval"
-    cron = "cron"
\ No newline at end of file
+    cron = "cron"
+
+
+class ScheduleMode(str, Enum):
+    fixed = "fixed"
+    adaptive = "adaptive"
+
+
+class ProductSchedule(BaseModel):
+    """The Product Schedule Model
+
+    Describes how often a tracked product is scraped. In 'fixed' mode the
+    interval never changes. In 'adaptive' mode the interval shrinks while the
+    price is moving and grows while it stays flat, always within the bounds.
+
+    Attributes:
+        mode (ScheduleMode): Scheduling mode of the product.
+        interval_minutes (int): Current interval between scrapes.
+        min_interval_minutes (int): Lower bound for the adaptive interval.
+        max_interval_minutes (int): Upper bound for the adaptive interval.
+        next_run_at (Optional[datetime]): When the product is due to be scraped next.
+        updated_at (Optional[datetime]): When the schedule was last set through the API.
+    """
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    mode: ScheduleMode = Field(
+        ScheduleMode.fixed, description="Scheduling mode ('fixed' or 'adaptive')"
+    )
+    interval_minutes: int = Field(
+        environment.SCRAPE_DEFAULT_INTERVAL_MINUTES,
+        ge=1,
+        description="Current interval between scrapes in minutes",
+        alias="intervalMinutes",
+    )
+    min_interval_minutes: int = Field(
+        environment.SCRAPE_MIN_INTERVAL_MINUTES,
+        ge=1,
+        description="Lower bound for the adaptive interval in minutes",
+        alias="minIntervalMinutes",
+    )
+    max_interval_minutes: int = Field(
+        environment.SCRAPE_MAX_INTERVAL_MINUTES,
+        ge=1,
+        description="Upper bound for the adaptive interval in minutes",
+        alias="maxIntervalMinutes",
+    )
+    next_run_at: Optional[datetime] = Field(
+        None,
+        description="When the product is due to be scraped next",
+        alias="nextRunAt",
+    )
+    updated_at: Optional[datetime] = Field(
+        None,
+        description="When the schedule was last set through the API, for the scheduler nodes to pick it up",
+        alias="updatedAt",
+    )
@@ -1,22 +1,36 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.mongodb import MongoDBJobStore
+from apscheduler.jobstores.memory import MemoryJobStore
 from ..helpers.settings import get_settings
+from ..monitoring.mongo import command_listener
 from pymongo import MongoClient
 from uuid import uuid4
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.base import BaseTrigger
+from datetime import datetime
 from typing import Dict, Any
 
 
 environment = get_settings()
-client = MongoClient(environment.MONGO_URI.strip())
+# Connects on first use, so importing the API does not start the client
+# when the scheduler runs in the standalone worker
+client = MongoClient(
+    environment.MONGO_URI.strip(), event_listeners=[command_listener], connect=False
+)
+# Synchronous database handle for jobs, which run in the scheduler's threads
+db = client[environment.MONGO_DB]
+# Name of the job store holding the jobs owned by this node only
+LOCAL_JOBSTORE = "local"
 scheduler = BackgroundScheduler(
     jobstores={
         "default": MongoDBJobStore(
             database=environment.MONGO_DB, collection="scheduling_jobs", client=client
-        )
+        ),
+        # Scrape jobs are partitioned across nodes and rebuilt from the products
+        # collection, so they are kept in memory instead of the shared store
+        LOCAL_JOBSTORE: MemoryJobStore(),
     }
 )
 
@@ -36,6 +50,32 @@ def create_job(
     return job_id
 
 
+def reschedule_job(job_id: str, trigger: BaseTrigger) -> bool:
+    """
+    Replace the trigger of an existing job.
+
+    :param job_id: The ID of the job to be rescheduled.
+    :param trigger: The new trigger for the job.
+    """
+    if scheduler.get_job(job_id):
+        scheduler.reschedule_job(job_id, trigger=trigger)
+        return True
+    return False
+
+
+def defer_job(job_id: str, run_at: datetime) -> bool:
+    """
+    Postpone the next run of a job without changing its trigger.
+
+    :param job_id: The ID of the job to be deferred.
+    :param run_at: When the job should run next.
+    """
+    if scheduler.get_job(job_id):
+        scheduler.modify_job(job_id, next_run_time=run_at)
+        return True
+    return False
+
+
 def remove_job(job_id: str):
     """
     Remove a job from the scheduler.
@@ -0,0 +1,318 @@
+"""Scheduled scraping of tracked products."""
+
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from apscheduler.triggers.interval import IntervalTrigger
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from ..config.models import ConfigModel
+from ..config.service import config_service
+from ..helpers.cache import TTLCache
+from ..helpers.db import CollectionNames
+from ..helpers.logger import log_error, scheduler_logger
+from ..helpers.requester import make_request
+from ..helpers.settings import get_settings
+from ..monitoring.service import record_scrape_parse
+from ..monitoring.tracing import current_trace, span, tracer
+from ..products.events import record_price_event
+from ..products.models import ProductModel, ProductTracking
+from ..products.service import build_tracking_point, scrape_product_page
+from .cluster import (
+    acquire_lease,
+    add_scrape_job,
+    get_scrape_job_id,
+    owns,
+    release_lease,
+    remove_scrape_job,
+)
+from .models import ProductSchedule, ScheduleMode
+from .scheduling import db, defer_job, reschedule_job
+
+environment = get_settings()
+
+# Number of recent tracking points considered when adapting the interval
+ADAPTIVE_WINDOW = 5
+# Factor applied to the interval when the latest scrape saw a price change
+ADAPTIVE_SHRINK_FACTOR = 0.5
+# Factor applied to the interval when the price was flat over the whole window
+ADAPTIVE_GROW_FACTOR = 1.5
+
+# Product counts of the platforms are re-read after this many seconds, the
+# budget floor does not need to follow every added or removed product
+PLATFORM_PRODUCT_COUNT_CACHE_SECONDS = 300
+
+_budget_index_created = False
+platform_product_counts = TTLCache(maxsize=16, ttl=PLATFORM_PRODUCT_COUNT_CACHE_SECONDS)
+
+
+def schedule_product(product_id: str, schedule: ProductSchedule) -> str:
+    """
+    Schedule the recurring scrape of a product.
+
+    The job is added right away if this node owns the product. Otherwise the
+    owning node picks it up on its next heartbeat.
+
+    Args:
+        product_id: ID of the product to scrape
+        schedule: Schedule of the product
+
+    Returns:
+        ID of the scrape job
+    """
+    if owns(product_id):
+        add_scrape_job(product_id, schedule)
+    return get_scrape_job_id(product_id)
+
+
+def compute_adaptive_interval(
+    schedule: ProductSchedule,
+    tracking: List[ProductTracking],
+    floor_minutes: int = 0,
+) -> int:
+    """
+    Compute the next scrape interval of an adaptive schedule.
+
+    The interval shrinks when the latest scrape saw a price change, grows when
+    the price stayed flat over the recent window and is kept otherwise.
+
+    Args:
+        schedule: Current schedule of the product
+        tracking: Price tracking records of the product, oldest first
+        floor_minutes: Smallest interval allowed by the platform fetch budget
+
+    Returns:
+        The next interval in minutes
+    """
+    prices = [point.price for point in tracking[-ADAPTIVE_WINDOW:]]
+    changes = sum(1 for previous, current in zip(prices, prices[1:]) if previous != current)
+
+    interval = float(schedule.interval_minutes)
+    if len(prices) >= 2 and prices[-1] != prices[-2]:
+        interval *= ADAPTIVE_SHRINK_FACTOR
+    elif len(prices) >= 2 and changes == 0:
+        interval *= ADAPTIVE_GROW_FACTOR
+
+    lower_bound = max(schedule.min_interval_minutes, floor_minutes)
+    return int(min(max(interval, lower_bound), schedule.max_interval_minutes))
+
+
+def get_budget_floor_minutes(platform: str) -> int:
+    """
+    Get the smallest interval that keeps every product of a platform within
+    the platform's hourly fetch budget.
+
+    Called on every adaptive scrape, so the product count of the platform is
+    cached for PLATFORM_PRODUCT_COUNT_CACHE_SECONDS.
+
+    Args:
+        platform: Platform of the products
+
+    Returns:
+        The interval in minutes, 0 if the platform has no budget
+    """
+    budget = environment.SCRAPE_PLATFORM_BUDGETS.get(platform)
+    if not budget:
+        return 0
+    product_count = platform_product_counts.get(platform)
+    if product_count is None:
+        product_count = db.get_collection(CollectionNames.PRODUCTS).count_documents(
+            {"platform": platform}
+        )
+        platform_product_counts.set(platform, product_count)
+    return math.ceil(60 * product_count / budget)
+
+
+def consume_platform_budget(platform: str) -> bool:
+    """
+    Count a fetch against the hourly budget of a platform.
+
+    Args:
+        platform: Platform about to be fetched
+
+    Returns:
+        True if the fetch fits in the budget, False if the budget is spent
+    """
+    global _budget_index_created
+
+    budget = environment.SCRAPE_PLATFORM_BUDGETS.get(platform)
+    if not budget:
+        return True
+
+    collection = db.get_collection(CollectionNames.SCRAPE_BUDGETS)
+    if not _budget_index_created:
+        # Expire budget windows once they are over
+        collection.create_index("expiresAt", expireAfterSeconds=0)
+        _budget_index_created = True
+
+    now = datetime.now(timezone.utc)
+    window_start = now.replace(minute=0, second=0, microsecond=0)
+    window = collection.find_one_and_update(
+        {"_id": f"{platform}:{window_start.isoformat()}"},
+        {
+            "$inc": {"count": 1},
+            "$setOnInsert": {"expiresAt": window_start + timedelta(hours=2)},
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return window["count"] <= budget
+
+
+def get_scrape_config() -> ConfigModel:
+    """
+    Get the user agents and proxy servers used for scheduled scrapes.
+    """
+    try:
+        return config_service.get_config_sync()
+    except ValueError:
+        return ConfigModel()
+
+
+@tracer.traced("scrape_product")
+def scrape_product(product_id: str):
+    """
+    Scheduled job that scrapes a product and records its current price.
+
+    Adaptive schedules are re-tuned after every scrape. Each run is traced.
+
+    Args:
+        product_id: ID of the product to scrape
+    """
+    if not owns(product_id):
+        scheduler_logger.info(
+            "Product %s moved to another node, skipping scrape", product_id
+        )
+        return
+    if not acquire_lease(product_id):
+        scheduler_logger.info(
+            "Product %s is leased by another node, skipping scrape", product_id
+        )
+        return
+
+    job_id = get_scrape_job_id(product_id)
+    started = time.perf_counter()
+    log_fields = {"product_id": product_id}
+    # Shared, so the trace also gets the fields added below
+    current_trace.get().attributes = log_fields
+    try:
+        products = db.get_collection(CollectionNames.PRODUCTS)
+        product_db = products.find_one({"_id": ObjectId(product_id)})
+        if not product_db:
+            scheduler_logger.warning(
+                "Product %s not found, removing its scrape job", product_id, extra=log_fields
+            )
+            remove_scrape_job(product_id)
+            return
+        product = ProductModel(**product_db)
+        log_fields["platform"] = product.platform.value
+
+        if not consume_platform_budget(product.platform.value):
+            next_window = (datetime.now(timezone.utc) + timedelta(hours=1)).replace(
+                minute=0, second=0, microsecond=0
+            )
+            scheduler_logger.warning(
+                "Fetch budget for %s spent, deferring product %s to %s",
+                product.platform.value,
+                product_id,
+                next_window.isoformat(),
+                extra=log_fields,
+            )
+            defer_job(job_id, next_window)
+            products.update_one(
+                {"_id": ObjectId(product_id)},
+                {"$set": {"schedule.nextRunAt": next_window}},
+            )
+            return
+
+        with span("config"):
+            configs = get_scrape_config()
+        response = make_request(
+            url=product.product_link,
+            user_agents=configs.user_agents if configs.user_agents else None,
+            proxy_servers=configs.proxy_servers if configs.proxy_servers else None,
+            platform=product.platform.value,
+        )
+        interval = product.schedule.interval_minutes
+        update = {
+            "$set": {
+                "schedule.nextRunAt": datetime.now(timezone.utc)
+                + timedelta(minutes=interval)
+            }
+        }
+        if response is None or response.status_code != 200:
+            scheduler_logger.warning(
+                "Failed to fetch product %s",
+                product_id,
+                extra={
+                    **log_fields,
+                    "status_code": response.status_code if response else None,
+                },
+            )
+            products.update_one({"_id": ObjectId(product_id)}, update)
+            return
+
+        parse_started = time.perf_counter()
+        scraped_data = scrape_product_page(product.platform, response.text)
+        tracking_point = build_tracking_point(scraped_data)
+        record_scrape_parse(
+            product.platform.value,
+            time.perf_counter() - parse_started,
+            failed=tracking_point is None,
+        )
+        if tracking_point is None:
+            scheduler_logger.warning(
+                "No price found for product %s", product_id, extra=log_fields
+            )
+            products.update_one({"_id": ObjectId(product_id)}, update)
+            return
+        previous_price = (
+            product.product_tracking[-1].price if product.product_tracking else None
+        )
+        product.product_tracking.append(tracking_point)
+
+        update["$push"] = {"productTracking": tracking_point.model_dump(by_alias=True)}
+        update["$set"]["updatedAt"] = datetime.now().isoformat()
+
+        if product.schedule.mode == ScheduleMode.adaptive:
+            interval = compute_adaptive_interval(
+                product.schedule,
+                product.product_tracking,
+                get_budget_floor_minutes(product.platform.value),
+            )
+            if interval != product.schedule.interval_minutes:
+                next_run_at = datetime.now(timezone.utc) + timedelta(minutes=interval)
+                update["$set"]["schedule.intervalMinutes"] = interval
+                update["$set"]["schedule.nextRunAt"] = next_run_at
+                reschedule_job(
+                    job_id, IntervalTrigger(minutes=interval, start_date=next_run_at)
+                )
+                scheduler_logger.info(
+                    "Adaptive interval of product %s: %s -> %s minutes",
+                    product_id,
+                    product.schedule.interval_minutes,
+                    interval,
+                    extra=log_fields,
+                )
+
+        products.update_one({"_id": ObjectId(product_id)}, update)
+        record_price_event(
+            db, product, str(product_db["user_id"]), tracking_point, previous_price
+        )
+        scheduler_logger.info(
+            "Scraped product %s - price: %s",
+            product_id,
+            tracking_point.price,
+            extra={
+                **log_fields,
+                "price": tracking_point.price,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            },
+        )
+    except Exception as e:
+        log_error(scheduler_logger, e, f"Error scraping product {product_id}")
+    finally:
+        release_lease(product_id)
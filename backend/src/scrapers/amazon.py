@@ -63,13 +63,13 @@ class AmazonScraper:
             "span", class_="a-size-small offer-display-feature-text-message"
         ).get_text(strip=True)
         
-        print(f"Ships from:", ships_from_data)
+        scrapers_logger.debug("Ships from: %s", ships_from_data)
 
         sold_by_data = sold_by_element.find(
             "span", class_="a-size-small offer-display-feature-text-message"
         ).get_text(strip=True)
         
-        print(f"Sold by:", sold_by_data)
+        scrapers_logger.debug("Sold by: %s", sold_by_data)
         return {
             "ships_from": ships_from_data,
             "sold_by": sold_by_data,
@@ -86,12 +86,12 @@ class AmazonScraper:
         """
         price_element = self.soup.find("div",id="corePrice_feature_div")
         if not price_element:
-            print("Price element not found in the HTML content.")
+            scrapers_logger.warning("Price element not found in the HTML content.")
             return None
         price_text_element = price_element.find("span", class_="a-offscreen")
 
         if not price_text_element:
-            print("Price text element not found in the HTML content.")
+            scrapers_logger.warning("Price text element not found in the HTML content.")
             return None
         price_text = price_text_element.get_text(strip=True)
         # Extracting the numeric value from the price text
@@ -140,7 +140,7 @@ class AmazonScraper:
 
         value, discount_type = parsed_discount if parsed_discount else (None, None)
         if value is None or discount_type is None:
-            print("No discount found in the coupon message.")
+            scrapers_logger.debug("No discount found in the coupon message.")
             return None
 
         return {
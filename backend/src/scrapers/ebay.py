@@ -6,6 +6,7 @@ import re
 from typing import Optional, Tuple
 
 from bs4 import BeautifulSoup
+from ..helpers.logger import scrapers_logger
 
 
 class EbayScraper:
@@ -125,7 +126,7 @@ class EbayScraper:
 
         value, discount_type = parsed_discount if parsed_discount else (None, None)
         if value is None or discount_type is None:
-            print("No discount found in the coupon message.")
+            scrapers_logger.debug("No discount found in the coupon message.")
             return None
 
         return {
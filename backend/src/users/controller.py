@@ -1,14 +1,22 @@
-from typing import Annotated
+from typing import Annotated, Optional
 
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, Path, status
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
 
 from ..auth.controller import get_current_user
-from ..auth.service import get_password_hash
+from ..auth.service import (
+    aget_password_hash,
+    invalidate_cached_user,
+    revoke_user_tokens,
+)
 from ..helpers.db import db
-from .models import UserModel, UserRole
+from ..helpers.settings import get_settings
+from .models import UserModel, UserPage, UserPublicModel, UserRole
+from .service import USER_PRIVATE_FIELDS, get_user_count, list_users
 
 router = APIRouter()
+environment = get_settings()
 
 
 @router.post(
@@ -39,9 +47,9 @@ async def create_user(
                 detail="Password must be at least 8 characters long",
             )
 
-        new_user.password = get_password_hash(new_user.password)
+        new_user.password = await aget_password_hash(new_user.password)
         result = await db.get_collection("users").insert_one(
-            new_user.model_dump(by_alias=True, exclude={"id"})
+            new_user.model_dump(by_alias=True, exclude={"id", "token_version"})
         )
         if not result.acknowledged:
             raise HTTPException(
@@ -57,6 +65,8 @@ async def create_user(
             "message": "User created successfully",
             "user_id": str(result.inserted_id),
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -64,12 +74,26 @@ async def create_user(
         )
 
 
-@router.get("/", response_model=list[UserModel], status_code=status.HTTP_200_OK)
+@router.get("/", response_model=UserPage, status_code=status.HTTP_200_OK)
 async def get_users(
     current_user: Annotated[UserModel, Depends(get_current_user)],
+    limit: Annotated[
+        Optional[int],
+        Query(ge=1, description="Number of users per page, capped at USERS_MAX_PAGE_SIZE"),
+    ] = None,
+    cursor: Annotated[
+        Optional[str], Query(description="nextCursor of the previous page")
+    ] = None,
+    search: Annotated[
+        Optional[str],
+        Query(min_length=1, max_length=100, description="Prefix of the username or email"),
+    ] = None,
 ):
     """
-    Retrieve a list of all users.
+    Retrieve a page of users.
+
+    Pages follow each other through the returned `nextCursor`, which is null
+    on the last page. `total` is an estimate of the number of users.
     """
     try:
         if current_user.role != UserRole.admin:
@@ -77,8 +101,19 @@ async def get_users(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You do not have permission to view users",
             )
-        users = await db.get_collection("users").find().to_list(length=None)
-        return [UserModel(**user).model_dump(exclude={"password"}) for user in users]
+        try:
+            after = ObjectId(cursor) if cursor else None
+        except InvalidId:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+        limit = min(limit or environment.USERS_PAGE_SIZE, environment.USERS_MAX_PAGE_SIZE)
+        users, next_cursor = await list_users(limit, after, search)
+        # Validated and serialized by FastAPI against UserPage
+        return {"users": users, "nextCursor": next_cursor, "total": await get_user_count()}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -86,7 +121,7 @@ async def get_users(
         )
 
 
-@router.get("/{user_id}", response_model=UserModel, status_code=status.HTTP_200_OK)
+@router.get("/{user_id}", response_model=UserPublicModel, status_code=status.HTTP_200_OK)
 async def get_user(
     user_id: Annotated[str, Path(description="ID of the user to retrieve")],
     current_user: Annotated[UserModel, Depends(get_current_user)],
@@ -100,13 +135,17 @@ async def get_user(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You do not have permission to view this user",
             )
-        user = await db.get_collection("users").find_one({"_id": ObjectId(user_id)})
+        user = await db.get_collection("users").find_one(
+            {"_id": ObjectId(user_id)}, projection=USER_PRIVATE_FIELDS
+        )
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found",
             )
-        return UserModel(**user).model_dump(exclude={"password"})
+        return user
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -140,17 +179,25 @@ async def update_user(
                 detail="Password must be at least 8 characters long",
             )
 
-        updated_user.password = get_password_hash(updated_user.password)
+        updated_user.password = await aget_password_hash(updated_user.password)
         result = await db.get_collection("users").update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": updated_user.model_dump(by_alias=True, exclude={"id"})},
+            {
+                "$set": updated_user.model_dump(
+                    by_alias=True, exclude={"id", "token_version"}
+                )
+            },
         )
         if result.modified_count == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found or no changes made",
             )
+        await revoke_user_tokens(user_id)
+        await invalidate_cached_user(user_id)
         return {"message": "User updated successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -178,6 +225,8 @@ async def delete_user(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found",
             )
+        await revoke_user_tokens(user_id, deleted=True)
+        await invalidate_cached_user(user_id)
         return {"message": "User deleted successfully"}
     except Exception as e:
         raise HTTPException(
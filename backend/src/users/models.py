@@ -1,7 +1,7 @@
 from datetime import datetime
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 from bson import ObjectId
 from ..helpers.db import PyObjectId
 
@@ -49,6 +49,10 @@ class UserModel(BaseModel):
         None, description="Avatar URL of the user",
         alias="avatar"
     )
+    token_version: int = Field(
+        default=0, description="Incremented to revoke every token issued to the user",
+        alias="tokenVersion"
+    )
 
 
 class UserUpdateSchema(BaseModel):
@@ -72,3 +76,37 @@ class UserUpdateSchema(BaseModel):
         None, description="Avatar URL of the user",
         alias="avatar"
     )
+
+
+class UserPublicModel(BaseModel):
+    """
+    User as sent to clients, without the password and token version.
+
+    Validated from the user documents, whose keys are the aliases.
+    """
+
+    model_config = ConfigDict(populate_by_name=True)
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    role: UserRole = Field(UserRole.user, description="Role of the user (admin/user)")
+    username: str = Field(..., description="Username of the user")
+    email: str = Field(..., description="Email address of the user")
+    first_name: str = Field(..., description="First name of the user", alias="firstName")
+    last_name: str = Field(..., description="Last name of the user", alias="lastName")
+    force_password_change: bool = Field(
+        default=False, description="Force user to change password on next login",
+        alias="forcePasswordChange"
+    )
+    created_at: Optional[datetime] = Field(
+        None, description="Timestamp when the user was created", alias="createdAt"
+    )
+    avatar: Optional[str] = Field(None, description="Avatar URL of the user")
+
+
+class UserPage(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+    users: List[UserPublicModel] = Field(..., description="Users of the page")
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page, null on the last page",
+        alias="nextCursor"
+    )
+    total: int = Field(..., description="Estimated number of users")
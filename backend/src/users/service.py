@@ -0,0 +1,69 @@
+import re
+from typing import List, Optional
+
+from bson import ObjectId
+
+from ..helpers.cache import TTLCache
+from ..helpers.db import db, CollectionNames
+from ..helpers.settings import get_settings
+
+environment = get_settings()
+
+# Fields of the user documents never sent to clients
+USER_PRIVATE_FIELDS = {"password": 0, "tokenVersion": 0}
+
+user_count_cache = TTLCache(maxsize=1, ttl=environment.USER_COUNT_CACHE_SECONDS)
+
+
+async def ensure_user_indexes():
+    """
+    Create the indexes backing the username and email prefix searches.
+    """
+    collection = db.get_collection(CollectionNames.USERS)
+    await collection.create_index("username")
+    await collection.create_index("email")
+
+
+async def list_users(
+    limit: int, after: Optional[ObjectId] = None, search: Optional[str] = None
+) -> tuple[List[dict], Optional[str]]:
+    """
+    Get a page of users, in creation order.
+
+    Args:
+        limit: Maximum number of users returned
+        after: ID of the last user of the previous page
+        search: Prefix of the username or email of the users, case-sensitive so
+            the indexes can be used
+
+    Returns:
+        The user documents without their private fields, and the cursor of the
+        next page or None on the last page
+    """
+    query = {}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    if search:
+        prefix = {"$regex": f"^{re.escape(search)}"}
+        query["$or"] = [{"username": prefix}, {"email": prefix}]
+
+    # One more user than asked tells whether there is a next page
+    users = await db.get_collection(CollectionNames.USERS).find(
+        query, projection=USER_PRIVATE_FIELDS, sort=[("_id", 1)], limit=limit + 1
+    ).to_list(length=limit + 1)
+    if len(users) > limit:
+        users = users[:limit]
+        return users, str(users[-1]["_id"])
+    return users, None
+
+
+async def get_user_count() -> int:
+    """
+    Get the number of users, estimated from the collection metadata and
+    cached for USER_COUNT_CACHE_SECONDS.
+    """
+    count = user_count_cache.get("users")
+    if count is None:
+        count = await db.get_collection(CollectionNames.USERS).estimated_document_count()
+        user_count_cache.set("users", count)
+    return count
@@ -0,0 +1,69 @@
+"""
+Standalone scrape worker.
+
+Runs the scheduler and the scrape pipeline without the API server, so scrape
+capacity can be scaled independently of web capacity. Start it with:
+
+    python -m src.worker
+
+and set SCHEDULER_ENABLED=false on the API so it does not run jobs itself.
+"""
+
+import signal
+import threading
+
+from apscheduler.executors.pool import ThreadPoolExecutor
+
+from .helpers.logger import log_startup_event, scheduler_logger
+from .helpers.settings import get_settings
+from .monitoring.service import start_metrics_server
+from .monitoring.tracing import tracer
+from .scheduler.cluster import NODE_ID, join_cluster, leave_cluster
+from .scheduler.scheduling import scheduler
+
+environment = get_settings()
+logger = scheduler_logger
+
+
+def main():
+    """
+    Start the scheduler and block until the process is asked to stop.
+    """
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        log_startup_event(logger, "Stopping worker", signal.Signals(signum).name)
+        stop_event.set()
+
+    def handle_export_signal(signum, frame):
+        log_startup_event(logger, "Traces exported", str(tracer.export()))
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    # Writes the slow and sampled scrape traces to logs/traces
+    signal.signal(signal.SIGUSR1, handle_export_signal)
+
+    # Replaces the default executor the scheduler would create on start
+    scheduler.add_executor(
+        ThreadPoolExecutor(environment.WORKER_MAX_THREADS), alias="default"
+    )
+    if environment.METRICS_ENABLED and environment.WORKER_METRICS_PORT:
+        start_metrics_server(environment.WORKER_METRICS_PORT)
+    scheduler.start()
+    join_cluster()
+    log_startup_event(
+        logger,
+        f"Worker {NODE_ID} started",
+        f"{environment.WORKER_MAX_THREADS} scrape threads",
+    )
+
+    try:
+        stop_event.wait()
+    finally:
+        scheduler.shutdown()
+        leave_cluster()
+        log_startup_event(logger, "Worker shutdown complete")
+
+
+if __name__ == "__main__":
+    main()
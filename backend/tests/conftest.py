@@ -0,0 +1,46 @@
+"""
+The settings have no defaults for the connection and account settings, the
+tests need values but never connect to anything.
+"""
+
+import os
+import time
+
+import pytest
+
+for name, value in {
+    "MONGO_URI": "mongodb://localhost:27017",
+    "MONGO_DB": "pricetracker_test",
+    "JWT_SECRET": "test",
+    "JWT_ALGORITHM": "HS256",
+    "APP_HOST": "http://localhost:8000",
+    "ADMIN_USERNAME": "admin",
+    "ADMIN_PASSWORD": "admin",
+    "ADMIN_EMAIL": "admin@example.com",
+    "SMTP_HOST": "localhost",
+    "SMTP_PORT": "587",
+    "SMTP_USERNAME": "test",
+    "SMTP_PASSWORD": "test",
+    "SMTP_FROM_NAME": "PriceTracker",
+    "SMTP_FROM_EMAIL": "noreply@example.com",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+class Clock:
+    """
+    Replaces time.monotonic, moved forward by the tests.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
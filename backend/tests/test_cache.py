@@ -0,0 +1,68 @@
+from src.helpers.cache import TTLCache
+
+
+def test_get_returns_value_until_it_expires(clock):
+    values = TTLCache(ttl=10)
+    values.set("key", "value")
+
+    clock.now += 10
+    assert values.get("key") == "value"
+    clock.now += 0.1
+    assert values.get("key", "default") == "default"
+    assert values.stats()["expirations"] == 1
+
+
+def test_entry_ttl_overrides_cache_ttl(clock):
+    values = TTLCache(ttl=10)
+    values.set("short", 1, ttl=1)
+    values.set("long", 2)
+
+    clock.now += 5
+    assert values.get("short") is None
+    assert values.get("long") == 2
+
+
+def test_least_recently_used_entry_evicted(clock):
+    values = TTLCache(maxsize=2, ttl=10)
+    values.set("a", 1)
+    values.set("b", 2)
+    # Reading "a" makes "b" the least recently used
+    values.get("a")
+    values.set("c", 3)
+
+    assert values.get("b") is None
+    assert values.get("a") == 1
+    assert values.get("c") == 3
+    assert values.stats()["evictions"] == 1
+
+
+def test_set_replaces_value_and_renews_ttl(clock):
+    values = TTLCache(ttl=10)
+    values.set("key", 1)
+    clock.now += 8
+    values.set("key", 2)
+    clock.now += 8
+
+    assert values.get("key") == 2
+
+
+def test_delete_and_clear(clock):
+    values = TTLCache(ttl=10)
+    values.set("a", 1)
+    values.set("b", 2)
+
+    values.delete("a")
+    values.delete("missing")
+    assert values.get("a") is None
+    values.clear()
+    assert values.get("b") is None
+
+
+def test_stats_count_hits_and_misses(clock):
+    values = TTLCache(ttl=10)
+    values.set("key", 1)
+    values.get("key")
+    values.get("missing")
+
+    stats = values.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
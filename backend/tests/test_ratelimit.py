@@ -0,0 +1,58 @@
+from src.helpers.ratelimit import SlidingWindowLimiter
+
+
+def test_limited_after_limit_hits(clock):
+    limiter = SlidingWindowLimiter(limit=3, window_seconds=60)
+    for _ in range(2):
+        limiter.hit("key")
+    assert not limiter.is_limited("key")
+
+    limiter.hit("key")
+    assert limiter.is_limited("key")
+    assert not limiter.is_limited("other")
+
+
+def test_window_slides(clock):
+    limiter = SlidingWindowLimiter(limit=2, window_seconds=60)
+    limiter.hit("key")
+    clock.now += 30
+    limiter.hit("key")
+    assert limiter.is_limited("key")
+
+    # The first hit leaves the window, the second one is still in it
+    clock.now += 30
+    assert not limiter.is_limited("key")
+    limiter.hit("key")
+    assert limiter.is_limited("key")
+
+
+def test_retry_after_counts_until_oldest_hit_leaves_window(clock):
+    limiter = SlidingWindowLimiter(limit=2, window_seconds=60)
+    assert limiter.retry_after("key") == 0
+    limiter.hit("key")
+    clock.now += 20
+    limiter.hit("key")
+
+    assert limiter.retry_after("key") == 41
+    clock.now += 39.5
+    assert limiter.retry_after("key") == 1
+    clock.now += 0.5
+    assert limiter.retry_after("key") == 0
+
+
+def test_reset_forgets_key(clock):
+    limiter = SlidingWindowLimiter(limit=1, window_seconds=60)
+    limiter.hit("key")
+    limiter.reset("key")
+    assert not limiter.is_limited("key")
+
+
+def test_least_recently_used_keys_dropped(clock):
+    limiter = SlidingWindowLimiter(limit=1, window_seconds=60, max_keys=2)
+    limiter.hit("a")
+    limiter.hit("b")
+    limiter.hit("c")
+
+    assert not limiter.is_limited("a")
+    assert limiter.is_limited("b")
+    assert limiter.is_limited("c")
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from src.auth.revocation import RevocationStore
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+def test_user_revocation_rejects_older_token_versions():
+    store = RevocationStore(refresh_seconds=5)
+    store._apply({"userId": "user", "tokenVersion": 2, "expiresAt": NOW + timedelta(minutes=30)})
+
+    assert store.is_revoked("user", 1, None)
+    assert not store.is_revoked("user", 2, None)
+    assert not store.is_revoked("other", 0, None)
+
+
+def test_user_revocation_keeps_highest_version_and_latest_expiry():
+    store = RevocationStore(refresh_seconds=5)
+    store._apply({"userId": "user", "tokenVersion": 3, "expiresAt": NOW + timedelta(minutes=10)})
+    store._apply({"userId": "user", "tokenVersion": 2, "expiresAt": NOW + timedelta(minutes=30)})
+
+    assert store.min_token_versions["user"] == (3, NOW + timedelta(minutes=30))
+
+
+def test_prune_drops_expired_revocations():
+    store = RevocationStore(refresh_seconds=5)
+    store._apply({"userId": "old", "tokenVersion": 1, "expiresAt": NOW - timedelta(minutes=1)})
+    store._apply({"userId": "recent", "tokenVersion": 1, "expiresAt": NOW + timedelta(minutes=1)})
+    store._apply({"jti": "old-token", "expiresAt": NOW - timedelta(minutes=1)})
+    store._apply({"jti": "recent-token", "expiresAt": NOW + timedelta(minutes=1)})
+
+    store._prune(NOW)
+
+    assert set(store.min_token_versions) == {"recent"}
+    assert set(store.revoked_tokens) == {"recent-token"}
@@ -0,0 +1,137 @@
+from collections import Counter
+
+from src.products.models import ProductTracking
+from src.scheduler import service
+from src.scheduler.cluster import HashRing
+from src.scheduler.models import ProductSchedule, ScheduleMode
+from src.scheduler.service import compute_adaptive_interval, get_budget_floor_minutes
+
+
+def adaptive_schedule(interval: int, minimum: int = 15, maximum: int = 10080) -> ProductSchedule:
+    return ProductSchedule(
+        mode=ScheduleMode.adaptive,
+        interval_minutes=interval,
+        min_interval_minutes=minimum,
+        max_interval_minutes=maximum,
+    )
+
+
+def tracking(*prices: float) -> list[ProductTracking]:
+    return [ProductTracking(price=price) for price in prices]
+
+
+def test_adaptive_interval_halves_on_price_change():
+    assert compute_adaptive_interval(adaptive_schedule(120), tracking(10, 10, 12)) == 60
+
+
+def test_adaptive_interval_grows_when_flat():
+    assert compute_adaptive_interval(adaptive_schedule(120), tracking(10, 10, 10)) == 180
+
+
+def test_adaptive_interval_kept_after_older_change():
+    # The window saw a change, but not the latest scrape
+    assert compute_adaptive_interval(adaptive_schedule(120), tracking(8, 10, 10)) == 120
+
+
+def test_adaptive_interval_only_looks_at_recent_window():
+    prices = [8] + [10] * service.ADAPTIVE_WINDOW
+    assert compute_adaptive_interval(adaptive_schedule(120), tracking(*prices)) == 180
+
+
+def test_adaptive_interval_kept_without_history():
+    assert compute_adaptive_interval(adaptive_schedule(120), []) == 120
+    assert compute_adaptive_interval(adaptive_schedule(120), tracking(10)) == 120
+
+
+def test_adaptive_interval_clamped_to_bounds():
+    assert compute_adaptive_interval(adaptive_schedule(20, minimum=15), tracking(10, 12)) == 15
+    assert compute_adaptive_interval(adaptive_schedule(100, maximum=120), tracking(10, 10)) == 120
+
+
+def test_budget_floor_raises_lower_bound():
+    schedule = adaptive_schedule(60, minimum=15)
+    assert compute_adaptive_interval(schedule, tracking(10, 12), floor_minutes=45) == 45
+    # An interval already above the floor is left alone
+    assert compute_adaptive_interval(schedule, tracking(10, 10), floor_minutes=45) == 90
+
+
+def test_budget_floor_capped_by_maximum():
+    # The maximum wins when the budget cannot be met within the bounds
+    schedule = adaptive_schedule(60, maximum=120)
+    assert compute_adaptive_interval(schedule, tracking(10, 12), floor_minutes=300) == 120
+
+
+class CountingCollection:
+    def __init__(self, count: int):
+        self.count = count
+        self.calls = 0
+
+    def count_documents(self, query: dict) -> int:
+        self.calls += 1
+        return self.count
+
+
+class FakeDatabase:
+    def __init__(self, collection: CountingCollection):
+        self.collection = collection
+
+    def get_collection(self, name: str) -> CountingCollection:
+        return self.collection
+
+
+def test_budget_floor_minutes_cached(monkeypatch):
+    collection = CountingCollection(240)
+    monkeypatch.setattr(service, "db", FakeDatabase(collection))
+    monkeypatch.setitem(service.environment.SCRAPE_PLATFORM_BUDGETS, "amazon", 120)
+    service.platform_product_counts.clear()
+
+    # 240 products within 120 fetches per hour is one scrape every 2 hours
+    assert get_budget_floor_minutes("amazon") == 120
+    assert get_budget_floor_minutes("amazon") == 120
+    assert collection.calls == 1
+    service.platform_product_counts.clear()
+
+
+def test_budget_floor_minutes_without_budget(monkeypatch):
+    monkeypatch.delitem(service.environment.SCRAPE_PLATFORM_BUDGETS, "amazon", raising=False)
+    assert get_budget_floor_minutes("amazon") == 0
+
+
+KEYS = [f"product-{index}" for index in range(2000)]
+
+
+def owners(ring: HashRing) -> dict[str, str]:
+    return {key: ring.get_node(key) for key in KEYS}
+
+
+def test_hash_ring_empty():
+    assert HashRing().get_node("product") is None
+
+
+def test_hash_ring_independent_of_node_order():
+    assert owners(HashRing(["a", "b", "c"])) == owners(HashRing(["c", "a", "b", "a"]))
+
+
+def test_hash_ring_spreads_keys():
+    counts = Counter(owners(HashRing(["a", "b", "c", "d"])).values())
+    assert set(counts) == {"a", "b", "c", "d"}
+    assert all(count > len(KEYS) / 4 * 0.6 for count in counts.values())
+
+
+def test_hash_ring_join_only_moves_keys_to_new_node():
+    before = owners(HashRing(["a", "b", "c"]))
+    after = owners(HashRing(["a", "b", "c", "d"]))
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert moved
+    assert all(after[key] == "d" for key in moved)
+    assert len(moved) < len(KEYS) / 4 * 1.5
+
+
+def test_hash_ring_leave_only_moves_keys_of_old_node():
+    before = owners(HashRing(["a", "b", "c", "d"]))
+    after = owners(HashRing(["a", "b", "c"]))
+    for key in KEYS:
+        if before[key] != "d":
+            assert after[key] == before[key]
+        else:
+            assert after[key] in {"a", "b", "c"}
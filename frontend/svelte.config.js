@@ -9,7 +9,8 @@ const config = {
 			pages: '../backend/site',
 			assets: '../backend/site',
 			fallback: 'fallback.html',
-			precompress: false,
+			// Writes .br and .gz variants next to the assets, served by the backend
+			precompress: true,
 			strict: true
 		}),
 		// adapter: adapter({